@@ -1,8 +1,10 @@
 # app/urls.py
 
 from django.urls import path
-from .views import interaction_view
+from .views import interaction_view, health_view, telegram_webhook_view
 
 urlpatterns = [
     path('interaction/', interaction_view, name='interaction'),
+    path('health/', health_view, name='health'),
+    path('telegram/webhook/', telegram_webhook_view, name='telegram-webhook'),
 ]
@@ -1,70 +1,144 @@
 # api/views.py
 
-from rest_framework.decorators import api_view
-from rest_framework.response import Response
+import json
 
-from bot.models import Client, Message, Interaction, Stage
-from bot.gpt_utils import generate_prompt, call_gpt
+from asgiref.sync import sync_to_async
+from django.db import connection
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
+from telegram import Update
 
+from bot import dispatcher, gpt_utils, interactions, metrics, response_cache
+from bot.gpt_scheduler import PRIORITY_BACKGROUND, PRIORITY_FOLLOW_UP, PRIORITY_FORWARD
 
-@api_view(['POST'])
-def interaction_view(request):
+
+async def ndjson_lines(events, trace_id: str):
+    # Поток читается уже после выхода из view — trace открываем здесь
+    with metrics.trace(trace_id):
+        async for event in events:
+            yield json.dumps(event, ensure_ascii=False) + "\n"
+
+
+async def interaction_view(request):
     """
     Обрабатывает сообщение от клиента (через пересылку):
     — сохраняет в БД,
     — формирует prompt,
     — получает ответ от GPT,
     — сохраняет результат с SPIN и подсказкой.
+
+    Сам конвейер — в bot.interactions; бот вызывает его напрямую,
+    эта view нужна внешним клиентам.
+
+    Асинхронная view: пока GPT думает, процесс обслуживает другие запросы.
+    Если в запросе "stream": true — отвечает потоком NDJSON-событий.
+
+    Trace ID (bot.metrics) берётся из заголовка X-Trace-Id, если бот его
+    прислал, и возвращается в том же заголовке ответа.
     """
 
-    telegram_id = request.data.get('telegram_id')
-    name = request.data.get('name')
-    text = request.data.get('text')
+    if request.method != "POST":
+        return JsonResponse({"error": "Метод не поддерживается"}, status=405)
+
+    try:
+        data = json.loads(request.body or b"{}")
+    except json.JSONDecodeError:
+        return JsonResponse({"error": "Некорректный JSON"}, status=400)
+    if not isinstance(data, dict):
+        return JsonResponse({"error": "Ожидается JSON-объект"}, status=400)
+
+    telegram_id = data.get('telegram_id')
+    name = data.get('name')
+    text = data.get('text')
 
     if not telegram_id or not text:
-        return Response({"error": "Недостаточно данных"}, status=400)
-
-    # 1. Ищем клиента по telegram_id, если не найден — создаём
-    client, created = Client.objects.get_or_create(
-        telegram_id=telegram_id,
-        defaults={"name": name}
-    )
-
-    # 2. Сохраняем входящее сообщение от клиента
-    Message.objects.create(
-        client=client,
-        text=text,
-        author="client"
-    )
-
-    # 3. Формируем prompt, отправляем его в GPT и получаем ответ + SPIN + hint
-    prompt = generate_prompt(client, text)
-    gpt_result = call_gpt(prompt)
-
-    reply = gpt_result["reply"]
-    hint = gpt_result["assistant_hint"]
-    stage = gpt_result["stage"]
-
-    # 4. Сохраняем ответ бота как сообщение
-    Message.objects.create(
-        client=client,
-        text=reply,
-        author="bot"
-    )
-
-    # 5. Сохраняем Interaction (с prompt, ответом, hint и SPIN-этапом)
-    Interaction.objects.create(
-        client=client,
-        prompt=prompt,
-        gpt_response=reply,
-        assistant_hint=hint,
-        stage_detected=stage
-    )
-
-    # 6. Обновляем SPIN-этап клиента (таблица Stage) — создаём или обновляем
-    Stage.objects.update_or_create(
-        client=client,
-        defaults={"stage": stage}
-    )
-
-    return Response(gpt_result)
\ No newline at end of file
+        return JsonResponse({"error": "Недостаточно данных"}, status=400)
+
+    client = await interactions.get_client(telegram_id, name)
+    trace_id = metrics.trace_id_from(request.headers.get(metrics.TRACE_HEADER))
+
+    if data.get('stream'):
+        response = StreamingHttpResponse(
+            ndjson_lines(interactions.stream_interaction(client, text), trace_id),
+            content_type="application/x-ndjson"
+        )
+    else:
+        with metrics.trace(trace_id):
+            gpt_result = await interactions.run_interaction(client, text)
+        response = JsonResponse(gpt_result)
+
+    response[metrics.TRACE_HEADER] = trace_id
+    return response
+
+
+# Бот и внешние сервисы ходят без CSRF-токена (как раньше через DRF).
+# csrf_exempt в Django 4.2 не умеет async-view, поэтому ставим флаг напрямую.
+interaction_view.csrf_exempt = True
+
+
+async def health_view(request):
+    """
+    Проверка готовности для лаунчера и балансировщика:
+    200, если приложение загружено и база отвечает.
+    """
+
+    def check_database():
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT 1")
+
+    try:
+        await sync_to_async(check_database)()
+    except Exception as e:
+        return JsonResponse({"status": "error", "error": str(e)}, status=503)
+    return JsonResponse({"status": "ok"})
+
+
+async def telegram_webhook_view(request):
+    """
+    Апдейты Telegram в режиме BOT_MODE=webhook. Апдейт только ставится
+    в очередь диспетчера (bot.dispatcher) — Telegram получает ответ сразу,
+    не дожидаясь GPT.
+    """
+    if request.method != "POST":
+        return JsonResponse({"error": "Метод не поддерживается"}, status=405)
+
+    secret = dispatcher.TELEGRAM_WEBHOOK_SECRET
+    if secret and request.headers.get("X-Telegram-Bot-Api-Secret-Token") != secret:
+        return JsonResponse({"error": "Неверный секрет"}, status=403)
+
+    current = dispatcher.get_dispatcher()
+    if current is None:
+        # Бот в этом процессе ещё не запущен — Telegram повторит доставку
+        return JsonResponse({"error": "Бот не запущен"}, status=503)
+
+    try:
+        data = json.loads(request.body or b"{}")
+    except json.JSONDecodeError:
+        return JsonResponse({"error": "Некорректный JSON"}, status=400)
+    if not isinstance(data, dict):
+        return JsonResponse({"error": "Ожидается JSON-объект апдейта"}, status=400)
+
+    if not current.offer(Update.de_json(data, current.app.bot)):
+        return JsonResponse({"error": "Очередь апдейтов переполнена"}, status=429)
+    return JsonResponse({"ok": True})
+
+
+telegram_webhook_view.csrf_exempt = True
+
+
+async def metrics_view(request):
+    """
+    Метрики процесса в формате Prometheus: время этапов, токены GPT,
+    очередь к OpenAI и попадания в кэш ответов.
+    """
+    scheduler = gpt_utils.get_scheduler()
+    higher = 0
+    for name, priority in (
+        ("follow_up", PRIORITY_FOLLOW_UP), ("forward", PRIORITY_FORWARD), ("background", PRIORITY_BACKGROUND)
+    ):
+        # waiting() считает и более приоритетные — оставляем только этот приоритет
+        waiting = scheduler.waiting(priority)
+        metrics.set_gauge("gpt_queue_waiting", waiting - higher, priority=name)
+        higher = waiting
+    for stage, stats in response_cache.stats().items():
+        metrics.set_gauge("response_cache_hit_rate", stats["hit_rate"], stage=stage)
+    return HttpResponse(metrics.render(), content_type="text/plain; version=0.0.4; charset=utf-8")
@@ -0,0 +1,58 @@
+# benchmarks/bench_allow_list.py
+
+"""
+Накладные расходы проверки доступа на каждом апдейте: прежний
+sync_to_async(Assistant...exists()) против списка в памяти (bot.assistants).
+
+    python -m benchmarks.bench_allow_list --calls 5000 --assistants 100
+"""
+
+import argparse
+import asyncio
+import tempfile
+import time
+from pathlib import Path
+
+from benchmarks.common import setup_django
+
+
+async def per_call_us(check, telegram_ids: list) -> float:
+    start = time.perf_counter()
+    for telegram_id in telegram_ids:
+        await check(telegram_id)
+    return (time.perf_counter() - start) / len(telegram_ids) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--calls", type=int, default=5000)
+    parser.add_argument("--assistants", type=int, default=100)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        setup_django(Path(tmp) / "bench.sqlite3")
+        from asgiref.sync import sync_to_async
+        from bot import assistants
+        from bot.models import Assistant
+
+        Assistant.objects.bulk_create([Assistant(telegram_id=str(i)) for i in range(args.assistants)])
+
+        @sync_to_async
+        def legacy_check(telegram_id) -> bool:
+            return Assistant.objects.filter(telegram_id=str(telegram_id)).exists()
+
+        async def run():
+            await sync_to_async(assistants.load_allowed_assistants)()
+            allowed = [i % args.assistants for i in range(args.calls)]
+            rejected = [args.assistants + i for i in range(args.calls)]
+            for title, check in (("БД через sync_to_async", legacy_check),
+                                 ("список в памяти", assistants.is_allowed_assistant)):
+                ok = await per_call_us(check, allowed)
+                denied = await per_call_us(check, rejected)
+                print(f"{title:24} разрешён: {ok:8.1f} мкс  отказ: {denied:8.1f} мкс")
+
+        asyncio.run(run())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+# benchmarks/bench_cold_start.py
+
+"""
+Холодный старт: время от запуска serve_and_run_bot.py до ответа на первый
+апдейт (/start) от фейкового Telegram. Прежний лаунчер спал 5 секунд
+до запуска бота, поэтому первый ответ приходил не раньше чем через 5 секунд.
+
+    python -m benchmarks.bench_cold_start --runs 3
+"""
+
+import argparse
+import os
+import signal
+import socket
+import statistics
+import subprocess
+import sys
+import time
+
+from benchmarks.fakes import FakeHTTPServer, make_telegram_handler, telegram_update
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def measure(workers: int) -> tuple:
+    handler = make_telegram_handler([telegram_update(1, "/start")])
+    with FakeHTTPServer(handler) as telegram:
+        env = dict(
+            os.environ,
+            TELEGRAM_BOT_TOKEN="123:bench",
+            TELEGRAM_BASE_URL=telegram.url + "/bot",
+            OPENAI_API_KEY=os.getenv("OPENAI_API_KEY", "sk-benchmark"),
+            ALLOWED_HOSTS="127.0.0.1,localhost",
+        )
+        command = [sys.executable, "serve_and_run_bot.py", "--host", "127.0.0.1",
+                   "--port", str(free_port()), "--workers", str(workers)]
+        start = time.perf_counter()
+        process = subprocess.Popen(command, env=env, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True)
+        try:
+            while not handler.sent:
+                if process.poll() is not None or time.perf_counter() - start > 60:
+                    raise RuntimeError("лаунчер не ответил на апдейт:\n" + (process.stdout.read() or ""))
+                time.sleep(0.01)
+            first_reply = handler.sent[0][0] - start
+        finally:
+            process.send_signal(signal.SIGTERM)
+            stop_start = time.perf_counter()
+            output, _ = process.communicate(timeout=90)
+            stopped = time.perf_counter() - stop_start
+    return first_reply, stopped, output
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--workers", type=int, default=1)
+    args = parser.parse_args()
+
+    first, stops, output = [], [], ""
+    for _ in range(args.runs):
+        first_reply, stopped, output = measure(args.workers)
+        first.append(first_reply)
+        stops.append(stopped)
+
+    print("Отчёт лаунчера (последний прогон):")
+    print("\n".join("  " + line for line in output.splitlines() if "через" in line))
+    print(f"до первого ответа бота: mean={statistics.mean(first):.2f}s min={min(first):.2f}s "
+          f"(прежний лаунчер: > 5s только на sleep)")
+    print(f"остановка по SIGTERM: mean={statistics.mean(stops):.2f}s")
+
+
+if __name__ == "__main__":
+    main()
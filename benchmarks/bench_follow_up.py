@@ -0,0 +1,70 @@
+# benchmarks/bench_follow_up.py
+
+"""
+Время до вызова GPT для уточняющего вопроса ассистента: прежний путь
+(ActiveContext, клиент, Stage и история — отдельными запросами через sync_to_async)
+против контекста из bot.context_cache.
+
+    python -m benchmarks.bench_follow_up --calls 2000 --history 200
+"""
+
+import argparse
+import asyncio
+import tempfile
+import time
+from pathlib import Path
+
+from benchmarks.common import setup_django
+
+
+async def per_call_us(prepare, calls: int) -> float:
+    start = time.perf_counter()
+    for _ in range(calls):
+        await prepare()
+    return (time.perf_counter() - start) / calls * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--calls", type=int, default=2000)
+    parser.add_argument("--history", type=int, default=200, help="сообщений в переписке клиента")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        setup_django(Path(tmp) / "bench.sqlite3")
+        from asgiref.sync import sync_to_async
+        from bot import context_cache
+        from bot.gpt_utils import generate_assistant_prompt
+        from bot.models import ActiveContext, Client, Message, Stage
+
+        client = Client.objects.create(telegram_id="1", name="Клиент")
+        Message.objects.bulk_create([
+            Message(client=client, text=f"сообщение {i}", author="client" if i % 2 else "bot")
+            for i in range(args.history)
+        ])
+        Stage.objects.create(client=client, stage="P")
+        ActiveContext.objects.create(assistant_telegram_id="42", client=client)
+
+        async def legacy():
+            active = await sync_to_async(
+                lambda: ActiveContext.objects.filter(assistant_telegram_id="42").first()
+            )()
+            active_client = await sync_to_async(lambda: active.client)()
+            await sync_to_async(Stage.objects.filter(client=active_client).first)()
+            return await generate_assistant_prompt(active_client, "Что ответить?")
+
+        async def cached():
+            context = await context_cache.aget_active_context(42)
+            return await generate_assistant_prompt(context.client, "Что ответить?", context)
+
+        async def run():
+            await legacy()
+            await cached()
+            for title, prepare in (("БД на каждый вопрос", legacy), ("context_cache", cached)):
+                print(f"{title:22} {await per_call_us(prepare, args.calls):8.1f} мкс до вызова GPT")
+
+        asyncio.run(run())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,55 @@
+# benchmarks/bench_gpt_concurrency.py
+
+"""
+Сравнивает старый путь sync_to_async(call_gpt_plain) и новый acall_gpt_plain
+на локальном фейковом OpenAI-сервере.
+
+    python -m benchmarks.bench_gpt_concurrency --questions 20 --latency 0.5
+"""
+
+import argparse
+import asyncio
+import time
+
+from benchmarks.common import setup_django, format_latencies
+from benchmarks.fakes import FakeHTTPServer, make_openai_handler
+
+
+async def _timed(coro):
+    start = time.perf_counter()
+    await coro
+    return time.perf_counter() - start
+
+
+async def run_batch(make_call, questions: int):
+    start = time.perf_counter()
+    latencies = await asyncio.gather(*(_timed(make_call(f"Вопрос {i}")) for i in range(questions)))
+    return time.perf_counter() - start, list(latencies)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--questions", type=int, default=20)
+    parser.add_argument("--latency", type=float, default=0.5)
+    args = parser.parse_args()
+
+    setup_django()
+    from openai import OpenAI, AsyncOpenAI
+    from asgiref.sync import sync_to_async
+    from bot import gpt_utils
+
+    with FakeHTTPServer(make_openai_handler(latency=args.latency)) as server:
+        gpt_utils.client = OpenAI(api_key="sk-benchmark", base_url=server.url + "/v1")
+        gpt_utils.async_client = AsyncOpenAI(api_key="sk-benchmark", base_url=server.url + "/v1")
+
+        modes = {
+            "sync_to_async(call_gpt_plain)": sync_to_async(gpt_utils.call_gpt_plain),
+            "acall_gpt_plain": gpt_utils.acall_gpt_plain,
+        }
+        for name, call in modes.items():
+            total, latencies = asyncio.run(run_batch(call, args.questions))
+            print(f"{name:32} вопросов={args.questions} всего={total:.2f}s {format_latencies(latencies)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+# benchmarks/bench_history_query.py
+
+"""
+Время выборки «последних N сообщений клиента» на растущей синтетической базе.
+С индексом (client_id, created_at) время почти не зависит от числа строк.
+
+    python -m benchmarks.bench_history_query --clients 100000 --messages 3000000
+    python -m benchmarks.bench_history_query --without-index   # для сравнения
+"""
+
+import argparse
+import random
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+from benchmarks.common import setup_django, percentile
+
+
+def insert_messages(connection, clients: int, count: int, start_at: datetime, rnd: random.Random):
+    rows = []
+    for i in range(count):
+        rows.append((
+            rnd.randint(1, clients),
+            rnd.choice(("client", "bot")),
+            "Сообщение для бенчмарка",
+            (start_at + timedelta(seconds=i)).isoformat(),
+        ))
+    with connection.cursor() as cursor:
+        cursor.executemany(
+            "INSERT INTO bot_message (client_id, author, text, created_at) VALUES (%s, %s, %s, %s)", rows
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--clients", type=int, default=100_000)
+    parser.add_argument("--messages", type=int, default=2_000_000)
+    parser.add_argument("--steps", type=int, default=4, help="замеров по мере роста таблицы")
+    parser.add_argument("--queries", type=int, default=2000)
+    parser.add_argument("--without-index", action="store_true")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="bench_history_")
+    setup_django(Path(workdir) / "db.sqlite3")
+
+    from django.db import connection, transaction
+    from bot.models import Client, Message
+    from bot.gpt_utils import get_recent_messages
+
+    if args.without_index:
+        with connection.cursor() as cursor:
+            cursor.execute("DROP INDEX message_client_created_idx")
+
+    with transaction.atomic():
+        Client.objects.bulk_create(
+            (Client(telegram_id=str(i), name=f"Клиент {i}") for i in range(1, args.clients + 1)),
+            batch_size=5000,
+        )
+
+    rnd = random.Random(7)
+    start_at = datetime(2025, 1, 1, tzinfo=timezone.utc)
+    per_step = args.messages // args.steps
+    clients = list(Client.objects.only("id", "telegram_id")[:args.queries])
+
+    for step in range(1, args.steps + 1):
+        with transaction.atomic():
+            insert_messages(connection, args.clients, per_step, start_at + timedelta(days=step * 100), rnd)
+        with connection.cursor() as cursor:
+            cursor.execute("ANALYZE")
+
+        latencies = []
+        for client in clients:
+            started = time.perf_counter()
+            get_recent_messages(client)
+            latencies.append(time.perf_counter() - started)
+
+        print(
+            f"сообщений={step * per_step:>9} "
+            f"p50={percentile(latencies, 50) * 1e6:.0f}µs p99={percentile(latencies, 99) * 1e6:.0f}µs"
+        )
+
+    query = Message.objects.filter(client=clients[0]).order_by("-created_at", "-id")[:10].query
+    sql, params = query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute("EXPLAIN QUERY PLAN " + sql, params)
+        print("план запроса:", "; ".join(row[-1] for row in cursor.fetchall()))
+
+
+if __name__ == "__main__":
+    main()
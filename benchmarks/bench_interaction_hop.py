@@ -0,0 +1,114 @@
+# benchmarks/bench_interaction_hop.py
+
+"""
+Пересылка от бота: прежний путь через HTTP к своему же API
+(JSON → TCP → view → повторный get_or_create клиента) против прямого
+вызова bot.interactions. GPT — фейковый сервер с задержкой --latency,
+поэтому разница между путями — это накладные расходы HTTP-хопа.
+
+    python -m benchmarks.bench_interaction_hop --runs 50 --latency 0.05
+"""
+
+import argparse
+import asyncio
+import statistics
+import tempfile
+import time
+from pathlib import Path
+
+from benchmarks.common import setup_django, format_latencies
+from benchmarks.fakes import FakeHTTPServer, make_openai_handler
+
+
+REPLY = "Ответ клиенту:\nЗдравствуйте!\n\nПодсказка ассистенту:\nУточни цель.\n\n#Этап: S"
+
+
+async def forward(path: str, telegram_id: int, timings: dict):
+    """
+    Повторяет то, что делает bot_main.handle_message для пересылки.
+    """
+    from asgiref.sync import sync_to_async
+    from bot import api_client, interactions
+    from bot.models import Client, ActiveContext
+
+    start = time.perf_counter()
+    client_obj, _ = await sync_to_async(Client.objects.get_or_create)(
+        telegram_id=telegram_id, defaults={"name": "Клиент"}
+    )
+    await sync_to_async(ActiveContext.objects.update_or_create)(
+        assistant_telegram_id="1", defaults={"client": client_obj}
+    )
+    timings["bot"] = time.perf_counter() - start
+
+    text = "Сколько стоит курс?"
+    if path == "http":
+        start = time.perf_counter()
+        await api_client.post_interaction({"telegram_id": telegram_id, "name": "Клиент", "text": text})
+        timings["http"] = time.perf_counter() - start
+    else:
+        await interactions.run_interaction(client_obj, text, timings)
+
+
+async def run(runs: int, port: int):
+    """
+    uvicorn работает в том же event loop, что и «бот», — как в serve_and_run_bot.py.
+    """
+    import uvicorn
+    from core.asgi import application
+    from bot import api_client, gpt_utils
+
+    server = uvicorn.Server(uvicorn.Config(application, host="127.0.0.1", port=port,
+                                           lifespan="off", log_level="warning"))
+    server_task = asyncio.create_task(server.serve())
+    while not server.started:
+        await asyncio.sleep(0.01)
+
+    results = {"http": [], "inprocess": []}
+    try:
+        for i in range(runs):
+            for path in results:
+                timings = {}
+                start = time.perf_counter()
+                await forward(path, 1000 + i, timings)
+                timings["total"] = time.perf_counter() - start
+                results[path].append(timings)
+    finally:
+        await api_client.close_api_client()
+        server.should_exit = True
+        await server_task
+        await gpt_utils.async_client.close()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=50)
+    parser.add_argument("--latency", type=float, default=0.05, help="задержка фейкового GPT, с")
+    parser.add_argument("--port", type=int, default=8766)
+    args = parser.parse_args()
+
+    handler = make_openai_handler(latency=args.latency, content=REPLY)
+    with tempfile.TemporaryDirectory() as tmp, FakeHTTPServer(handler) as gpt_server:
+        setup_django(Path(tmp) / "bench.sqlite3")
+        from openai import AsyncOpenAI
+        from bot import api_client, gpt_utils
+
+        gpt_utils.async_client = AsyncOpenAI(api_key="sk-benchmark", base_url=gpt_server.url + "/v1")
+        api_client.API_URL = f"http://127.0.0.1:{args.port}"
+        results = asyncio.run(run(args.runs, args.port))
+
+    for path, title in (("http", "через HTTP API"), ("inprocess", "напрямую")):
+        rows = results[path]
+        print(f"{title}: {format_latencies([r['total'] for r in rows])}")
+        for stage in rows[0]:
+            if stage != "total":
+                mean = statistics.mean(r[stage] for r in rows) * 1000
+                print(f"    {stage:10} {mean:7.1f}ms")
+
+    http_mean = statistics.mean(r["total"] for r in results["http"])
+    direct_mean = statistics.mean(r["total"] for r in results["inprocess"])
+    print(f"экономия на пересылке: {(http_mean - direct_mean) * 1000:.1f}ms в среднем")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+# benchmarks/bench_interaction_load.py
+
+"""
+Нагрузочный тест /api/interaction/: N запросов с заданной конкурентностью
+к ASGI-приложению (uvicorn в отдельном потоке) при фейковом OpenAI-сервере
+с фиксированной задержкой. Печатает p50/p99 и пропускную способность.
+
+    python -m benchmarks.bench_interaction_load --requests 500 --concurrency 200 --latency 1.0 --gpt-concurrency 200
+
+Синхронная view держала бы по одному запросу на поток; async view
+упирается только в задержку GPT и GPT_MAX_CONCURRENCY.
+
+С --cassette ответы GPT берутся из кассеты bot.gpt_transport (записанной
+с GPT_TRANSPORT=record или здесь же с --record) с записанными задержками,
+а --error-rate подмешивает 429/5xx — проверка под сбоями OpenAI без сети:
+
+    python -m benchmarks.bench_interaction_load --requests 20 --record /tmp/gpt_cassette.jsonl
+    python -m benchmarks.bench_interaction_load --cassette /tmp/gpt_cassette.jsonl --error-rate 0.2
+"""
+
+import argparse
+import asyncio
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+import httpx
+
+from benchmarks.common import setup_django, format_latencies
+from benchmarks.fakes import FakeHTTPServer, make_openai_handler
+
+
+REPLY = "Ответ клиенту:\nЗдравствуйте!\n\nПодсказка ассистенту:\nУточни цель.\n\n#Этап: S"
+
+
+def start_uvicorn(port: int):
+    import uvicorn
+    from core.asgi import application
+
+    server = uvicorn.Server(uvicorn.Config(application, host="127.0.0.1", port=port, log_level="warning"))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        time.sleep(0.05)
+    return server, thread
+
+
+async def run_load(url: str, total: int, concurrency: int):
+    latencies, errors = [], 0
+    semaphore = asyncio.Semaphore(concurrency)
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+
+    async with httpx.AsyncClient(base_url=url, timeout=120, limits=limits) as client:
+        async def one(i):
+            nonlocal errors
+            payload = {"telegram_id": str(100000 + i), "name": f"Клиент {i}", "text": "Сколько стоит курс?"}
+            async with semaphore:
+                start = time.perf_counter()
+                response = await client.post("/api/interaction/", json=payload)
+                if response.status_code == 200:
+                    latencies.append(time.perf_counter() - start)
+                else:
+                    errors += 1
+
+        start = time.perf_counter()
+        await asyncio.gather(*(one(i) for i in range(total)))
+        return latencies, errors, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--latency", type=float, default=1.0, help="задержка фейкового GPT, с")
+    parser.add_argument("--gpt-concurrency", type=int, default=None, help="GPT_MAX_CONCURRENCY")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--record", help="записать ответы фейкового GPT в кассету")
+    parser.add_argument("--cassette", help="отвечать из кассеты вместо фейкового GPT")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="доля запросов с ошибкой 429/5xx (с --cassette)")
+    args = parser.parse_args()
+
+    handler = make_openai_handler(latency=args.latency, content=REPLY)
+    with tempfile.TemporaryDirectory() as tmp, FakeHTTPServer(handler) as gpt_server:
+        setup_django(Path(tmp) / "bench.sqlite3")
+        from openai import AsyncOpenAI
+        from bot import gpt_transport, gpt_utils
+
+        if args.gpt_concurrency:
+            gpt_utils.GPT_MAX_CONCURRENCY = args.gpt_concurrency
+        transport = None
+        if args.cassette:
+            transport = gpt_transport.replay_transport(args.cassette, error_rate=args.error_rate)
+        elif args.record:
+            transport = gpt_transport.AsyncRecordingTransport(gpt_transport.Cassette(args.record))
+        gpt_utils.async_client = AsyncOpenAI(
+            api_key="sk-benchmark", base_url=gpt_server.url + "/v1", max_retries=gpt_utils.GPT_MAX_RETRIES,
+            http_client=gpt_transport.http_client(asynchronous=True, transport=transport),
+        )
+        server, thread = start_uvicorn(args.port)
+        try:
+            latencies, errors, elapsed = asyncio.run(
+                run_load(f"http://127.0.0.1:{args.port}", args.requests, args.concurrency)
+            )
+        finally:
+            server.should_exit = True
+            thread.join()
+
+    gpt = f"кассета {args.cassette}" if args.cassette else f"задержка GPT: {args.latency}s"
+    print(f"запросов: {args.requests}, конкурентность: {args.concurrency}, {gpt}")
+    print(f"латентность: {format_latencies(latencies)}")
+    print(f"пропускная способность: {len(latencies) / elapsed:.1f} req/s, ошибок: {errors}")
+    if args.cassette:
+        print(f"кассета: {transport.stats}")
+    else:
+        print(f"одновременно в GPT (максимум): {handler.stats.get('max_in_flight', 0)}")
+
+
+if __name__ == "__main__":
+    main()
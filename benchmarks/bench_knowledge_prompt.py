@@ -0,0 +1,84 @@
+# benchmarks/bench_knowledge_prompt.py
+
+"""
+Сравнивает размер и время сборки базы знаний для prompt:
+весь KnowledgeBlock (KNOWLEDGE_MODE=full) против top-k фрагментов BM25.
+
+    python -m benchmarks.bench_knowledge_prompt                   # синтетическая база знаний
+    python -m benchmarks.bench_knowledge_prompt --kb-file kb.txt --top-k 4
+"""
+
+import argparse
+import random
+import statistics
+import time
+
+from benchmarks.common import setup_django
+
+
+QUESTIONS = [
+    "Сколько стоит курс и есть ли рассрочка?",
+    "Когда старт ближайшего потока?",
+    "Кто ведёт занятия?",
+    "Выдаёте ли вы сертификат после обучения?",
+    "Можно ли вернуть деньги, если не понравится?",
+    "Сколько часов в неделю нужно уделять учёбе?",
+    "Есть ли домашние задания и обратная связь?",
+    "Подойдёт ли курс новичку без опыта?",
+]
+
+TOPICS = [
+    "стоимость курса и рассрочка", "старт потока и расписание", "преподаватели и кураторы",
+    "сертификат и диплом", "возврат денег и гарантии", "нагрузка и часы в неделю",
+    "домашние задания и обратная связь", "требования к новичкам", "бонусы и скидки",
+    "доступ к материалам после курса", "чат выпускников", "трудоустройство",
+]
+
+
+def synthetic_knowledge(paragraphs: int, seed: int = 1) -> str:
+    rnd = random.Random(seed)
+    filler = "Подробности обсуждаются с менеджером, условия могут меняться в зависимости от потока."
+    return "\n\n".join(
+        f"Раздел {i}: {rnd.choice(TOPICS)}. " + " ".join([filler] * rnd.randint(2, 6))
+        for i in range(paragraphs)
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--kb-file", help="текстовый файл базы знаний (по умолчанию — синтетика)")
+    parser.add_argument("--paragraphs", type=int, default=150)
+    parser.add_argument("--top-k", type=int, default=None)
+    args = parser.parse_args()
+
+    setup_django()
+    from bot.knowledge_index import KnowledgeIndex, KNOWLEDGE_TOP_K
+    from bot.tokens import count_tokens, get_encoding
+
+    content = open(args.kb_file, encoding="utf-8").read() if args.kb_file else synthetic_knowledge(args.paragraphs)
+    top_k = args.top_k or KNOWLEDGE_TOP_K
+
+    start = time.perf_counter()
+    index = KnowledgeIndex.build(content)
+    build_ms = (time.perf_counter() - start) * 1000
+
+    full_tokens = count_tokens(content)
+    retrieved_tokens, search_ms = [], []
+    for question in QUESTIONS:
+        start = time.perf_counter()
+        chunks = index.search(question, top_k)
+        search_ms.append((time.perf_counter() - start) * 1000)
+        retrieved_tokens.append(count_tokens("\n\n".join(chunks)))
+
+    tokenizer = "tiktoken" if get_encoding() is not None else "оценка по символам"
+    print(f"фрагментов: {len(index.chunks)}, построение индекса: {build_ms:.1f}ms, токенизатор: {tokenizer}")
+    print(f"full:      {full_tokens} токенов базы знаний на вызов")
+    print(
+        f"retrieval: {statistics.mean(retrieved_tokens):.0f} токенов в среднем (top-k={top_k}), "
+        f"поиск {statistics.mean(search_ms):.2f}ms, "
+        f"экономия {100 * (1 - statistics.mean(retrieved_tokens) / max(full_tokens, 1)):.0f}%"
+    )
+
+
+if __name__ == "__main__":
+    main()
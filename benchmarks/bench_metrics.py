@@ -0,0 +1,67 @@
+# benchmarks/bench_metrics.py
+
+"""
+Цена инструментирования: один span (гистограмма + trace) и trace целиком
+против голого блока — чтобы спаны можно было ставить на каждый этап.
+Плюс пример /metrics после нескольких пересылок через фейковый OpenAI.
+
+    python -m benchmarks.bench_metrics --spans 200000 --forwards 20
+"""
+
+import argparse
+import asyncio
+import contextlib
+import tempfile
+import time
+from pathlib import Path
+
+from benchmarks.common import setup_django
+from benchmarks.fakes import FakeHTTPServer, make_openai_handler
+
+
+def per_call_ns(block, calls: int) -> float:
+    start = time.perf_counter()
+    for _ in range(calls):
+        with block():
+            pass
+    return (time.perf_counter() - start) / calls * 1e9
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--spans", type=int, default=200000)
+    parser.add_argument("--forwards", type=int, default=20)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        setup_django(Path(tmp) / "bench.sqlite3")
+        from openai import AsyncOpenAI
+        from bot import gpt_utils, interactions, metrics
+
+        metrics.METRICS_TRACE_LOG = False
+        bare = per_call_ns(contextlib.nullcontext, args.spans)
+        span = per_call_ns(lambda: metrics.span("bench"), args.spans)
+        with metrics.trace():
+            traced = per_call_ns(lambda: metrics.span("bench"), args.spans // 10)
+        print(f"пустой блок      {bare:7.0f} нс")
+        print(f"span             {span:7.0f} нс")
+        print(f"span внутри trace{traced:7.0f} нс")
+
+        metrics.clear_metrics()
+        with FakeHTTPServer(make_openai_handler(latency=0.05)) as server:
+            async def run():
+                gpt_utils.async_client = AsyncOpenAI(api_key="sk-benchmark", base_url=server.url + "/v1")
+                for i in range(args.forwards):
+                    client = await interactions.get_client(1000 + i, f"Клиент {i}")
+                    with metrics.trace():
+                        await interactions.run_interaction(client, f"Сколько стоит курс? #{i}")
+                await gpt_utils.async_client.close()
+
+            asyncio.run(run())
+
+        print()
+        print("\n".join(line for line in metrics.render().splitlines() if "_bucket" not in line))
+
+
+if __name__ == "__main__":
+    main()
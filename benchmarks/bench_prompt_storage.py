@@ -0,0 +1,132 @@
+# benchmarks/bench_prompt_storage.py
+
+"""
+Размер таблицы Interaction: полный текст prompt в каждой строке (как раньше)
+против ссылок на PromptBlock + переменной части. Синтетические prompt
+собираются как в build_prompt: инструкции, база знаний (вся — KNOWLEDGE_MODE=full,
+или top-k фрагментов — retrieval), SPIN-этап, история и новое сообщение.
+
+Размер считается по страницам SQLite (dbstat) для bot_interaction и
+bot_promptblock вместе с индексами, после VACUUM. По умолчанию вставляется
+--interactions строк и результат пересчитывается на 1M; для честного 1M
+передайте --interactions 1000000 (нужно несколько ГБ диска для старого формата).
+
+    python -m benchmarks.bench_prompt_storage --interactions 20000
+"""
+
+import argparse
+import random
+import tempfile
+import time
+from pathlib import Path
+
+from benchmarks.common import setup_django
+
+
+TARGET = 1_000_000
+KNOWLEDGE_CHUNKS = 40
+CHUNK_CHARS = 800
+DISTINCT_FRAGMENT_SETS = 300  # разных наборов top-k фрагментов на практике немного
+BATCH = 2000
+
+
+def synthetic_knowledge(rng) -> list:
+    words = "курс обучение модуль практика куратор оплата рассрочка сертификат доступ вебинар".split()
+    return [
+        " ".join(rng.choice(words) for _ in range(CHUNK_CHARS // 8))[:CHUNK_CHARS]
+        for _ in range(KNOWLEDGE_CHUNKS)
+    ]
+
+
+def make_prompts(mode: str, count: int, rng):
+    from bot.prompts import Prompt, SALES_INSTRUCTIONS
+
+    chunks = synthetic_knowledge(rng)
+    fragment_sets = [
+        "\n\n".join(chunks[i] for i in sorted(rng.sample(range(KNOWLEDGE_CHUNKS), 4)))
+        for _ in range(DISTINCT_FRAGMENT_SETS)
+    ]
+    system = SALES_INSTRUCTIONS
+    if mode == "full":
+        system = f"{SALES_INSTRUCTIONS}\n\nБаза знаний:\n" + "\n\n".join(chunks)
+
+    for i in range(count):
+        history = "\n".join(
+            f"{'Клиент' if j % 2 else 'Бот'}: сообщение {i}-{j} " + "текст " * rng.randint(5, 25)
+            for j in range(10)
+        )
+        user = (
+            f"Клиент по имени Клиент {i % 5000} ведет переписку.\n\n"
+            f"Текущий SPIN-этап клиента: P — Problem (проблемные вопросы)\n\n"
+            f"История сообщений\n{history}\n\nНовое сообщение клиента:\n\"Сколько стоит курс {i}?\""
+        )
+        knowledge = "" if mode == "full" else rng.choice(fragment_sets)
+        yield Prompt(system=system, user=user, knowledge=knowledge)
+
+
+def table_bytes() -> int:
+    from django.db import connection
+
+    with connection.cursor() as cursor:
+        cursor.execute("VACUUM")
+        cursor.execute(
+            "SELECT SUM(pgsize) FROM dbstat WHERE name IN ("
+            " SELECT name FROM sqlite_schema WHERE tbl_name IN ('bot_interaction', 'bot_promptblock'))"
+        )
+        return cursor.fetchone()[0] or 0
+
+
+def fill(prompts, clients, dedup: bool) -> float:
+    from django.db import transaction
+    from bot.models import Interaction
+    from bot.prompt_store import prompt_fields
+
+    start, batch = time.perf_counter(), []
+    for i, prompt in enumerate(prompts):
+        with transaction.atomic():
+            fields = prompt_fields(prompt) if dedup else {"prompt": str(prompt)}
+        batch.append(Interaction(
+            client=clients[i % len(clients)], gpt_response="Ответ клиенту", assistant_hint="Подсказка",
+            stage_detected="P", **fields,
+        ))
+        if len(batch) >= BATCH:
+            Interaction.objects.bulk_create(batch)
+            batch = []
+    Interaction.objects.bulk_create(batch)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--interactions", type=int, default=20000)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        setup_django(Path(tmp) / "bench.sqlite3")
+        from bot.models import Client, Interaction, PromptBlock
+        from bot.prompt_store import clear_block_cache
+
+        clients = Client.objects.bulk_create([Client(telegram_id=str(i), name=f"Клиент {i}") for i in range(5000)])
+        scale = TARGET / args.interactions
+        print(f"вставлено Interaction: {args.interactions}, пересчёт на {TARGET // 1000}k")
+
+        for mode in ("full", "retrieval"):
+            sizes = {}
+            for dedup in (False, True):
+                Interaction.objects.all().delete()
+                PromptBlock.objects.all().delete()
+                clear_block_cache()
+                elapsed = fill(make_prompts(mode, args.interactions, random.Random(args.seed)), clients, dedup)
+                sizes[dedup] = table_bytes()
+                title = "ссылки на PromptBlock" if dedup else "полный prompt"
+                print(
+                    f"  KNOWLEDGE_MODE={mode:9} {title:22} "
+                    f"{sizes[dedup] / args.interactions / 1024:6.1f} KB/строку, "
+                    f"на 1M: {sizes[dedup] * scale / 1024 ** 3:6.2f} ГБ (запись {elapsed:.1f}s)"
+                )
+            print(f"  KNOWLEDGE_MODE={mode:9} уменьшение в {sizes[False] / max(sizes[True], 1):.1f} раза")
+
+
+if __name__ == "__main__":
+    main()
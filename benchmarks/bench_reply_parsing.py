@@ -0,0 +1,75 @@
+# benchmarks/bench_reply_parsing.py
+
+"""
+Доля оплаченных, но непригодных ответов GPT: прежний разбор регулярками
+(gpt_utils.parse_gpt_reply) против parse_reply с локальной починкой
+на корпусе записанных ответов.
+
+Корпус — JSONL, строка {"format": "text" | "json_schema", "content": ...}:
+в каком формате просили ответ и что пришло (content null — отказ модели).
+По умолчанию — небольшой пример benchmarks/corpus/gpt_replies.jsonl.
+
+    python -m benchmarks.bench_reply_parsing --corpus benchmarks/corpus/gpt_replies.jsonl
+
+Прежний разбор «годным» считает ответ, где нашлись обе секции; иначе
+ассистент видел заглушку «Извините, не удалось…». Для нового разбора
+непригодный ответ — тот, что уйдёт в повторный запрос (GPT_PARSE_RETRIES).
+"""
+
+import argparse
+import json
+import re
+import time
+from pathlib import Path
+
+from benchmarks.common import setup_django
+
+
+DEFAULT_CORPUS = Path(__file__).parent / "corpus" / "gpt_replies.jsonl"
+
+
+def legacy_usable(content) -> bool:
+    text = content or ""
+    return bool(
+        re.search(r"Ответ клиенту:\s*(.*?)\n+Подсказка ассистенту:", text, re.DOTALL)
+        and re.search(r"Подсказка ассистенту:\s*(.*?)\n+#Этап:", text, re.DOTALL)
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--corpus", type=Path, default=DEFAULT_CORPUS)
+    args = parser.parse_args()
+
+    setup_django(migrate=False)
+    from bot import gpt_utils
+    from bot.reply_format import ReplyParseError
+
+    records = [json.loads(line) for line in args.corpus.read_text(encoding="utf-8").splitlines() if line.strip()]
+
+    for fmt in ("text", "json_schema"):
+        contents = [r["content"] for r in records if r["format"] == fmt]
+        if not contents:
+            continue
+        gpt_utils.GPT_RESPONSE_FORMAT = fmt
+        outcomes = {"ok": 0, "repaired": 0, "failed": 0}
+        start = time.perf_counter()
+        for content in contents:
+            try:
+                outcomes[gpt_utils.parse_reply(content)[1]] += 1
+            except ReplyParseError:
+                outcomes["failed"] += 1
+        us = (time.perf_counter() - start) / len(contents) * 1e6
+        legacy_failed = sum(not legacy_usable(content) for content in contents)
+
+        print(f"{fmt} ({len(contents)} ответов):")
+        print(f"  регулярки:    непригодны {legacy_failed / len(contents):.0%}")
+        print(
+            f"  parse_reply:  сразу {outcomes['ok']}, после починки {outcomes['repaired']}, "
+            f"на повторный запрос {outcomes['failed']} ({outcomes['failed'] / len(contents):.0%}), "
+            f"{us:.1f} мкс на ответ"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,54 @@
+# benchmarks/bench_response_cache.py
+
+"""
+Стоимость поиска в кэше ответов (bot.response_cache): точное совпадение
+и поиск похожего вопроса по векторам триграмм при заполненном кэше.
+
+    python -m benchmarks.bench_response_cache --entries 1000 --lookups 2000
+"""
+
+import argparse
+import random
+import time
+
+from benchmarks.common import setup_django
+
+
+WORDS = "сколько стоит курс когда старт есть рассрочка скидка длится занятия сертификат возврат".split()
+
+
+def per_lookup_us(lookup, keys: list) -> tuple:
+    hits = 0
+    start = time.perf_counter()
+    for key in keys:
+        hits += lookup(key) is not None
+    return (time.perf_counter() - start) / len(keys) * 1e6, hits / len(keys)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--entries", type=int, default=1000)
+    parser.add_argument("--lookups", type=int, default=2000)
+    parser.add_argument("--similarity", type=float, default=0.8)
+    args = parser.parse_args()
+
+    setup_django(migrate=False)
+    from bot import response_cache
+
+    rng = random.Random(1)
+    questions = [" ".join(rng.choices(WORDS, k=rng.randint(3, 7))) for _ in range(args.entries)]
+    for question in questions:
+        key = response_cache.make_key(question, "S", "v1")
+        response_cache.store(key, {"reply": "ответ", "assistant_hint": "подсказка", "stage": "S"}, None)
+
+    asked = [rng.choice(questions) + rng.choice(["", "?", " ну"]) for _ in range(args.lookups)]
+    keys = [response_cache.make_key(q, "S", "v1") for q in asked]
+
+    for similarity in (0.0, args.similarity):
+        response_cache.RESPONSE_CACHE_SIMILARITY = similarity
+        us, hit_rate = per_lookup_us(lambda key: response_cache.lookup(key, None), keys)
+        print(f"порог {similarity:.2f}: {us:8.1f} мкс на поиск, попаданий {hit_rate:.0%}")
+
+
+if __name__ == "__main__":
+    main()
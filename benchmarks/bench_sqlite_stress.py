@@ -0,0 +1,125 @@
+# benchmarks/bench_sqlite_stress.py
+
+"""
+Конкурентная запись в один файл SQLite из нескольких процессов (как бот и API),
+в каждом — много одновременных «запросов» со своим потоком для sync_to_async.
+Каждый запрос — persist_interaction, с целевой частотой --rate записей
+в секунду на процесс. Сравниваются журнал по умолчанию без очереди записи
+и рабочий профиль (WAL + прагмы + db.run_write).
+
+    python -m benchmarks.bench_sqlite_stress --processes 2 --rate 100 --duration 5
+"""
+
+import argparse
+import asyncio
+import multiprocessing
+import os
+import shutil
+import tempfile
+import time
+from pathlib import Path
+
+from benchmarks.common import setup_django, format_latencies
+
+
+GPT_RESULT = {"reply": "Здравствуйте!", "assistant_hint": "Уточни цель.", "stage": "S", "usage": {}}
+
+
+def writer_process(database_path: str, production: bool, index: int, rate: float,
+                   duration: float, concurrency: int, results):
+    os.environ["SQLITE_PRODUCTION"] = "1" if production else "0"
+    setup_django(database_path, migrate=False)
+
+    from unittest.mock import patch
+    from asgiref.sync import ThreadSensitiveContext
+    from django.db import OperationalError
+    from bot import db, interactions
+
+    latencies, errors = [], []
+
+    async def one(i):
+        async with ThreadSensitiveContext():  # как отдельный ASGI-запрос
+            start = time.perf_counter()
+            try:
+                client = await interactions.get_client(f"{index}-{i % 50}", "Клиент")
+                await db.run_write(interactions.persist_interaction, client, "Вопрос", "prompt", GPT_RESULT)
+                latencies.append(time.perf_counter() - start)
+            except OperationalError as e:
+                errors.append(str(e))
+
+    async def run():
+        semaphore = asyncio.Semaphore(concurrency)
+        tasks, start = [], time.perf_counter()
+
+        async def limited(i):
+            async with semaphore:
+                await one(i)
+
+        for i in range(int(rate * duration)):
+            # равномерная подача с целевой частотой
+            await asyncio.sleep(max(0.0, start + i / rate - time.perf_counter()))
+            tasks.append(asyncio.create_task(limited(i)))
+        await asyncio.gather(*tasks)
+        return time.perf_counter() - start
+
+    with patch("bot.interactions.schedule_summary_update"), \
+            patch.object(db, "serialize_writes", lambda using="default": production):
+        elapsed = asyncio.run(run())
+    results.put((latencies, errors, elapsed))
+
+
+def run_mode(template: Path, production: bool, args) -> tuple:
+    with tempfile.TemporaryDirectory() as tmp:
+        database_path = str(Path(tmp) / "stress.sqlite3")
+        shutil.copyfile(template, database_path)
+
+        context = multiprocessing.get_context("spawn")
+        results = context.Queue()
+        processes = [
+            context.Process(target=writer_process, args=(
+                database_path, production, index, args.rate, args.duration, args.concurrency, results,
+            ))
+            for index in range(args.processes)
+        ]
+        for process in processes:
+            process.start()
+        collected = [results.get() for _ in processes]
+        for process in processes:
+            process.join()
+
+    latencies = [value for r in collected for value in r[0]]
+    errors = [value for r in collected for value in r[1]]
+    elapsed = max(r[2] for r in collected)
+    return latencies, errors, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--processes", type=int, default=2)
+    parser.add_argument("--rate", type=float, default=100, help="записей в секунду на процесс")
+    parser.add_argument("--duration", type=float, default=5)
+    parser.add_argument("--concurrency", type=int, default=64, help="одновременных запросов на процесс")
+    args = parser.parse_args()
+
+    target = args.rate * args.processes
+    print(f"процессов: {args.processes}, цель: {target:.0f} записей/с, {args.duration:.0f} с")
+    with tempfile.TemporaryDirectory() as tmp:
+        # Схема создаётся один раз; каждый режим пишет в свою копию
+        template = Path(tmp) / "template.sqlite3"
+        os.environ["SQLITE_PRODUCTION"] = "0"
+        setup_django(template)
+        from django.db import connections
+        connections.close_all()
+
+        for production, title in ((False, "по умолчанию"), (True, "WAL + очередь")):
+            latencies, errors, elapsed = run_mode(template, production, args)
+            print(
+                f"{title:14} записано={len(latencies)} ({len(latencies) / elapsed:.0f}/с) "
+                f"ошибок блокировки={len(errors)} | {format_latencies(latencies)}"
+            )
+            if errors:
+                print(f"{'':14} например: {errors[0]}")
+
+
+if __name__ == "__main__":
+    main()
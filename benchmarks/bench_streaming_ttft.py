@@ -0,0 +1,72 @@
+# benchmarks/bench_streaming_ttft.py
+
+"""
+Время до первого видимого текста ответа клиенту: полный ответ (acall_gpt)
+против стриминга (astream_gpt + SectionStreamParser) на локальном
+фейковом OpenAI-сервере, отдающем SSE-чанки.
+
+    python -m benchmarks.bench_streaming_ttft --runs 10 --latency 0.5 --chunk-delay 0.03
+"""
+
+import argparse
+import asyncio
+import time
+
+from benchmarks.common import setup_django, format_latencies
+from benchmarks.fakes import FakeHTTPServer, make_openai_handler
+
+
+REPLY = (
+    "Ответ клиенту:\n"
+    + "Здравствуйте! Спасибо за интерес к курсу. " * 8
+    + "\n\nПодсказка ассистенту:\n"
+    + "Уточни, какую задачу клиент хочет решить с помощью курса. " * 4
+    + "\n\n#Этап: S"
+)
+
+
+async def measure_full(gpt_utils):
+    start = time.perf_counter()
+    await gpt_utils.acall_gpt("prompt")
+    elapsed = time.perf_counter() - start
+    return elapsed, elapsed
+
+
+async def measure_stream(gpt_utils):
+    parser = gpt_utils.SectionStreamParser()
+    first = None
+    start = time.perf_counter()
+    async for delta in gpt_utils.astream_gpt("prompt"):
+        for event in parser.feed(delta):
+            if first is None and event["type"] == "delta" and event["section"] == "reply":
+                first = time.perf_counter() - start
+    return first, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--latency", type=float, default=0.5, help="задержка до первого токена")
+    parser.add_argument("--chunk-delay", type=float, default=0.03)
+    args = parser.parse_args()
+
+    setup_django()
+    from openai import AsyncOpenAI
+    from bot import gpt_utils
+
+    handler = make_openai_handler(latency=args.latency, content=REPLY, chunk_size=6, chunk_delay=args.chunk_delay)
+    with FakeHTTPServer(handler) as server:
+        async def run():
+            gpt_utils.async_client = AsyncOpenAI(api_key="sk-benchmark", base_url=server.url + "/v1")
+            try:
+                for name, measure in (("полный ответ", measure_full), ("стриминг", measure_stream)):
+                    results = [await measure(gpt_utils) for _ in range(args.runs)]
+                    first, total = [r[0] for r in results], [r[1] for r in results]
+                    print(f"{name:14} до первого текста: {format_latencies(first)} | всего: {format_latencies(total)}")
+            finally:
+                await gpt_utils.async_client.close()
+
+        asyncio.run(run())
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+# benchmarks/bench_webhook.py
+
+"""
+Пропускная способность приёма апдейтов: long polling против webhook.
+Фейковый Telegram отвечает на sendMessage с задержкой --send-delay;
+апдейты — /start из --chats разных чатов. В режиме webhook апдейты
+POST-ятся в /api/telegram/webhook/ того же ASGI-приложения, что и API.
+
+getUpdates отдаёт до 100 апдейтов за запрос, а webhook — по одному запросу
+через весь стек Django на апдейт, поэтому в одном процессе polling быстрее;
+webhook нужен, чтобы бот работал во всех воркерах API.
+
+    python -m benchmarks.bench_webhook --updates 500 --chats 50 --send-delay 0.05
+"""
+
+import argparse
+import asyncio
+import os
+import socket
+import tempfile
+import time
+from pathlib import Path
+
+from benchmarks.common import setup_django
+from benchmarks.fakes import FakeHTTPServer, make_telegram_handler, telegram_update
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def make_updates(count: int, chats: int) -> list:
+    return [telegram_update(i + 1, "/start", user_id=1000 + i % chats) for i in range(count)]
+
+
+async def wait_sent(handler, count: int, timeout: float = 120):
+    deadline = time.perf_counter() + timeout
+    while len(handler.sent) < count:
+        if time.perf_counter() > deadline:
+            raise RuntimeError(f"бот ответил на {len(handler.sent)} из {count} апдейтов")
+        await asyncio.sleep(0.005)
+
+
+def build_application_for(telegram):
+    from bot import bot_main
+    bot_main.TELEGRAM_BASE_URL = telegram.url + "/bot"
+    return bot_main.build_application()
+
+
+async def measure_polling(args, updates: list) -> float:
+    from bot import dispatcher
+
+    handler = make_telegram_handler(updates, poll_delay=0.05, send_delay=args.send_delay)
+    with FakeHTTPServer(handler) as telegram:
+        dispatcher.BOT_MODE = "polling"
+        app = build_application_for(telegram)
+        start = time.perf_counter()
+        current = await dispatcher.start_application(app)
+        await wait_sent(handler, len(updates))
+        elapsed = time.perf_counter() - start
+        await dispatcher.stop_application(app, current, timeout=10)
+    return elapsed
+
+
+async def measure_webhook(args, updates: list) -> float:
+    import httpx
+    import uvicorn
+    from bot import dispatcher
+
+    handler = make_telegram_handler(send_delay=args.send_delay)
+    with FakeHTTPServer(handler) as telegram:
+        dispatcher.BOT_MODE = "webhook"
+        app = build_application_for(telegram)
+        current = await dispatcher.start_application(app, register_webhook=False)
+
+        port = free_port()
+        server = uvicorn.Server(uvicorn.Config(
+            "core.asgi:application", host="127.0.0.1", port=port, log_level="warning", lifespan="off",
+        ))
+        serving = asyncio.create_task(server.serve())
+        while not server.started:
+            await asyncio.sleep(0.01)
+
+        url = f"http://127.0.0.1:{port}{dispatcher.TELEGRAM_WEBHOOK_PATH}"
+        limits = httpx.Limits(max_connections=dispatcher.TELEGRAM_WEBHOOK_MAX_CONNECTIONS)
+        async with httpx.AsyncClient(limits=limits) as http:
+            async def deliver(update):
+                # Как Telegram: при 429 доставка повторяется позже
+                while (await http.post(url, json=update)).status_code == 429:
+                    await asyncio.sleep(0.05)
+
+            start = time.perf_counter()
+            await asyncio.gather(*(deliver(update) for update in updates))
+            await wait_sent(handler, len(updates))
+            elapsed = time.perf_counter() - start
+
+        server.should_exit = True
+        await serving
+        await dispatcher.stop_application(app, current, timeout=10)
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--updates", type=int, default=500)
+    parser.add_argument("--chats", type=int, default=50)
+    parser.add_argument("--send-delay", type=float, default=0.05, help="задержка ответа sendMessage")
+    args = parser.parse_args()
+
+    os.environ.setdefault("TELEGRAM_BOT_TOKEN", "123:bench")
+    with tempfile.TemporaryDirectory() as tmp:
+        setup_django(Path(tmp) / "bench.sqlite3")
+        updates = make_updates(args.updates, args.chats)
+
+        for title, measure in (("polling", measure_polling), ("webhook", measure_webhook)):
+            elapsed = asyncio.run(measure(args, updates))
+            print(f"{title:8} {args.updates / elapsed:8.1f} апдейтов/с ({elapsed:.2f}s на {args.updates})")
+
+
+if __name__ == "__main__":
+    main()
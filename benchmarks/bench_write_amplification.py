@@ -0,0 +1,130 @@
+# benchmarks/bench_write_amplification.py
+
+"""
+Сколько SQL-запросов, записей и коммитов (а значит, fsync) стоит одна
+пересылка: прежний путь (отдельные автокоммиты бота и view) против
+persist_interaction (одна транзакция, bulk_create и upsert).
+
+SQLite в режиме журнала по умолчанию (DELETE, synchronous=FULL) делает
+на каждый коммит минимум два fsync — журнала и файла базы; здесь это
+оценивается как коммиты × 2.
+
+    python -m benchmarks.bench_write_amplification --runs 200
+"""
+
+import argparse
+import tempfile
+import time
+from pathlib import Path
+
+from benchmarks.common import setup_django
+
+
+GPT_RESULT = {"reply": "Здравствуйте!", "assistant_hint": "Уточни цель.", "stage": "S", "usage": {}}
+FSYNC_PER_COMMIT = 2
+
+
+class WriteCounter:
+    """
+    execute_wrapper: считает запросы, пишущие запросы и коммиты —
+    каждую запись вне транзакции и каждую транзакцию с записями.
+    """
+
+    def __init__(self, connection):
+        self.connection = connection
+        self.queries = self.writes = self.commits = 0
+        self._in_dirty_block = False
+
+    def __call__(self, execute, sql, params, many, context):
+        self.queries += 1
+        if sql.lstrip().upper().startswith(("INSERT", "UPDATE", "DELETE")):
+            self.writes += 1
+            if not self.connection.in_atomic_block:
+                self.commits += 1
+            elif not self._in_dirty_block:
+                from django.db import transaction
+                self._in_dirty_block = True
+                transaction.on_commit(self._committed)
+        return execute(sql, params, many, context)
+
+    def _committed(self):
+        self.commits += 1
+        self._in_dirty_block = False
+
+
+def legacy_forward(telegram_id: str, text: str):
+    """
+    Запись так, как её делали бот и прежний interaction_view.
+    """
+    from bot.models import ActiveContext, Client, Interaction, Message, Stage
+
+    # бот
+    client, _ = Client.objects.get_or_create(telegram_id=telegram_id, defaults={"name": "Клиент"})
+    ActiveContext.objects.update_or_create(assistant_telegram_id="1", defaults={"client": client})
+    # view
+    client, _ = Client.objects.get_or_create(telegram_id=telegram_id, defaults={"name": "Клиент"})
+    Message.objects.create(client=client, text=text, author="client")
+    Message.objects.create(client=client, text=GPT_RESULT["reply"], author="bot")
+    Interaction.objects.create(
+        client=client, prompt="prompt", gpt_response=GPT_RESULT["reply"],
+        assistant_hint=GPT_RESULT["assistant_hint"], stage_detected=GPT_RESULT["stage"],
+    )
+    Stage.objects.update_or_create(client=client, defaults={"stage": GPT_RESULT["stage"]})
+
+
+def batched_forward(telegram_id: str, text: str):
+    from bot.interactions import persist_interaction
+    from bot.models import Client
+
+    client, _ = Client.objects.get_or_create(telegram_id=telegram_id, defaults={"name": "Клиент"})
+    persist_interaction(client, text, "prompt", GPT_RESULT, assistant_id=1)
+
+
+def measure(forward, runs: int, prefix: str) -> dict:
+    from django.db import connection
+
+    counter = WriteCounter(connection)
+    start = time.perf_counter()
+    with connection.execute_wrapper(counter):
+        for i in range(runs):
+            # половина пересылок — от нового клиента, половина — от уже известного
+            forward(f"{prefix}{i // 2}", f"Сообщение {i}")
+    elapsed = time.perf_counter() - start
+    return {
+        "queries": counter.queries / runs,
+        "writes": counter.writes / runs,
+        "commits": counter.commits / runs,
+        "ms": elapsed / runs * 1000,
+    }
+
+
+def patch_summaries():
+    # фоновое резюмирование к записи пересылки не относится
+    from unittest.mock import patch
+    return patch("bot.interactions.schedule_summary_update")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=200)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        setup_django(Path(tmp) / "bench.sqlite3")
+        with patch_summaries():
+            results = {
+                "прежний путь": measure(legacy_forward, args.runs, "legacy-"),
+                "одна транзакция": measure(batched_forward, args.runs, "batched-"),
+            }
+
+    print("на одну пересылку:")
+    for name, r in results.items():
+        print(
+            f"  {name:16} запросов={r['queries']:.1f} записей={r['writes']:.1f} "
+            f"коммитов={r['commits']:.1f} (~{r['commits'] * FSYNC_PER_COMMIT:.0f} fsync) "
+            f"время={r['ms']:.2f}ms"
+        )
+
+
+if __name__ == "__main__":
+    main()
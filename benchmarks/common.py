@@ -0,0 +1,52 @@
+# benchmarks/common.py
+
+import os
+import statistics
+from pathlib import Path
+
+
+def setup_django(database_path=None, migrate=True):
+    """
+    Инициализирует Django для запуска бенчмарка как обычного скрипта.
+    С database_path работает с отдельной SQLite-базой (создаёт схему миграциями,
+    если migrate=True), чтобы не трогать рабочий db.sqlite3.
+    """
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "core.settings")
+    os.environ.setdefault("OPENAI_API_KEY", "sk-benchmark")
+    os.environ.setdefault("ALLOWED_HOSTS", "127.0.0.1,localhost")
+
+    import django
+    from django.conf import settings
+
+    if database_path is not None:
+        # Индекс и версия базы знаний — рядом с временной базой
+        workdir = Path(database_path).parent
+        os.environ.setdefault("KNOWLEDGE_INDEX_PATH", str(workdir / "knowledge_index.npz"))
+        os.environ.setdefault("KNOWLEDGE_VERSION_PATH", str(workdir / "knowledge.version"))
+        settings.DATABASES["default"] = {
+            "ENGINE": "django.db.backends.sqlite3",
+            "NAME": str(database_path),
+        }
+    django.setup()
+
+    if database_path is not None and migrate:
+        from django.core.management import call_command
+        call_command("migrate", verbosity=0, skip_checks=True)
+
+
+def percentile(values: list, p: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(p / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def format_latencies(values: list) -> str:
+    if not values:
+        return "нет данных"
+    return (
+        f"p50={percentile(values, 50) * 1000:.0f}ms "
+        f"p99={percentile(values, 99) * 1000:.0f}ms "
+        f"mean={statistics.mean(values) * 1000:.0f}ms"
+    )
@@ -0,0 +1,296 @@
+# benchmarks/fakes.py
+
+"""
+Локальные фейковые HTTP-серверы для тестов и бенчмарков.
+Работают в отдельном потоке, поэтому не требуют сети и внешних сервисов.
+"""
+
+import json
+import threading
+import time
+from urllib.parse import parse_qsl
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class _Server(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 256  # иначе под нагрузкой соединения ждут в backlog
+
+
+class FakeHTTPServer:
+    """
+    Запускает ThreadingHTTPServer на свободном порту в фоновом потоке.
+    Используется как контекстный менеджер:
+
+        with FakeHTTPServer(handler_cls) as server:
+            httpx.get(server.url + "/path")
+    """
+
+    def __init__(self, handler_cls, host: str = "127.0.0.1"):
+        self.httpd = _Server((host, 0), handler_cls)
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+    @property
+    def url(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+        self.thread.join()
+
+
+class JSONHandler(BaseHTTPRequestHandler):
+    """
+    Отвечает фиксированным JSON на любой POST после задержки `latency` секунд.
+    Параметры задаются через make_json_handler.
+    """
+
+    protocol_version = "HTTP/1.1"  # keep-alive
+    latency = 0.0
+    payload: dict = {}
+
+    def log_message(self, *args):
+        pass
+
+    def _read_body(self) -> bytes:
+        length = int(self.headers.get("Content-Length") or 0)
+        return self.rfile.read(length) if length else b""
+
+    def _send_json(self, data: dict, status: int = 200):
+        body = json.dumps(data, ensure_ascii=False).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        self._read_body()
+        time.sleep(self.latency)
+        self._send_json(self.payload)
+
+
+def make_json_handler(payload: dict, latency: float = 0.0):
+    return type("FakeJSONHandler", (JSONHandler,), {"payload": payload, "latency": latency})
+
+
+class OpenAIHandler(JSONHandler):
+    """
+    Имитирует POST /v1/chat/completions: отвечает через `latency` секунд
+    готовым completion с текстом `content` (или по очереди текстами `replies`,
+    последний повторяется). Считает одновременные запросы, последний
+    запрос — в stats["last_request"].
+    """
+
+    content = "Ответ клиенту:\nЗдравствуйте!\n\nПодсказка ассистенту:\nУточни цель.\n\n#Этап: S"
+    replies: list = []
+    chunk_size = 8       # символов в одном SSE-чанке при stream=True
+    chunk_delay = 0.0    # пауза между чанками
+    cached_tokens = 0    # сколько токенов prompt «попало в кэш» (usage.prompt_tokens_details)
+    rate_limit = 0       # запросов за rate_period секунд (token bucket, как у OpenAI); 0 — без лимита
+    rate_period = 60.0
+    stats: dict = {}
+    lock = threading.Lock()
+
+    def _over_rate_limit(self) -> bool:
+        if not self.rate_limit:
+            return False
+        with self.lock:
+            now = time.monotonic()
+            level, updated = self.stats.get("bucket", (float(self.rate_limit), now))
+            level = min(self.rate_limit, level + (now - updated) * self.rate_limit / self.rate_period)
+            limited = level < 1
+            self.stats["bucket"] = (level if limited else level - 1, now)
+            if limited:
+                self.stats["rate_limited"] = self.stats.get("rate_limited", 0) + 1
+            return limited
+
+    def _send_stream(self, model: str, include_usage: bool = False):
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        self.close_connection = True
+        pieces = [self.content[i:i + self.chunk_size] for i in range(0, len(self.content), self.chunk_size)]
+        for index, piece in enumerate(pieces):
+            if index:
+                time.sleep(self.chunk_delay)
+            self._write_event(chat_completion_chunk(piece, model))
+            self.wfile.flush()
+        self._write_event(chat_completion_chunk(None, model, finish_reason="stop"))
+        if include_usage:
+            self._write_event(dict(chat_completion_chunk(None, model), choices=[], usage=self._usage()))
+        self.wfile.write(b"data: [DONE]\n\n")
+
+    def _write_event(self, data: dict):
+        self.wfile.write(b"data: " + json.dumps(data, ensure_ascii=False).encode() + b"\n\n")
+
+    def do_POST(self):
+        request = json.loads(self._read_body() or b"{}")
+        if self._over_rate_limit():
+            error = {"message": "Rate limit reached for requests", "type": "requests", "code": "rate_limit_exceeded"}
+            self._send_json({"error": error}, status=429)
+            return
+        with self.lock:
+            if self.replies:
+                self.content = self.replies[min(self.stats.get("requests", 0), len(self.replies) - 1)]
+            self.stats["last_request"] = request
+            self.stats["requests"] = self.stats.get("requests", 0) + 1
+            self.stats["in_flight"] = self.stats.get("in_flight", 0) + 1
+            self.stats["max_in_flight"] = max(self.stats.get("max_in_flight", 0), self.stats["in_flight"])
+        try:
+            time.sleep(self.latency)
+            model = request.get("model", "gpt-4o")
+            if request.get("stream"):
+                self._send_stream(model, (request.get("stream_options") or {}).get("include_usage", False))
+            else:
+                # Без стриминга клиент ждёт ещё и время генерации всех чанков
+                chunks = -(-len(self.content) // self.chunk_size)
+                time.sleep(max(0, chunks - 1) * self.chunk_delay)
+                self._send_json(dict(chat_completion(self.content, model), usage=self._usage()))
+        finally:
+            with self.lock:
+                self.stats["in_flight"] -= 1
+
+
+    def _usage(self) -> dict:
+        return {
+            "prompt_tokens": 100,
+            "completion_tokens": 20,
+            "total_tokens": 120,
+            "prompt_tokens_details": {"cached_tokens": self.cached_tokens},
+        }
+
+
+def chat_completion(content: str, model: str = "gpt-4o") -> dict:
+    return {
+        "id": "chatcmpl-fake",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": model,
+        "choices": [{
+            "index": 0,
+            "message": {"role": "assistant", "content": content},
+            "finish_reason": "stop",
+        }],
+        "usage": {"prompt_tokens": 100, "completion_tokens": 20, "total_tokens": 120},
+    }
+
+
+def chat_completion_chunk(content, model: str = "gpt-4o", finish_reason=None) -> dict:
+    return {
+        "id": "chatcmpl-fake",
+        "object": "chat.completion.chunk",
+        "created": int(time.time()),
+        "model": model,
+        "choices": [{
+            "index": 0,
+            "delta": {"content": content} if content is not None else {},
+            "finish_reason": finish_reason,
+        }],
+    }
+
+
+def make_openai_handler(latency: float = 0.0, content: str = None, chunk_size: int = 8,
+                        chunk_delay: float = 0.0, cached_tokens: int = 0,
+                        rate_limit: int = 0, rate_period: float = 60.0, replies: list = None):
+    attrs = {
+        "latency": latency, "stats": {}, "chunk_size": chunk_size,
+        "chunk_delay": chunk_delay, "cached_tokens": cached_tokens,
+        "rate_limit": rate_limit, "rate_period": rate_period, "replies": list(replies or []),
+    }
+    if content is not None:
+        attrs["content"] = content
+    return type("FakeOpenAIHandler", (OpenAIHandler,), attrs)
+
+
+class TelegramHandler(JSONHandler):
+    """
+    Имитирует Bot API (POST /bot<token>/<method>): getUpdates отдаёт апдейты
+    из очереди `updates`, вызовы sendMessage/editMessageText записываются
+    в `sent` как (время, метод, параметры). Параметры задаются через make_telegram_handler.
+    """
+
+    bot_user = {"id": 1, "is_bot": True, "first_name": "Bench", "username": "bench_bot"}
+    poll_delay = 0.2  # «long polling»: пауза перед пустым ответом getUpdates
+    send_delay = 0.0  # сетевая задержка sendMessage/editMessageText
+    updates: list = []
+    sent: list = []
+    lock = threading.Lock()
+
+    def _params(self) -> dict:
+        body = self._read_body().decode()
+        if self.headers.get("Content-Type", "").startswith("application/json"):
+            return json.loads(body or "{}")
+        params = {}
+        for key, value in parse_qsl(body):
+            try:
+                params[key] = json.loads(value)
+            except ValueError:
+                params[key] = value
+        return params
+
+    def _message(self, params: dict) -> dict:
+        with self.lock:
+            message_id = len(self.sent) + 1000
+        return {
+            "message_id": params.get("message_id", message_id),
+            "date": int(time.time()),
+            "chat": {"id": params.get("chat_id", 1), "type": "private"},
+            "text": params.get("text", ""),
+        }
+
+    def do_POST(self):
+        method = self.path.rsplit("/", 1)[-1]
+        params = self._params()
+
+        if method == "getMe":
+            result = self.bot_user
+        elif method == "getUpdates":
+            with self.lock:
+                result, self.updates[:] = list(self.updates), []
+            if not result:
+                time.sleep(self.poll_delay)
+        elif method in ("sendMessage", "editMessageText"):
+            if self.send_delay:
+                time.sleep(self.send_delay)
+            result = self._message(params)
+            with self.lock:
+                self.sent.append((time.perf_counter(), method, params))
+        else:
+            result = True
+        try:
+            self._send_json({"ok": True, "result": result})
+        except (BrokenPipeError, ConnectionResetError):
+            pass  # бот остановился, не дождавшись ответа getUpdates
+
+
+def telegram_update(update_id: int, text: str, user_id: int = 42, **message_fields) -> dict:
+    """
+    Апдейт с текстовым сообщением от пользователя user_id; команды (/start)
+    размечаются entity bot_command, как это делает Telegram.
+    """
+    message = {
+        "message_id": update_id,
+        "date": int(time.time()),
+        "chat": {"id": user_id, "type": "private"},
+        "from": {"id": user_id, "is_bot": False, "first_name": "Ассистент"},
+        "text": text,
+        **message_fields,
+    }
+    if text.startswith("/"):
+        message["entities"] = [{"type": "bot_command", "offset": 0, "length": len(text.split()[0])}]
+    return {"update_id": update_id, "message": message}
+
+
+def make_telegram_handler(updates: list = None, poll_delay: float = 0.2, send_delay: float = 0.0):
+    return type("FakeTelegramHandler", (TelegramHandler,), {
+        "updates": list(updates or []), "sent": [],
+        "poll_delay": poll_delay, "send_delay": send_delay, "lock": threading.Lock(),
+    })
@@ -3,7 +3,8 @@
 from django import forms
 from django.db import models
 from django.contrib import admin
-from .models import Client, Message, Stage, Interaction, KnowledgeBlock, Assistant
+from .models import Client, Message, Stage, Interaction, KnowledgeBlock, Assistant, ClientSummary, PromptBlock
+from .prompt_store import rebuild_prompt
 
 
 @admin.register(Client)
@@ -37,9 +38,16 @@ class MessageAdmin(admin.ModelAdmin):
 
 @admin.register(Interaction)
 class InteractionAdmin(admin.ModelAdmin):
-    list_display = ("client", "stage_detected", "created_at")
+    list_display = ("client", "stage_detected", "prompt_tokens", "cached_tokens", "created_at")
     list_filter = ("stage_detected", "created_at")
-    search_fields = ("prompt", "gpt_response", "assistant_hint")
+    # Ищем по переменной части prompt, без общих префиксов и базы знаний
+    search_fields = ("prompt_user", "gpt_response", "assistant_hint")
+    raw_id_fields = ("client", "prompt_system", "prompt_knowledge")
+    readonly_fields = ("full_prompt",)
+
+    def full_prompt(self, obj):
+        return rebuild_prompt(obj)
+    full_prompt.short_description = "Полный prompt"
 
 
 @admin.register(KnowledgeBlock)
@@ -59,3 +67,16 @@ class KnowledgeBlockAdmin(admin.ModelAdmin):
 class AssistantAdmin(admin.ModelAdmin):
     list_display = ("telegram_id", "name", "added_at")
     search_fields = ("telegram_id", "name")
+
+
+@admin.register(ClientSummary)
+class ClientSummaryAdmin(admin.ModelAdmin):
+    list_display = ("client", "last_message_id", "updated_at")
+    search_fields = ("text",)
+    raw_id_fields = ("client",)
+
+
+@admin.register(PromptBlock)
+class PromptBlockAdmin(admin.ModelAdmin):
+    list_display = ("digest", "created_at")
+    search_fields = ("digest",)
@@ -0,0 +1,85 @@
+# bot/api_client.py
+
+import json
+import os
+from typing import Optional
+
+import httpx
+from dotenv import load_dotenv
+
+from . import metrics
+
+
+load_dotenv()
+
+API_URL = os.getenv("API_URL", "http://127.0.0.1:8000")  # fallback по умолчанию
+API_TIMEOUT = float(os.getenv("API_TIMEOUT", "90"))  # GPT отвечает несколько секунд
+API_CONNECT_TIMEOUT = float(os.getenv("API_CONNECT_TIMEOUT", "5"))
+API_MAX_CONNECTIONS = int(os.getenv("API_MAX_CONNECTIONS", "100"))
+API_MAX_KEEPALIVE = int(os.getenv("API_MAX_KEEPALIVE", "20"))
+API_KEEPALIVE_EXPIRY = float(os.getenv("API_KEEPALIVE_EXPIRY", "30"))
+API_RETRIES = int(os.getenv("API_RETRIES", "2"))
+
+_client: Optional[httpx.AsyncClient] = None
+
+
+def get_api_client() -> httpx.AsyncClient:
+    """
+    Возвращает общий асинхронный HTTP-клиент с пулом keep-alive соединений.
+    Клиент создаётся лениво, один на процесс бота.
+
+    Повторы (API_RETRIES) выполняются только при ошибках установки соединения —
+    POST на /api/interaction/ не идемпотентен, поэтому таймауты чтения не повторяем.
+    """
+    global _client
+    if _client is None or _client.is_closed:
+        limits = httpx.Limits(
+            max_connections=API_MAX_CONNECTIONS,
+            max_keepalive_connections=API_MAX_KEEPALIVE,
+            keepalive_expiry=API_KEEPALIVE_EXPIRY,
+        )
+        _client = httpx.AsyncClient(
+            base_url=API_URL,
+            timeout=httpx.Timeout(API_TIMEOUT, connect=API_CONNECT_TIMEOUT),
+            transport=httpx.AsyncHTTPTransport(limits=limits, retries=API_RETRIES),
+        )
+    return _client
+
+
+async def close_api_client(*_args) -> None:
+    """
+    Закрывает пул соединений. Подходит как post_shutdown-хук Application.
+    """
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+
+
+def _trace_headers() -> dict:
+    # API продолжает trace бота (см. metrics): строки лога связываются по ID
+    trace_id = metrics.current_trace_id()
+    return {metrics.TRACE_HEADER: trace_id} if trace_id else {}
+
+
+async def post_interaction(payload: dict) -> dict:
+    """
+    Отправляет пересланное сообщение в /api/interaction/ и возвращает JSON-ответ.
+    Не блокирует event loop, поэтому несколько пересылок обрабатываются параллельно.
+    """
+    response = await get_api_client().post("/api/interaction/", json=payload, headers=_trace_headers())
+    response.raise_for_status()
+    return response.json()
+
+
+async def stream_interaction(payload: dict):
+    """
+    То же, что post_interaction, но в потоковом режиме: отдаёт NDJSON-события
+    по мере генерации ответа (delta / section / done).
+    """
+    body = dict(payload, stream=True)
+    async with get_api_client().stream("POST", "/api/interaction/", json=body, headers=_trace_headers()) as response:
+        response.raise_for_status()
+        async for line in response.aiter_lines():
+            if line.strip():
+                yield json.loads(line)
@@ -0,0 +1,55 @@
+# bot/assistants.py
+
+"""
+Список ассистентов, которым разрешён доступ к боту, в памяти процесса.
+
+Проверка идёт на каждом апдейте, поэтому она не должна ходить в БД.
+Список загружается при старте бота и сбрасывается сигналами при правке
+Assistant в админке. Админка может работать в другом процессе, поэтому
+список ещё и перечитывается не реже раза в ASSISTANT_CACHE_TTL секунд:
+удалённый ассистент теряет доступ максимум через TTL.
+"""
+
+import os
+import threading
+import time
+
+from asgiref.sync import sync_to_async
+
+from .models import Assistant
+
+
+ASSISTANT_CACHE_TTL = float(os.getenv("ASSISTANT_CACHE_TTL", "60"))
+
+_lock = threading.Lock()
+_cache = {"ids": None, "loaded_at": 0.0}
+
+
+def load_allowed_assistants() -> frozenset:
+    ids = frozenset(Assistant.objects.values_list("telegram_id", flat=True))
+    with _lock:
+        _cache["ids"] = ids
+        _cache["loaded_at"] = time.monotonic()
+    return ids
+
+
+def invalidate_assistant_cache():
+    with _lock:
+        _cache["ids"] = None
+
+
+def _cached_ids():
+    ids = _cache["ids"]
+    if ids is None or time.monotonic() - _cache["loaded_at"] > ASSISTANT_CACHE_TTL:
+        return None
+    return ids
+
+
+async def is_allowed_assistant(telegram_id) -> bool:
+    """
+    Есть ли telegram_id среди ассистентов. Пока список свежий — без БД и без смены потока.
+    """
+    ids = _cached_ids()
+    if ids is None:
+        ids = await sync_to_async(load_allowed_assistants)()
+    return str(telegram_id) in ids
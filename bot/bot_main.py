@@ -6,13 +6,22 @@ from dotenv import load_dotenv
 load_dotenv()
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "core.settings")
 TOKEN = os.getenv("TELEGRAM_BOT_TOKEN")
-API_URL = os.getenv("API_URL", "http://127.0.0.1:8000")  # fallback по умолчанию
+# Для локальных прогонов против фейкового Telegram (см. benchmarks/fakes.py)
+TELEGRAM_BASE_URL = os.getenv("TELEGRAM_BASE_URL")
+# Сколько апдейтов Telegram обрабатывается одновременно
+BOT_CONCURRENT_UPDATES = int(os.getenv("BOT_CONCURRENT_UPDATES", "64"))
+# 1 — пересылки обрабатываются через HTTP API (бот и API в разных процессах/машинах)
+BOT_USE_API = os.getenv("BOT_USE_API", "0") == "1"
+# С какой длины очереди к GPT предупреждать ассистента о задержке (0 — не предупреждать)
+GPT_QUEUE_NOTICE = int(os.getenv("GPT_QUEUE_NOTICE", "10"))
 
 import django
 django.setup()
 
-import requests
-import re
+import asyncio
+import signal
+
+import httpx
 
 from telegram import Update
 from telegram.ext import ApplicationBuilder, MessageHandler, filters, ContextTypes, CommandHandler
@@ -20,54 +29,187 @@ from telegram.ext import ApplicationBuilder, MessageHandler, filters, ContextTyp
 from openai import OpenAI
 from asgiref.sync import sync_to_async
 
-from bot.messages import message_start
-from bot.models import Client, Stage, Assistant, ActiveContext
+from bot import context_cache, interactions, metrics
+from bot.assistants import is_allowed_assistant, load_allowed_assistants
+from bot.db import run_write
+from bot.dispatcher import BOT_MODE, start_application, stop_application
+from bot.coalescing import ForwardCoalescer
+from bot.api_client import post_interaction, stream_interaction, close_api_client
+from bot.gpt_scheduler import PRIORITY_FOLLOW_UP, PRIORITY_FORWARD, gpt_job
+from bot.messages import message_start, message_queue_busy
+from bot.telegram_stream import StreamingReply
+from bot.models import ActiveContext
 from bot.gpt_utils import (
     generate_prompt,
     call_gpt,
     generate_assistant_prompt,
-    call_gpt_plain,
+    acall_gpt_plain,
+    astream_gpt,
+    SYSTEM_PROMPT_PLAIN,
+    GPT_STREAM,
 )
 
 
-# Функция для удаления emoji из текста
-def remove_emojis(text: str) -> str:
+openai_client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+
+
+async def reply_with_stream(message, events):
     """
-    Удаляет все emoji из строки.
+    Показывает ответ клиенту и подсказку ассистенту по мере генерации:
+    сначала заглушка, затем правки сообщения; подсказка — отдельным сообщением,
+    как только закончилась секция ответа.
+
+    events — события interactions.stream_interaction (или то же по HTTP).
     """
-    emoji_pattern = re.compile("["
-        u"\U0001F600-\U0001F64F"
-        u"\U0001F300-\U0001F5FF"
-        u"\U0001F680-\U0001F6FF"
-        u"\U0001F1E0-\U0001F1FF"
-        u"\U00002700-\U000027BF"
-        u"\U0001F900-\U0001F9FF"
-        u"\U0001FA70-\U0001FAFF"
-        u"\U00002600-\U000026FF"
-        "]+", flags=re.UNICODE)
-    return emoji_pattern.sub(r'', text).strip()
+    reply_msg = await StreamingReply(message).start()
+    hint_msg = None
+    finished = False
+
+    async def finish(result: dict):
+        await reply_msg.finish(result.get("reply", "Не удалось получить ответ от сервера."))
+        await (hint_msg or StreamingReply(message)).finish(
+            result.get("assistant_hint", "Нет подсказки от ассистента.")
+        )
 
+    async for event in events:
+        if event["type"] == "delta" and event["section"] == "reply":
+            await reply_msg.append(event["text"])
+        elif event["type"] == "section" and event["section"] == "reply":
+            await reply_msg.finish(event["text"])
+            hint_msg = await StreamingReply(message).start()
+        elif event["type"] == "delta" and event["section"] == "assistant_hint" and hint_msg:
+            await hint_msg.append(event["text"])
+        elif event["type"] == "done":
+            # Отвечаем сразу; генератор дочитывается уже ради записи в БД
+            await finish(event["result"])
+            finished = True
 
-@sync_to_async
-def is_allowed_assistant(telegram_id: int) -> bool:
-    return Assistant.objects.filter(telegram_id=str(telegram_id)).exists()
+    if not finished:
+        await finish({})
 
 
-openai_client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+async def forward_via_api(message, payload: dict):
+    """
+    Пересылка через /api/interaction/ (BOT_USE_API=1).
+    """
+    try:
+        if GPT_STREAM:
+            await reply_with_stream(message, stream_interaction(payload))
+            return
+
+        data = await post_interaction(payload)
+
+        with metrics.span("telegram_send"):
+            await message.reply_text(data.get("reply", "Не удалось получить ответ от сервера."))
+            await message.reply_text(data.get("assistant_hint", "Нет подсказки от ассистента."))
+
+    except httpx.HTTPError as e:
+        print("Ошибка при обращении к серверу:", e)
+        await message.reply_text("Произошла ошибка при обращении к серверу.")
+
+
+def queue_notice(message):
+    """
+    on_queued для gpt_job: предупреждает ассистента, если запрос встал в длинную очередь.
+    """
+    async def notify(waiting: int):
+        if GPT_QUEUE_NOTICE and waiting >= GPT_QUEUE_NOTICE:
+            await message.reply_text(message_queue_busy.format(waiting=waiting))
+    return notify
+
+
+async def prepend(first, events):
+    yield first
+    async for event in events:
+        yield event
+
+
+async def process_forward(burst):
+    """
+    Отвечает на пачку пересланных сообщений одного клиента.
+    До burst.claim() генерацию может отменить следующее сообщение клиента.
+    """
+    message = burst.message
+    assistant_id, client_id = burst.key
+    client_name = message.forward_from.full_name
+    forwarded_text = burst.text
+
+    client_obj = await interactions.get_client(client_id, client_name)
+
+    if BOT_USE_API:
+        # HTTP-запрос не отменяем: сервер мог уже начать запись
+        burst.claim()
+        # Сохраняем активного клиента для ассистента
+        await run_write(
+            ActiveContext.objects.update_or_create,
+            assistant_telegram_id=str(assistant_id),
+            defaults={"client": client_obj}
+        )
+        context_cache.set_active_client(assistant_id, client_obj.id)
+        payload = {
+            "telegram_id": client_id,
+            "name": client_name,
+            "text": forwarded_text
+        }
+        await forward_via_api(message, payload)
+        # Переписку записал API (возможно, другой процесс) — историю перечитаем из БД
+        context_cache.forget_client(client_obj.id)
+        return
+
+    # Клиент уже загружен — конвейер вызывается напрямую, без HTTP к своему же API.
+    # Активный клиент ассистента сохраняется в той же транзакции, что и ответ.
+    try:
+        with gpt_job(PRIORITY_FORWARD, assistant_id, queue_notice(message)):
+            await answer_forward(burst, client_obj, forwarded_text)
+    except Exception as e:
+        print("Ошибка при обработке сообщения:", e)
+        await message.reply_text("Произошла ошибка при обработке сообщения.")
+
+
+async def answer_forward(burst, client_obj, forwarded_text: str):
+    message = burst.message
+    assistant_id = burst.key[0]
+
+    if GPT_STREAM:
+        events = interactions.stream_interaction(client_obj, forwarded_text, assistant_id=assistant_id)
+        # Пока GPT не прислал первый фрагмент, ассистент ничего не видел — можно отменить
+        first = await anext(events)
+        burst.claim()
+        await reply_with_stream(message, prepend(first, events))
+        return
+
+    async def send_reply(data: dict):
+        burst.claim()
+        with metrics.span("telegram_send"):
+            await message.reply_text(data.get("reply", "Не удалось получить ответ от сервера."))
+            await message.reply_text(data.get("assistant_hint", "Нет подсказки от ассистента."))
 
+    await interactions.run_interaction(
+        client_obj, forwarded_text, assistant_id=assistant_id, on_reply=send_reply
+    )
+
+
+forward_coalescer = ForwardCoalescer(process_forward)
 
+
+@metrics.traced
 async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """
     Обрабатывает сообщение от ассистента:
     — сохраняет клиента по пересылке или reply,
     — отвечает на вопросы по активному клиенту.
+
+    Каждый апдейт — отдельный trace (bot.metrics): время этапов и токены
+    печатаются одной строкой, ID уходит в API заголовком X-Trace-Id.
     """
 
     message = update.message
 
     # Проверяем, есть ли Telegram ID ассистента в списке разрешённых
     assistant_id = update.effective_user.id
-    if not await is_allowed_assistant(assistant_id):
+    with metrics.span("allow_list"):
+        allowed = await is_allowed_assistant(assistant_id)
+    if not allowed:
         await update.message.reply_text(
             "⛔ Доступ запрещён.\n\n"
             "Обратитесь к руководителю, чтобы получить доступ.\n"
@@ -88,14 +230,13 @@ async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
         client_id = client.id
         client_name = client.full_name
 
-        client_obj, _ = await sync_to_async(Client.objects.get_or_create)(
-            telegram_id=client_id,
-            defaults={"name": client_name}
-        )
-        await sync_to_async(ActiveContext.objects.update_or_create)(
+        client_obj = await interactions.get_client(client_id, client_name)
+        await run_write(
+            ActiveContext.objects.update_or_create,
             assistant_telegram_id=str(assistant_id),
             defaults={"client": client_obj}
         )
+        context_cache.set_active_client(assistant_id, client_obj.id)
 
         await message.reply_text(f"✅ Контекст переключён на клиента: {client_name}")
 
@@ -112,64 +253,54 @@ async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
             )
             return
 
-        client_id = client.id
-        client_name = client.full_name
-
-        payload = {
-            "telegram_id": client_id,
-            "name": client_name,
-            "text": forwarded_text
-        }
-
-        # Сохраняем активного клиента для ассистента
-        client_obj, _ = await sync_to_async(Client.objects.get_or_create)(
-            telegram_id=client_id,
-            defaults={"name": client_name}
-        )
-        await sync_to_async(ActiveContext.objects.update_or_create)(
-            assistant_telegram_id=str(assistant_id),
-            defaults={"client": client_obj}
-        )
-
-        try:
-            response = requests.post(f"{API_URL}/api/interaction/", json=payload)
-            response.raise_for_status()
-            data = response.json()
-
-            print("Ответ от сервера:", data)
-
-            await message.reply_text(data.get("reply", "Не удалось получить ответ от сервера."))
-            await message.reply_text(data.get("assistant_hint", "Нет подсказки от ассистента."))
-
-        except requests.exceptions.RequestException as e:
-            print("Ошибка при обращении к серверу:", e)
-            await message.reply_text("Произошла ошибка при обращении к серверу.")
+        # Несколько пересылок подряд — один ответ (см. bot.coalescing)
+        await forward_coalescer.submit((assistant_id, client.id), message, forwarded_text)
         return
 
-    # Вариант 2: обычное сообщение — уточнение по последнему клиенту
-    active_context = await sync_to_async(
-        lambda: ActiveContext.objects.filter(assistant_telegram_id=str(assistant_id)).first()
-    )()
+    # Вариант 2: обычное сообщение — уточнение по последнему клиенту.
+    # Сначала дожидаемся ответа на недавние пересылки — они могли переключить клиента.
+    # Активный клиент, этап и история — из context_cache, обычно без запросов к БД
+    await forward_coalescer.wait_for(assistant_id)
+    with metrics.span("context"):
+        active_context = await context_cache.aget_active_context(assistant_id)
 
     if active_context:
-        client = await sync_to_async(lambda: active_context.client)()
-        stage_obj = await sync_to_async(Stage.objects.filter(client=client).first)()
-        if stage_obj:
+        client = active_context.client
+        if active_context.stage:
             stage_map = {
                 "S": "S — Situation (ситуационные вопросы)",
                 "P": "P — Problem (проблемные вопросы)",
                 "I": "I — Implication (усугубляющие вопросы)",
                 "N": "N — Need-payoff (ценностные вопросы)"
             }
-            stage_label = stage_map.get(stage_obj.stage, "S — Situation")
+            stage_label = stage_map.get(active_context.stage, "S — Situation")
             spin_line = f"📌 Текущий SPIN-этап клиента: {stage_label}\n\n"
         else:
             spin_line = "📌 Текущий SPIN-этап клиента: S — Situation (ситуационные вопросы)\n\n"
 
         assistant_question = message.text.strip()
-        prompt = await generate_assistant_prompt(client, assistant_question)
-        reply = await sync_to_async(call_gpt_plain)(prompt)
-        await message.reply_text(spin_line + reply)
+        with metrics.span("prompt"):
+            prompt = await generate_assistant_prompt(client, assistant_question, active_context)
+        # Ассистент ждёт ответа в чате — вопрос идёт к GPT раньше пересылок и резюме
+        with gpt_job(PRIORITY_FOLLOW_UP, assistant_id, queue_notice(message)):
+            if GPT_STREAM:
+                answer = StreamingReply(message, prefix=spin_line)
+                await answer.start()
+                try:
+                    async for delta in astream_gpt(prompt, SYSTEM_PROMPT_PLAIN):
+                        await answer.append(delta)
+                except Exception as e:
+                    # Заглушку или недописанный ответ не оставляем — заменяем сообщением об ошибке
+                    print("Ошибка при обработке сообщения:", e)
+                    answer.prefix = ""
+                    await answer.finish("Произошла ошибка при обработке сообщения.")
+                    return
+                await answer.finish()
+                return
+
+            reply = await acall_gpt_plain(prompt)
+        with metrics.span("telegram_send"):
+            await message.reply_text(spin_line + reply)
         return
 
     # 🆕 Если ни один клиент ещё не переслан
@@ -182,13 +313,53 @@ async def handle_start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     await update.message.reply_text(message_start)
 
 
-def main():
-    app = ApplicationBuilder().token(TOKEN).build()
+async def warm_caches(app):
+    """
+    Загружает в память то, что нужно на каждом апдейте, до первого апдейта.
+    """
+    await sync_to_async(load_allowed_assistants)()
+
+
+def build_application():
+    """
+    Собирает Application с обработчиками. Запускается либо run_polling (main),
+    либо вручную в общем event loop с API (serve_and_run_bot.py).
+    """
+    builder = (
+        ApplicationBuilder()
+        .token(TOKEN)
+        .concurrent_updates(BOT_CONCURRENT_UPDATES)
+        .post_init(warm_caches)
+        .post_shutdown(close_api_client)
+    )
+    if TELEGRAM_BASE_URL:
+        builder = builder.base_url(TELEGRAM_BASE_URL)
+    app = builder.build()
     app.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, handle_message))
     app.add_handler(CommandHandler("start", handle_start))
+    return app
+
+
+async def run_polling():
+    """
+    Только бот, без API: long polling через тот же диспетчер апдейтов.
+    """
+    app = build_application()
+    dispatcher = await start_application(app)
     print("Бот запущен.")
-    
-    app.run_polling()
+
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop.set)
+    await stop.wait()
+    await stop_application(app, dispatcher, timeout=60)
+
+
+def main():
+    if BOT_MODE == "webhook":
+        raise SystemExit("В режиме webhook апдейты принимает API: запустите serve_and_run_bot.py")
+    asyncio.run(run_polling())
 
 
 if __name__ == "__main__":
@@ -0,0 +1,115 @@
+# bot/coalescing.py
+
+"""
+Схлопывание пачек пересланных сообщений одного клиента.
+
+Ассистент часто пересылает 3–5 сообщений клиента подряд. Вместо ответа
+на каждый фрагмент бот ждёт FORWARD_COALESCE_WINDOW секунд тишины и
+отвечает один раз на всё вместе. Если новое сообщение пришло, пока GPT
+ещё думает над предыдущими, генерация отменяется, а её текст входит
+в следующую. Отменить нельзя только то, что уже начали показывать
+ассистенту (Burst.claim) — такой ответ доводится до конца.
+
+Ключ — (ассистент, клиент): ответ уходит в чат того, кто переслал.
+"""
+
+import asyncio
+import os
+
+from .dispatcher import release_chat_order
+
+
+FORWARD_COALESCE_WINDOW = float(os.getenv("FORWARD_COALESCE_WINDOW", "1.5"))
+
+
+class Burst:
+    """
+    Пачка сообщений одного клиента, на которую готовится один ответ.
+    """
+
+    def __init__(self, key):
+        self.key = key
+        self.messages = []
+        self.texts = []
+        self.claimed = False
+        self.cancelled_runs = 0
+        self.task = None
+        self.finished = asyncio.get_running_loop().create_future()
+
+    @property
+    def message(self):
+        """Последнее сообщение пачки — на него и отвечаем."""
+        return self.messages[-1]
+
+    @property
+    def text(self) -> str:
+        return "\n".join(self.texts)
+
+    def claim(self):
+        """
+        Ответ начали показывать: дальше пачку не отменяем,
+        новые сообщения клиента пойдут в следующую.
+        """
+        self.claimed = True
+
+
+class ForwardCoalescer:
+    """
+    handler(burst) вызывается один раз на пачку, после окна тишины.
+    """
+
+    def __init__(self, handler, window: float = None):
+        self.handler = handler
+        self.window = FORWARD_COALESCE_WINDOW if window is None else window
+        self._bursts = {}  # key -> Burst, ещё не отданный ассистенту
+        self._active = set()  # все пачки, на которые ещё отвечают
+
+    async def submit(self, key, message, text: str):
+        """
+        Добавляет сообщение в пачку и ждёт, пока на пачку ответят
+        (обработчик апдейта живёт до конца ответа — app.stop() его дождётся).
+        """
+        burst = self._bursts.get(key)
+        if burst is None or burst.claimed:
+            burst = self._bursts[key] = Burst(key)
+            self._active.add(burst)
+        elif burst.task is not None:
+            # Ещё ждём окно или GPT ещё не ответил — начинаем заново со всем текстом
+            if burst.task.cancel():
+                burst.cancelled_runs += 1
+
+        burst.messages.append(message)
+        burst.texts.append(text)
+        burst.task = asyncio.create_task(self._run(burst))
+        # Сообщение уже в пачке — следующие апдейты чата могут идти, не дожидаясь ответа
+        release_chat_order()
+        await asyncio.shield(burst.finished)
+
+    async def wait_for(self, assistant_id):
+        """
+        Ждёт ответы на все пересылки ассистента: уточняющий вопрос после
+        пересылки должен видеть уже переключённого клиента.
+        """
+        pending = [burst.finished for burst in self._active if burst.key[0] == assistant_id]
+        if pending:
+            await asyncio.wait([asyncio.shield(f) for f in pending])
+
+    async def _run(self, burst: Burst):
+        try:
+            if self.window > 0:
+                await asyncio.sleep(self.window)
+            if len(burst.texts) > 1:
+                print(f"Объединено сообщений клиента: {len(burst.texts)}, отменено генераций: {burst.cancelled_runs}")
+            await self.handler(burst)
+        except asyncio.CancelledError:
+            if not burst.claimed:
+                return  # пачку продолжит следующий _run
+            raise
+        except Exception as e:
+            print("Ошибка при обработке пачки сообщений:", e)
+        finally:
+            if burst.task is asyncio.current_task() and not burst.finished.done():
+                if self._bursts.get(burst.key) is burst:
+                    del self._bursts[burst.key]
+                self._active.discard(burst)
+                burst.finished.set_result(None)
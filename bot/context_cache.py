@@ -0,0 +1,187 @@
+# bot/context_cache.py
+
+"""
+Контекст клиентов в памяти процесса бота: активный клиент ассистента,
+его SPIN-этап, резюме и последние сообщения — всё, что нужно для prompt.
+
+Уточняющий вопрос ассистента по активному клиенту собирает prompt
+без запросов к БД. Кэш обновляется сквозной записью: persist_interaction
+после коммита дописывает новые сообщения и этап. Правки в админке
+(сигналы, см. signals.py) и фоновое обновление резюме сбрасывают запись.
+Правки из другого процесса подхватываются не позже CONTEXT_CACHE_TTL секунд.
+Число клиентов и ассистентов в кэше ограничено CONTEXT_CACHE_SIZE (LRU).
+"""
+
+import os
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Optional
+
+from asgiref.sync import sync_to_async
+
+from .models import ActiveContext, Client, Stage
+
+
+CONTEXT_CACHE_SIZE = int(os.getenv("CONTEXT_CACHE_SIZE", "1000"))
+CONTEXT_CACHE_TTL = float(os.getenv("CONTEXT_CACHE_TTL", "300"))
+
+_MISS = object()
+
+_lock = threading.Lock()
+_clients = OrderedDict()  # client_id -> ClientContext
+_active = OrderedDict()   # assistant telegram_id -> (client_id | None, loaded_at)
+
+
+@dataclass
+class ClientContext:
+    client: Client
+    stage: Optional[str]
+    summary: str
+    has_summary: bool
+    history: list  # Message в хронологическом порядке, как get_conversation_context
+    loaded_at: float = field(default_factory=time.monotonic)
+
+    def history_limit(self) -> Optional[int]:
+        """
+        None — после резюме история не обрезается, пока его не обновят.
+        """
+        from . import gpt_utils  # не при импорте: signals.py грузит этот модуль и без ключа OpenAI
+        if self.has_summary:
+            return None
+        return gpt_utils.HISTORY_LIMIT
+
+
+def _fresh(loaded_at: float) -> bool:
+    return time.monotonic() - loaded_at < CONTEXT_CACHE_TTL
+
+
+def _put(cache: OrderedDict, key, value):
+    cache[key] = value
+    cache.move_to_end(key)
+    while len(cache) > CONTEXT_CACHE_SIZE:
+        cache.popitem(last=False)
+
+
+def clear_context_cache():
+    with _lock:
+        _clients.clear()
+        _active.clear()
+
+
+def forget_client(client_id: int):
+    with _lock:
+        _clients.pop(client_id, None)
+
+
+def forget_assistant(assistant_id):
+    with _lock:
+        _active.pop(str(assistant_id), None)
+
+
+def read_client_context(client) -> ClientContext:
+    """
+    Контекст клиента из БД, мимо кэша.
+    """
+    from . import gpt_utils
+    summary_text, history = gpt_utils.get_conversation_context(client)
+    return ClientContext(
+        client=client,
+        stage=Stage.objects.filter(client=client).values_list("stage", flat=True).first(),
+        summary=summary_text,
+        has_summary=bool(summary_text),
+        history=history,
+    )
+
+
+def load_client_context(client) -> ClientContext:
+    """
+    Читает контекст клиента из БД и кладёт его в кэш.
+    """
+    context = read_client_context(client)
+    with _lock:
+        _put(_clients, client.id, context)
+    return context
+
+
+def _peek_client(client_id: int):
+    with _lock:
+        context = _clients.get(client_id)
+        if context is None or not _fresh(context.loaded_at):
+            return _MISS
+        _clients.move_to_end(client_id)
+        return context
+
+
+async def aget_client_context(client) -> ClientContext:
+    context = _peek_client(client.id)
+    if context is _MISS:
+        context = await sync_to_async(load_client_context)(client)
+    return context
+
+
+def set_active_client(assistant_id, client_id: Optional[int]):
+    with _lock:
+        _put(_active, str(assistant_id), (client_id, time.monotonic()))
+
+
+def get_active_context(assistant_id) -> Optional[ClientContext]:
+    """
+    Контекст активного клиента ассистента; из БД — только то, чего нет в кэше.
+    """
+    client_id = _peek_active(assistant_id)
+    if client_id is _MISS:
+        client_id = (
+            ActiveContext.objects.filter(assistant_telegram_id=str(assistant_id))
+            .values_list("client_id", flat=True).first()
+        )
+        set_active_client(assistant_id, client_id)
+    if client_id is None:
+        return None
+
+    context = _peek_client(client_id)
+    if context is _MISS:
+        client = Client.objects.filter(pk=client_id).first()
+        context = load_client_context(client) if client else None
+    return context
+
+
+def _peek_active(assistant_id):
+    with _lock:
+        entry = _active.get(str(assistant_id))
+        if entry is None or not _fresh(entry[1]):
+            return _MISS
+        _active.move_to_end(str(assistant_id))
+        return entry[0]
+
+
+async def aget_active_context(assistant_id) -> Optional[ClientContext]:
+    """
+    То же для event loop: если всё есть в кэше — без потоков и без БД.
+    """
+    client_id = _peek_active(assistant_id)
+    if client_id is None:
+        return None
+    if client_id is not _MISS:
+        context = _peek_client(client_id)
+        if context is not _MISS:
+            return context
+    return await sync_to_async(get_active_context)(assistant_id)
+
+
+def record_forward(client, messages: list, stage: Optional[str] = None, assistant_id=None):
+    """
+    Сквозная запись после коммита persist_interaction: новые сообщения
+    и этап — в контекст клиента (если он в кэше), клиент — активный у ассистента.
+    """
+    with _lock:
+        context = _clients.get(client.id)
+        if context is not None:
+            history = context.history + list(messages)
+            limit = context.history_limit()
+            context.history = history[-limit:] if limit else history
+            if stage:
+                context.stage = stage
+    if assistant_id is not None:
+        set_active_client(assistant_id, client.id)
@@ -0,0 +1,56 @@
+# bot/db.py
+
+"""
+Рабочий профиль SQLite и последовательная запись из async-кода.
+
+Бот и API пишут в один файл db.sqlite3. С журналом по умолчанию писатель
+блокирует и читателей, а при конкурентной записи ловится "database is locked".
+Поэтому на каждом новом соединении включаются WAL и прагмы из SQLITE_PRAGMAS
+(см. configure_sqlite в signals.py).
+
+Внутри процесса записи из async-кода идут через run_write в один поток-писатель
+по очереди. SQLite всё равно допускает одного писателя, а ожидание в очереди
+дешевле, чем busy_timeout в потоке. К тому же у писателя одно постоянное
+соединение, а не новое на каждый ASGI-запрос. Между процессами записи
+разводит busy_timeout.
+"""
+
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from asgiref.sync import sync_to_async
+from django.db import connections
+
+
+SQLITE_PRODUCTION = os.getenv("SQLITE_PRODUCTION", "1") == "1"
+SQLITE_WRITE_QUEUE = os.getenv("SQLITE_WRITE_QUEUE", "1") == "1"
+SQLITE_PRAGMAS = {
+    "journal_mode": "WAL",           # читатели не ждут писателя
+    "synchronous": "NORMAL",         # в WAL fsync только на checkpoint, коммит не теряет целостность
+    "busy_timeout": int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000")),
+    "mmap_size": int(os.getenv("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024))),
+    "cache_size": -int(os.getenv("SQLITE_CACHE_KB", "20000")),  # отрицательное — в KiB
+    "temp_store": "MEMORY",
+}
+
+_writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="db-writer")
+
+
+def apply_sqlite_pragmas(cursor):
+    for name, value in SQLITE_PRAGMAS.items():
+        cursor.execute(f"PRAGMA {name} = {value}")
+
+
+def serialize_writes(using: str = "default") -> bool:
+    return SQLITE_WRITE_QUEUE and connections[using].vendor == "sqlite"
+
+
+async def run_write(func, *args, **kwargs):
+    """
+    Выполняет синхронную функцию с записью в БД через sync_to_async.
+    Для SQLite — в очереди потока-писателя, строго по одной;
+    для других СУБД — как обычный sync_to_async, без очереди.
+    """
+    if not serialize_writes():
+        return await sync_to_async(func)(*args, **kwargs)
+    return await sync_to_async(func, thread_sensitive=False, executor=_writer)(*args, **kwargs)
@@ -0,0 +1,238 @@
+# bot/dispatcher.py
+
+"""
+Приём апдейтов Telegram: webhook или long polling → ограниченная очередь →
+BOT_UPDATE_WORKERS обработчиков.
+
+Апдейты одного чата попадают к одному и тому же обработчику (chat_id % N)
+и обрабатываются по порядку; разные чаты — параллельно. Долгий обработчик
+может отпустить очередь своего чата раньше, чем закончит (release_chat_order):
+так пачка пересылок успевает схлопнуться (см. coalescing), а не ждёт
+ответа GPT на первую.
+
+Очередь ограничена BOT_UPDATE_QUEUE_SIZE: polling при переполнении ждёт,
+webhook отвечает 429 — Telegram повторит доставку позже.
+
+getUpdates(offset=N) навсегда подтверждает все апдейты до N, поэтому polling
+не сдвигает offset дальше первого необработанного апдейта: уже полученные
+Telegram присылает снова, они пропускаются, а новые читаются не дальше
+одной пачки getUpdates вперёд. Апдейт, не дождавшийся обработчика до
+остановки, после рестарта придёт снова.
+"""
+
+import asyncio
+import contextvars
+import os
+import time
+
+
+BOT_MODE = os.getenv("BOT_MODE", "polling")  # polling | webhook
+BOT_UPDATE_WORKERS = int(os.getenv("BOT_UPDATE_WORKERS", "16"))
+BOT_UPDATE_QUEUE_SIZE = int(os.getenv("BOT_UPDATE_QUEUE_SIZE", "1000"))
+BOT_POLL_TIMEOUT = int(os.getenv("BOT_POLL_TIMEOUT", "30"))  # секунд long polling
+# Сколько ждать завершения обработчика, если getUpdates вернул только уже полученные апдейты
+BOT_POLL_BUSY_WAIT = float(os.getenv("BOT_POLL_BUSY_WAIT", "1"))
+# Публичный адрес, на который Telegram шлёт апдейты (например, https://bot.example.com)
+TELEGRAM_WEBHOOK_URL = os.getenv("TELEGRAM_WEBHOOK_URL", "")
+TELEGRAM_WEBHOOK_PATH = "/api/telegram/webhook/"
+TELEGRAM_WEBHOOK_SECRET = os.getenv("TELEGRAM_WEBHOOK_SECRET", "")
+TELEGRAM_WEBHOOK_MAX_CONNECTIONS = int(os.getenv("TELEGRAM_WEBHOOK_MAX_CONNECTIONS", "40"))
+
+_release = contextvars.ContextVar("chat_order_release", default=None)
+_current = {"dispatcher": None}
+
+
+def get_dispatcher():
+    """
+    Диспетчер, запущенный в этом процессе, или None (бот здесь не работает).
+    """
+    return _current["dispatcher"]
+
+
+def release_chat_order():
+    """
+    Следующие апдейты этого чата можно начинать, не дожидаясь текущего обработчика.
+    """
+    released = _release.get()
+    if released is not None:
+        released.set()
+
+
+def chat_key(update) -> int:
+    chat = getattr(update, "effective_chat", None)
+    return chat.id if chat is not None else update.update_id
+
+
+class UpdateDispatcher:
+    def __init__(self, app, workers: int = None, queue_size: int = None):
+        self.app = app
+        workers = workers or BOT_UPDATE_WORKERS
+        queue_size = queue_size or BOT_UPDATE_QUEUE_SIZE
+        self._queues = [asyncio.Queue(maxsize=max(queue_size // workers, 1)) for _ in range(workers)]
+        self._workers = []
+        self._handling = set()
+        self._polling = None
+        self._next_id = None      # update_id, с которого начинаются ещё не полученные апдейты
+        self._unfinished = set()  # update_id полученных через getUpdates, но ещё не обработанных
+        self._progress = asyncio.Event()
+        self.processed = 0
+
+    def _queue(self, update) -> asyncio.Queue:
+        return self._queues[chat_key(update) % len(self._queues)]
+
+    async def put(self, update):
+        """Для polling: при переполненной очереди ждёт."""
+        await self._queue(update).put(update)
+
+    def offer(self, update) -> bool:
+        """Для webhook: False, если очередь чата переполнена."""
+        try:
+            self._queue(update).put_nowait(update)
+        except asyncio.QueueFull:
+            return False
+        return True
+
+    def start(self):
+        self._workers = [asyncio.create_task(self._work(queue)) for queue in self._queues]
+        _current["dispatcher"] = self
+
+    async def _handle(self, update, released: asyncio.Event):
+        _release.set(released)
+        try:
+            await self.app.process_update(update)
+        except Exception as e:
+            print("Ошибка при обработке апдейта:", e)
+        finally:
+            self.processed += 1
+            self._unfinished.discard(update.update_id)
+            self._progress.set()
+            released.set()
+
+    async def _work(self, queue: asyncio.Queue):
+        while True:
+            update = await queue.get()
+            try:
+                released = asyncio.Event()
+                task = asyncio.create_task(self._handle(update, released))
+                self._handling.add(task)
+                task.add_done_callback(self._handling.discard)
+                # Следующий апдейт этого чата — после текущего (или после release_chat_order)
+                await released.wait()
+            finally:
+                queue.task_done()
+
+    def start_polling(self):
+        self._polling = asyncio.create_task(self._poll())
+
+    async def _poll(self):
+        """
+        Long polling getUpdates: апдейты идут в ту же очередь, что и из webhook.
+        """
+        await self.app.bot.delete_webhook()
+        while True:
+            self._progress.clear()
+            try:
+                updates = await self.app.bot.get_updates(
+                    offset=self._confirmed_offset(), timeout=BOT_POLL_TIMEOUT, read_timeout=BOT_POLL_TIMEOUT + 10,
+                )
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print("Ошибка getUpdates:", e)
+                await asyncio.sleep(1)
+                continue
+            fresh = [u for u in updates if self._next_id is None or u.update_id >= self._next_id]
+            for update in fresh:
+                self._unfinished.add(update.update_id)
+                self._next_id = update.update_id + 1
+                await self.put(update)
+            if updates and not fresh:
+                # Только уже полученные: ждём, пока обработчик освободит offset, а не крутим getUpdates
+                try:
+                    await asyncio.wait_for(self._progress.wait(), BOT_POLL_BUSY_WAIT)
+                except asyncio.TimeoutError:
+                    pass
+
+    def _confirmed_offset(self):
+        """
+        offset для getUpdates: всё до первого необработанного апдейта.
+        """
+        return min(self._unfinished) if self._unfinished else self._next_id
+
+    async def _confirm_handled(self):
+        """
+        Подтверждает Telegram обработанные апдейты, чтобы после рестарта
+        они не пришли снова; необработанные остаются неподтверждёнными.
+        """
+        offset = self._confirmed_offset()
+        if self._polling is None or offset is None:
+            return
+        try:
+            await self.app.bot.get_updates(offset=offset, timeout=0)
+        except Exception as e:
+            print("Не удалось подтвердить апдейты:", e)
+
+    async def set_webhook(self):
+        url = TELEGRAM_WEBHOOK_URL.rstrip("/") + TELEGRAM_WEBHOOK_PATH
+        await self.app.bot.set_webhook(
+            url,
+            secret_token=TELEGRAM_WEBHOOK_SECRET or None,
+            max_connections=TELEGRAM_WEBHOOK_MAX_CONNECTIONS,
+        )
+        print("Webhook:", url)
+
+    async def stop(self, timeout: float):
+        """
+        Перестаёт брать апдейты, дообрабатывает очередь и начатые
+        обработчики (не дольше timeout секунд).
+        """
+        if self._polling is not None:
+            self._polling.cancel()
+            await asyncio.gather(self._polling, return_exceptions=True)
+
+        deadline = time.monotonic() + timeout
+        try:
+            await asyncio.wait_for(asyncio.gather(*(q.join() for q in self._queues)), timeout)
+            if self._handling:
+                await asyncio.wait(self._handling, timeout=max(deadline - time.monotonic(), 0))
+        except asyncio.TimeoutError:
+            pass
+        if self._handling:
+            print(f"Не дождались обработчиков апдейтов: {len(self._handling)}")
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        await self._confirm_handled()
+        if _current["dispatcher"] is self:
+            _current["dispatcher"] = None
+
+
+async def start_application(app, register_webhook: bool = True) -> UpdateDispatcher:
+    """
+    Запускает Application и приём апдейтов в режиме BOT_MODE.
+    В режиме webhook апдейты приходят в api.views.telegram_webhook_view.
+    """
+    await app.initialize()
+    if app.post_init:
+        await app.post_init(app)
+    await app.start()
+
+    dispatcher = UpdateDispatcher(app)
+    dispatcher.start()
+    if BOT_MODE == "webhook":
+        if register_webhook:
+            await dispatcher.set_webhook()
+    else:
+        dispatcher.start_polling()
+    return dispatcher
+
+
+async def stop_application(app, dispatcher: UpdateDispatcher, timeout: float):
+    """
+    Перестаёт брать апдейты и ждёт уже начатые обработчики (ответы GPT).
+    """
+    await dispatcher.stop(timeout)
+    await app.stop()
+    await app.shutdown()
+    if app.post_shutdown:
+        await app.post_shutdown(app)
@@ -0,0 +1,250 @@
+# bot/gpt_scheduler.py
+
+"""
+Очередь запросов к OpenAI: приоритеты, честная доля ассистентов и лимиты API.
+
+Все вызовы GPT процесса (и из event loop, и из фоновых потоков резюме)
+получают слот у одного GPTScheduler:
+— сначала уточняющие вопросы ассистентов, потом ответы на пересылки,
+  потом фоновая работа (резюме);
+— внутри приоритета ассистенты обслуживаются по кругу: 30 пересылок одного
+  не задерживают единственный вопрос другого;
+— одновременно не больше max_concurrency запросов, а частота запросов
+  и токенов не превышает лимиты аккаунта (RPM/TPM, token bucket).
+
+Приоритет и владелец запроса берутся из контекста (gpt_job), поэтому
+gpt_utils не нужно протаскивать их через все вызовы.
+"""
+
+import asyncio
+import contextvars
+import threading
+import time
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager, contextmanager
+from dataclasses import dataclass, field
+from typing import Callable, Optional
+
+from . import metrics
+
+PRIORITY_FOLLOW_UP = 0   # вопрос ассистента по клиенту — ассистент ждёт в чате
+PRIORITY_FORWARD = 1     # ответ на пересланное сообщение клиента
+PRIORITY_BACKGROUND = 2  # резюме переписки и прочая фоновая работа
+PRIORITIES = (PRIORITY_FOLLOW_UP, PRIORITY_FORWARD, PRIORITY_BACKGROUND)
+
+_priority = contextvars.ContextVar("gpt_priority", default=PRIORITY_FORWARD)
+_owner = contextvars.ContextVar("gpt_owner", default=None)
+_on_queued = contextvars.ContextVar("gpt_on_queued", default=None)
+
+
+@contextmanager
+def gpt_job(priority: int = None, owner=None, on_queued=None):
+    """
+    Задаёт приоритет и владельца (обычно Telegram ID ассистента)
+    для всех вызовов GPT внутри блока.
+
+    on_queued(waiting) — корутина, которую async-слот вызывает, если запрос
+    не получил слот сразу; waiting — сколько запросов ждёт с тем же или
+    более высоким приоритетом. Так бот предупреждает ассистента о задержке.
+    """
+    tokens = []
+    if priority is not None:
+        tokens.append((_priority, _priority.set(priority)))
+    if owner is not None:
+        tokens.append((_owner, _owner.set(str(owner))))
+    if on_queued is not None:
+        tokens.append((_on_queued, _on_queued.set(on_queued)))
+    try:
+        yield
+    finally:
+        for var, token in reversed(tokens):
+            var.reset(token)
+
+
+class TokenBucket:
+    """
+    limit единиц за period секунд, пополняется непрерывно; 0 — без ограничения.
+    """
+
+    def __init__(self, limit: int, period: float = 60.0):
+        self.capacity = float(limit)
+        self.rate = limit / period if limit else 0.0
+        self.level = self.capacity
+        self.updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount: float) -> float:
+        if not self.capacity:
+            return 0.0
+        self._refill()
+        # Запрос больше всей ёмкости ждёт полного ведра, иначе не пройдёт никогда
+        need = min(amount, self.capacity)
+        return 0.0 if self.level >= need else (need - self.level) / self.rate
+
+    def take(self, amount: float):
+        if self.capacity:
+            self._refill()
+            self.level -= amount
+
+    def give_back(self, amount: float):
+        if self.capacity:
+            self._refill()
+            self.level = min(self.capacity, self.level + amount)
+
+
+@dataclass
+class Job:
+    priority: int
+    owner: Optional[str]
+    tokens: int
+    wake: Callable = None
+    granted: bool = False
+    used_tokens: Optional[int] = None  # фактические токены из usage, если известны
+    queued_at: float = field(default_factory=time.monotonic)
+
+
+class GPTScheduler:
+    def __init__(self, max_concurrency: int, rpm: int = 0, tpm: int = 0, period: float = 60.0):
+        self.max_concurrency = max_concurrency
+        self.requests = TokenBucket(rpm, period)
+        self.tokens = TokenBucket(tpm, period)
+        self._queues = {priority: OrderedDict() for priority in PRIORITIES}  # owner -> deque(Job)
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self._timer = None
+
+    def waiting(self, priority: int = PRIORITY_BACKGROUND) -> int:
+        """
+        Сколько запросов с приоритетом не ниже priority ждут слота.
+        """
+        with self._lock:
+            return sum(
+                len(jobs) for p, queue in self._queues.items() if p <= priority for jobs in queue.values()
+            )
+
+    def _head(self):
+        for queue in self._queues.values():
+            for owner, jobs in queue.items():
+                return queue, owner, jobs
+        return None
+
+    def _dispatch(self):
+        woken = []
+        with self._lock:
+            while self._in_flight < self.max_concurrency:
+                head = self._head()
+                if head is None:
+                    break
+                queue, owner, jobs = head
+                job = jobs[0]
+                wait = max(self.requests.wait_time(1), self.tokens.wait_time(job.tokens))
+                if wait > 0:
+                    self._wake_later(wait)
+                    break
+
+                jobs.popleft()
+                # Владелец уходит в конец круга — следующим обслуживается другой ассистент
+                del queue[owner]
+                if jobs:
+                    queue[owner] = jobs
+                self.requests.take(1)
+                self.tokens.take(job.tokens)
+                self._in_flight += 1
+                job.granted = True
+                woken.append(job)
+        for job in woken:
+            job.wake()
+
+    def _wake_later(self, delay: float):
+        if self._timer is not None:
+            self._timer.cancel()
+        self._timer = threading.Timer(delay, self._dispatch)
+        self._timer.daemon = True
+        self._timer.start()
+
+    def _enqueue(self, job: Job):
+        with self._lock:
+            self._queues[job.priority].setdefault(job.owner, deque()).append(job)
+        self._dispatch()
+
+    def _release(self, job: Job):
+        with self._lock:
+            self._in_flight -= 1
+            if job.used_tokens is not None:
+                # Оценка была грубой — возвращаем лишнее или добираем недостающее
+                difference = job.tokens - job.used_tokens
+                if difference > 0:
+                    self.tokens.give_back(difference)
+                else:
+                    self.tokens.take(-difference)
+        self._dispatch()
+
+    def _cancel(self, job: Job):
+        with self._lock:
+            if not job.granted:
+                queue = self._queues[job.priority]
+                jobs = queue.get(job.owner)
+                if jobs is not None and job in jobs:
+                    jobs.remove(job)
+                    if not jobs:
+                        del queue[job.owner]
+                return
+        self._release(job)
+
+    def _new_job(self, tokens: int) -> Job:
+        return Job(priority=_priority.get(), owner=_owner.get(), tokens=tokens)
+
+    @asynccontextmanager
+    async def slot(self, tokens: int = 0):
+        """
+        async with scheduler.slot(оценка токенов) as job: ... ; job.used_tokens = ...
+        """
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        job = self._new_job(tokens)
+        job.wake = lambda: loop.call_soon_threadsafe(_resolve, future)
+        self._enqueue(job)
+        try:
+            on_queued = _on_queued.get()
+            if on_queued is not None and not job.granted:
+                try:
+                    await on_queued(self.waiting(job.priority))
+                except Exception as e:
+                    # Уведомление — не повод терять ответ GPT
+                    print("Не удалось сообщить об очереди к GPT:", e)
+            await future
+        except BaseException:
+            # Генерацию отменили (например, пришло новое сообщение клиента) — место
+            # в очереди освобождаем, иначе слот выдадут и никогда не вернут
+            self._cancel(job)
+            raise
+        metrics.observe("gpt_queue", time.monotonic() - job.queued_at)
+        try:
+            yield job
+        finally:
+            self._release(job)
+
+    @contextmanager
+    def slot_sync(self, tokens: int = 0):
+        """
+        То же для синхронного кода (фоновые потоки, старые sync-вызовы).
+        """
+        granted = threading.Event()
+        job = self._new_job(tokens)
+        job.wake = granted.set
+        self._enqueue(job)
+        granted.wait()
+        metrics.observe("gpt_queue", time.monotonic() - job.queued_at)
+        try:
+            yield job
+        finally:
+            self._release(job)
+
+
+def _resolve(future):
+    if not future.done():
+        future.set_result(None)
@@ -0,0 +1,357 @@
+# bot/gpt_transport.py
+
+"""
+Запись и воспроизведение HTTP-обмена с OpenAI — для тестов и нагрузочных
+прогонов без сети.
+
+GPT_TRANSPORT=record — запросы идут в OpenAI как обычно, каждый ответ
+дописывается в кассету GPT_CASSETTE (JSONL): статус, content-type, время
+до заголовков и куски тела с паузами между ними — для потока это SSE
+в том виде и с той скоростью, как он пришёл.
+
+GPT_TRANSPORT=replay — сеть не нужна: ответ берётся из кассеты по ключу
+запроса (sha256 от пути и тела). Если такого запроса не записано — по кругу
+из записанных того же вида (путь, stream), с GPT_REPLAY_STRICT=1 — ошибка.
+Паузы воспроизводятся с множителем GPT_REPLAY_LATENCY (0 — без пауз),
+поэтому распределение задержек и разбиение потока — как у записи. Доля
+GPT_REPLAY_ERROR_RATE запросов получает ошибку из GPT_REPLAY_ERRORS
+(429 с retry-after, 5xx) — SDK повторяет их, как повторял бы настоящие.
+
+Промпты в кассету не пишутся, только их хэш; ответы — пишутся.
+"""
+
+import asyncio
+import base64
+import hashlib
+import json
+import os
+import random
+import threading
+import time
+from pathlib import Path
+
+import httpx
+from django.conf import settings
+
+
+GPT_TRANSPORT = os.getenv("GPT_TRANSPORT", "live")  # live | record | replay
+GPT_CASSETTE = Path(os.getenv("GPT_CASSETTE", Path(settings.BASE_DIR) / "gpt_cassette.jsonl"))
+GPT_REPLAY_LATENCY = float(os.getenv("GPT_REPLAY_LATENCY", "1"))  # множитель записанных пауз
+GPT_REPLAY_ERROR_RATE = float(os.getenv("GPT_REPLAY_ERROR_RATE", "0"))
+GPT_REPLAY_ERRORS = tuple(int(s) for s in os.getenv("GPT_REPLAY_ERRORS", "429,500,503").split(","))
+GPT_REPLAY_RETRY_AFTER = float(os.getenv("GPT_REPLAY_RETRY_AFTER", "1"))  # секунд в retry-after у 429
+GPT_REPLAY_STRICT = os.getenv("GPT_REPLAY_STRICT", "0") == "1"
+GPT_REPLAY_SEED = os.getenv("GPT_REPLAY_SEED")
+
+
+class CassetteMiss(LookupError):
+    """В кассете нет ответа на такой запрос."""
+
+
+def request_kind(request: httpx.Request) -> tuple:
+    """
+    (ключ, вид) запроса: ключ — sha256 от пути и тела, вид — (путь, stream).
+    """
+    body = request.read()
+    try:
+        data = json.loads(body) if body else {}
+    except ValueError:
+        data = {}
+    canonical = json.dumps(data, sort_keys=True, ensure_ascii=False) if data else body.decode("latin-1")
+    key = hashlib.sha256(f"{request.url.path}\n{canonical}".encode()).hexdigest()
+    stream = isinstance(data, dict) and bool(data.get("stream"))
+    return key, (request.url.path, stream)
+
+
+def _encode_chunk(delay: float, data: bytes) -> dict:
+    try:
+        return {"delay": round(delay, 4), "data": data.decode("utf-8")}
+    except UnicodeDecodeError:
+        # Кусок потока разрезал многобайтный символ
+        return {"delay": round(delay, 4), "b64": base64.b64encode(data).decode()}
+
+
+def _decode_chunk(chunk: dict) -> bytes:
+    if "b64" in chunk:
+        return base64.b64decode(chunk["b64"])
+    return chunk["data"].encode("utf-8")
+
+
+class Cassette:
+    """
+    Записанные ответы: JSONL, по строке на ответ. Дописывается из любых потоков.
+    """
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.entries = []
+        self._lock = threading.Lock()
+        if self.path.exists():
+            with open(self.path, encoding="utf-8") as f:
+                self.entries = [json.loads(line) for line in f if line.strip()]
+
+    def append(self, entry: dict):
+        line = json.dumps(entry, ensure_ascii=False) + "\n"
+        with self._lock:
+            self.entries.append(entry)
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(line)
+
+
+class _Recorder:
+    """
+    Пропускает куски тела ответа дальше и запоминает их с паузами;
+    в кассету ответ попадает, только если тело дочитали до конца.
+    """
+
+    def __init__(self, cassette: Cassette, request: httpx.Request, response: httpx.Response, started: float):
+        key, (path, stream) = request_kind(request)
+        now = time.perf_counter()
+        self.cassette = cassette
+        self.entry = {
+            "key": key,
+            "path": path,
+            "stream": stream,
+            "status": response.status_code,
+            "content_type": response.headers.get("content-type", "application/json"),
+            "ttfb": round(now - started, 4),
+            "chunks": [],
+        }
+        self.last = now
+        self.complete = False
+
+    def chunk(self, data: bytes):
+        now = time.perf_counter()
+        if data:
+            self.entry["chunks"].append(_encode_chunk(now - self.last, data))
+        self.last = now
+
+    def close(self):
+        if self.complete:
+            self.cassette.append(self.entry)
+
+
+class _RecordingStream(httpx.SyncByteStream):
+    def __init__(self, stream, recorder: _Recorder):
+        self.stream = stream
+        self.recorder = recorder
+
+    def __iter__(self):
+        for data in self.stream:
+            self.recorder.chunk(data)
+            yield data
+        self.recorder.complete = True
+
+    def close(self):
+        self.stream.close()
+        self.recorder.close()
+
+
+class _AsyncRecordingStream(httpx.AsyncByteStream):
+    def __init__(self, stream, recorder: _Recorder):
+        self.stream = stream
+        self.recorder = recorder
+
+    async def __aiter__(self):
+        async for data in self.stream:
+            self.recorder.chunk(data)
+            yield data
+        self.recorder.complete = True
+
+    async def aclose(self):
+        await self.stream.aclose()
+        self.recorder.close()
+
+
+def _identity(request: httpx.Request):
+    # Без сжатия в кассету попадает тот же SSE-текст, что читает SDK
+    request.headers["Accept-Encoding"] = "identity"
+
+
+class RecordingTransport(httpx.BaseTransport):
+    def __init__(self, cassette: Cassette, transport: httpx.BaseTransport = None):
+        self.cassette = cassette
+        self.transport = transport or httpx.HTTPTransport()
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        _identity(request)
+        started = time.perf_counter()
+        response = self.transport.handle_request(request)
+        recorder = _Recorder(self.cassette, request, response, started)
+        return httpx.Response(
+            response.status_code, headers=response.headers,
+            stream=_RecordingStream(response.stream, recorder), extensions=response.extensions,
+        )
+
+    def close(self):
+        self.transport.close()
+
+
+class AsyncRecordingTransport(httpx.AsyncBaseTransport):
+    def __init__(self, cassette: Cassette, transport: httpx.AsyncBaseTransport = None):
+        self.cassette = cassette
+        self.transport = transport or httpx.AsyncHTTPTransport()
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        _identity(request)
+        started = time.perf_counter()
+        response = await self.transport.handle_async_request(request)
+        recorder = _Recorder(self.cassette, request, response, started)
+        return httpx.Response(
+            response.status_code, headers=response.headers,
+            stream=_AsyncRecordingStream(response.stream, recorder), extensions=response.extensions,
+        )
+
+    async def aclose(self):
+        await self.transport.aclose()
+
+
+class _ReplayStream(httpx.SyncByteStream, httpx.AsyncByteStream):
+    def __init__(self, chunks: list, latency: float):
+        self.chunks = chunks
+        self.latency = latency
+
+    def __iter__(self):
+        for chunk in self.chunks:
+            if self.latency and chunk["delay"]:
+                time.sleep(chunk["delay"] * self.latency)
+            yield _decode_chunk(chunk)
+
+    async def __aiter__(self):
+        for chunk in self.chunks:
+            if self.latency and chunk["delay"]:
+                await asyncio.sleep(chunk["delay"] * self.latency)
+            yield _decode_chunk(chunk)
+
+
+class ReplayTransport(httpx.BaseTransport, httpx.AsyncBaseTransport):
+    """
+    Отвечает из кассеты; годится и для OpenAI, и для AsyncOpenAI.
+    stats: requests, exact (нашёлся тот же запрос), reused (взят похожий), injected (ошибки).
+    """
+
+    def __init__(self, cassette: Cassette, latency: float = 1.0, error_rate: float = 0.0,
+                 errors: tuple = (429, 500, 503), retry_after: float = 1.0, strict: bool = False, seed=None):
+        self.latency = latency
+        self.error_rate = error_rate
+        self.errors = errors
+        self.retry_after = retry_after
+        self.strict = strict
+        self.stats = {"requests": 0, "exact": 0, "reused": 0, "injected": 0}
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._by_key = {}
+        self._by_kind = {}
+        self._next = {}  # ключ или вид -> сколько раз уже отвечали
+        for entry in cassette.entries:
+            self._by_key.setdefault(entry["key"], []).append(entry)
+            if entry["status"] == 200:
+                self._by_kind.setdefault((entry["path"], entry["stream"]), []).append(entry)
+
+    def _take(self, group_key, entries: list) -> dict:
+        index = self._next.get(group_key, 0)
+        self._next[group_key] = index + 1
+        return entries[index % len(entries)]
+
+    def _pick(self, request: httpx.Request):
+        """
+        (записанный ответ, None) или (None, статус ошибки), которую надо вернуть.
+        """
+        key, kind = request_kind(request)
+        with self._lock:
+            self.stats["requests"] += 1
+            if self.error_rate and self._random.random() < self.error_rate:
+                self.stats["injected"] += 1
+                return None, self._random.choice(self.errors)
+            if key in self._by_key:
+                self.stats["exact"] += 1
+                return self._take(key, self._by_key[key]), None
+            if self.strict or kind not in self._by_kind:
+                raise CassetteMiss(f"нет записанного ответа на {kind[0]} (stream={kind[1]})")
+            self.stats["reused"] += 1
+            return self._take(kind, self._by_kind[kind]), None
+
+    def _error_response(self, status: int, request: httpx.Request) -> httpx.Response:
+        headers = {"x-should-retry": "true"}
+        if status == 429:
+            headers["retry-after-ms"] = str(int(self.retry_after * 1000))
+            error = {"message": "Rate limit reached (injected)", "type": "requests", "code": "rate_limit_exceeded"}
+        else:
+            error = {"message": "The server had an error (injected)", "type": "server_error", "code": None}
+        return httpx.Response(status, headers=headers, json={"error": error}, request=request)
+
+    def _response(self, entry: dict, request: httpx.Request) -> httpx.Response:
+        return httpx.Response(
+            entry["status"], headers={"content-type": entry["content_type"]},
+            stream=_ReplayStream(entry["chunks"], self.latency), request=request,
+        )
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        entry, error = self._pick(request)
+        if error is not None:
+            return self._error_response(error, request)
+        if self.latency:
+            time.sleep(entry["ttfb"] * self.latency)
+        return self._response(entry, request)
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        entry, error = self._pick(request)
+        if error is not None:
+            return self._error_response(error, request)
+        if self.latency:
+            await asyncio.sleep(entry["ttfb"] * self.latency)
+        return self._response(entry, request)
+
+
+_cassettes = {}
+_cassettes_lock = threading.Lock()
+_replay = {"transport": None}
+
+
+def get_cassette(path=None) -> Cassette:
+    """
+    Одна кассета на файл: синхронный и асинхронный клиенты пишут в один объект.
+    """
+    path = Path(path or GPT_CASSETTE)
+    with _cassettes_lock:
+        if path not in _cassettes:
+            _cassettes[path] = Cassette(path)
+        return _cassettes[path]
+
+
+def replay_transport(path=None, **options) -> ReplayTransport:
+    """
+    ReplayTransport по кассете с настройками GPT_REPLAY_* (options их перекрывают).
+    """
+    config = {
+        "latency": GPT_REPLAY_LATENCY,
+        "error_rate": GPT_REPLAY_ERROR_RATE,
+        "errors": GPT_REPLAY_ERRORS,
+        "retry_after": GPT_REPLAY_RETRY_AFTER,
+        "strict": GPT_REPLAY_STRICT,
+        "seed": GPT_REPLAY_SEED,
+    }
+    config.update(options)
+    return ReplayTransport(Cassette(path or GPT_CASSETTE), **config)
+
+
+def http_client(asynchronous: bool = False, mode: str = None, transport=None):
+    """
+    httpx-клиент для OpenAI(http_client=...) в режиме GPT_TRANSPORT;
+    None в режиме live — SDK создаёт свой, как раньше.
+    """
+    mode = mode or GPT_TRANSPORT
+    if mode == "record":
+        recording = AsyncRecordingTransport if asynchronous else RecordingTransport
+        transport = recording(get_cassette(), transport)
+    elif mode == "replay":
+        if transport is None:
+            # Общий на процесс: синхронный и асинхронный клиенты идут по одной кассете
+            with _cassettes_lock:
+                if _replay["transport"] is None:
+                    _replay["transport"] = replay_transport()
+            transport = _replay["transport"]
+    elif transport is None:
+        return None
+    return httpx.AsyncClient(transport=transport) if asynchronous else httpx.Client(transport=transport)
@@ -1,32 +1,69 @@
 # bot/gpt_utils.py
 
-from openai import OpenAI
+from openai import OpenAI, AsyncOpenAI
 import os
 import re
 from dotenv import load_dotenv
 from asgiref.sync import sync_to_async
 
-from .models import Message, Stage, KnowledgeBlock
+from . import gpt_transport, metrics, reply_format
+from .models import Message, Stage, ClientSummary
+from .gpt_scheduler import GPTScheduler
+from .knowledge_cache import get_knowledge_snapshot
+from .reply_format import ReplyParseError
+from .tokens import count_tokens
+from .prompts import (
+    Prompt, build_prompt, SALES_INSTRUCTIONS, SALES_INSTRUCTIONS_JSON, COLLEAGUE_INSTRUCTIONS, SUMMARY_INSTRUCTIONS,
+)
 
 
 load_dotenv()
 
-client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+GPT_MODEL = os.getenv("GPT_MODEL", "gpt-4o")
+GPT_TIMEOUT = float(os.getenv("GPT_TIMEOUT", "60"))  # секунд на один запрос
+GPT_MAX_RETRIES = int(os.getenv("GPT_MAX_RETRIES", "2"))
+GPT_MAX_CONCURRENCY = int(os.getenv("GPT_MAX_CONCURRENCY", "16"))  # одновременных запросов на процесс
+# Лимиты аккаунта OpenAI в минуту (0 — не ограничивать), см. gpt_scheduler.
+# Лучше ставить чуть ниже лимитов аккаунта: запросы приходят в OpenAI с разной задержкой
+GPT_RPM_LIMIT = int(os.getenv("GPT_RPM_LIMIT", "0"))
+GPT_TPM_LIMIT = int(os.getenv("GPT_TPM_LIMIT", "0"))
+GPT_COMPLETION_TOKENS = int(os.getenv("GPT_COMPLETION_TOKENS", "500"))  # оценка длины ответа для TPM
+GPT_STREAM = os.getenv("GPT_STREAM", "1") == "1"  # показывать ответ по мере генерации
+# json_schema — ответ клиенту JSON-объектом по схеме (см. reply_format), text — прежние три секции
+GPT_RESPONSE_FORMAT = os.getenv("GPT_RESPONSE_FORMAT", "json_schema")
+GPT_PARSE_RETRIES = int(os.getenv("GPT_PARSE_RETRIES", "1"))  # повторных запросов, если ответ не разобрался
+HISTORY_LIMIT = int(os.getenv("HISTORY_LIMIT", "10"))  # сообщений истории в prompt
+# Сколько новых сообщений за пределами окна истории копится до обновления резюме
+SUMMARY_STEP = int(os.getenv("SUMMARY_STEP", "6"))
+GPT_SUMMARY_MODEL = os.getenv("GPT_SUMMARY_MODEL", GPT_MODEL)
+
+# GPT_TRANSPORT=record | replay — обмен с OpenAI пишется в кассету или берётся из неё (gpt_transport)
+client = OpenAI(
+    api_key=os.getenv("OPENAI_API_KEY"), timeout=GPT_TIMEOUT, max_retries=GPT_MAX_RETRIES,
+    http_client=gpt_transport.http_client(),
+)
+async_client = AsyncOpenAI(
+    api_key=os.getenv("OPENAI_API_KEY"), timeout=GPT_TIMEOUT, max_retries=GPT_MAX_RETRIES,
+    http_client=gpt_transport.http_client(asynchronous=True),
+)
+
+SYSTEM_PROMPT = "Ты ассистент по продажам онлайн-курса, общающийся в чате."
+SYSTEM_PROMPT_PLAIN = "Ты — помощник по продажам. Отвечай коллеге по клиенту."
+
+_scheduler = {"config": None, "value": None}
 
 
 def get_latest_knowledge_block() -> str:
-    block = KnowledgeBlock.objects.order_by("-updated_at").first()
-    return block.content if block else ""
-
-
-def get_history_text(client, limit=10) -> str:
     """
-    Собирает последние N сообщений клиента и бота.
-    Возвращает в формате: "Клиент: ... \n Бот: ..."
+    Текст последнего KnowledgeBlock из кэша процесса (см. knowledge_cache).
     """
+    return get_knowledge_snapshot().content
 
-    history = Message.objects.filter(client=client).order_by('created_at')[:limit]
 
+def format_history(history) -> list:
+    """
+    Превращает сообщения в строки вида "Клиент: ...", "Бот: ...".
+    """
     lines = []
     for msg in history:
         prefix = {
@@ -35,64 +72,91 @@ def get_history_text(client, limit=10) -> str:
             "assistant": "Ассистент:"
         }.get(msg.author, "Сообщение:")
         lines.append(f"{prefix} {msg.text}")
-    return "\n".join(lines)
+    return lines
 
 
-def stage_letter_to_label(stage: str) -> str:
+def get_recent_messages(client, limit=HISTORY_LIMIT) -> list:
     """
-    Преобразует символ этапа SPIN (S/P/I/N) в человекочитаемый текст
+    Последние N сообщений клиента в хронологическом порядке.
+    Запрос идёт по индексу (client_id, created_at) с конца.
     """
-    return {
-        'S': 'S — Situation (ситуационные вопросы)',
-        'P': 'P — Problem (проблемные вопросы)',
-        'I': 'I — Implication (вопросы-усугубления)',
-        'N': 'N — Need-Payoff (ценностные вопросы)'
-    }.get(stage, 'S — Situation (ситуационные вопросы)')
+    recent = Message.objects.filter(client=client).order_by("-created_at", "-id")[:limit]
+    return list(recent)[::-1]
 
 
-def generate_prompt(client, new_message_text: str) -> str:
+def get_conversation_context(client) -> tuple:
     """
-    Формирует prompt для GPT: база знаний + история + новое сообщение.
-    Ожидается: ответ клиенту, подсказка ассистенту и SPIN-этап.
+    Возвращает (резюме старой переписки, последние сообщения).
+    Сырые сообщения берутся все после тех, что уже вошли в резюме, без
+    ограничения: пока фоновое обновление резюме отстаёт, ничего не теряется,
+    а догнав, оно снова сжимает хвост до HISTORY_LIMIT + SUMMARY_STEP.
     """
+    with metrics.span("history"):
+        summary = ClientSummary.objects.filter(client=client).first()
+        if summary is None:
+            return "", get_recent_messages(client)
 
-    client_name = client.name or f"ID {client.telegram_id}"
-    history_text = get_history_text(client)
-    knowledge_block = get_latest_knowledge_block()
-    try:
-        stage_obj = Stage.objects.get(client=client)
-        current_stage = stage_letter_to_label(stage_obj.stage)
-        spin_line = f"Текущий SPIN-этап клиента: {current_stage}\n"
-    except Stage.DoesNotExist:
-        spin_line = "Текущий SPIN-этап клиента: S — Situation (ситуационные вопросы)\n"
+        recent = Message.objects.filter(client=client, id__gt=summary.last_message_id).order_by("created_at", "id")
+        return summary.text, list(recent)
 
-    return f"""
-{knowledge_block}
 
+def summary_head(head: str, summary_text: str) -> str:
+    if not summary_text:
+        return head
+    return f"{head}\n\nКраткое содержание предыдущей переписки:\n{summary_text}"
 
-Клиент по имени {client_name} ведет переписку.
 
-{spin_line}
+def get_history_lines(client, limit=HISTORY_LIMIT) -> list:
+    return format_history(get_recent_messages(client, limit))
 
-История сообщений
-{history_text}
 
-Новое сообщение клиента:
-\"{new_message_text}\"
+def get_history_text(client, limit=HISTORY_LIMIT) -> str:
+    """
+    Собирает последние N сообщений клиента и бота.
+    Возвращает в формате: "Клиент: ... \n Бот: ..."
+    """
+    return "\n".join(get_history_lines(client, limit))
 
-Ответь клиенту так, как если бы ты был опытным ассистентом, продающим онлайн-курс.
-Отвечай на «вы»(пока он сам не попросит перейти на "ты"), используй методику SPIN, развивай диалог.
 
-⚠️ Ответ обязательно верни в таком формате:
+def stage_letter_to_label(stage: str) -> str:
+    """
+    Преобразует символ этапа SPIN (S/P/I/N) в человекочитаемый текст
+    """
+    return {
+        'S': 'S — Situation (ситуационные вопросы)',
+        'P': 'P — Problem (проблемные вопросы)',
+        'I': 'I — Implication (вопросы-усугубления)',
+        'N': 'N — Need-Payoff (ценностные вопросы)'
+    }.get(stage, 'S — Situation (ситуационные вопросы)')
+
 
-Ответ клиенту:
-{{здесь текст ответа клиенту}}
+def generate_prompt(client, new_message_text: str, context=None) -> Prompt:
+    """
+    Формирует prompt для GPT: стабильный префикс с инструкциями, затем
+    релевантная часть базы знаний, SPIN-этап, резюме старой переписки,
+    последние сообщения и новое сообщение.
+    Ожидается: ответ клиенту, подсказка ассистенту и SPIN-этап.
 
-Подсказка ассистенту:
-{{что порекомендуешь ассистенту сделать дальше в соответствии со SPIN методикой — уточнить, спросить и т.д.}}
+    context — ClientContext из context_cache; с ним история и этап не читаются из БД.
+    """
 
-#Этап: S / P / I / N (например, #Этап: P, #Этап: I и т.д.)
-"""
+    client_name = client.name or f"ID {client.telegram_id}"
+    if context is not None:
+        summary_text, history, stage = context.summary, context.history, context.stage
+    else:
+        summary_text, history = get_conversation_context(client)
+        stage = Stage.objects.filter(client=client).values_list("stage", flat=True).first()
+    history_lines = format_history(history)
+    spin_line = f"Текущий SPIN-этап клиента: {stage_letter_to_label(stage)}"
+
+    return build_prompt(
+        SALES_INSTRUCTIONS_JSON if GPT_RESPONSE_FORMAT == "json_schema" else SALES_INSTRUCTIONS,
+        query=new_message_text + "\n" + "\n".join(history_lines),
+        head=summary_head(f"Клиент по имени {client_name} ведет переписку.\n\n{spin_line}", summary_text),
+        history_title="История сообщений",
+        history_lines=history_lines,
+        tail=f"Новое сообщение клиента:\n\"{new_message_text}\"",
+    )
 
 
 def extract_stage(text: str) -> str:
@@ -112,24 +176,13 @@ def clean_reply(reply: str) -> str:
     return re.sub(r'#Этап:\s*[SPIN]', '', reply).strip()
 
 
-def call_gpt(prompt: str) -> dict:
+def parse_gpt_reply(full_reply: str) -> dict:
     """
-    Отправляет prompt в GPT и парсит:
+    Парсит ответ GPT на три части:
     - Ответ клиенту
     - Подсказку ассистенту
     - SPIN-этап
     """
-    response = client.chat.completions.create(
-        model="gpt-4o",
-        messages=[
-            {"role": "system", "content": "Ты ассистент по продажам онлайн-курса, общающийся в чате."},
-            {"role": "user", "content": prompt}
-        ],
-        temperature=0.7,
-    )
-
-    full_reply = response.choices[0].message.content
-    print("GPT ответил:\n", full_reply)
     stage = extract_stage(full_reply)
     reply_match = re.search(r"Ответ клиенту:\s*(.*?)\n+Подсказка ассистенту:", full_reply, re.DOTALL)
     hint_match = re.search(r"Подсказка ассистенту:\s*(.*?)\n+#Этап:", full_reply, re.DOTALL)
@@ -144,54 +197,429 @@ def call_gpt(prompt: str) -> dict:
     }
 
 
-async def generate_assistant_prompt(client, assistant_question: str) -> str:
+def parse_sections(full_reply) -> dict:
     """
-    Формирует prompt для GPT на вопрос ассистента по активному клиенту.
+    parse_gpt_reply без подстановок: если секции «Ответ клиенту» нет — ReplyParseError.
+    Жирные заголовки (**Ответ клиенту:**) и «Этап:» без решётки тоже разбираются.
     """
+    text = re.sub(r"\*\*(Ответ клиенту:|Подсказка ассистенту:|#?Этап:)\*\*", r"\1", full_reply or "")
+    text = re.sub(r"^\s*Этап:", "#Этап:", text, flags=re.MULTILINE)
+    if not re.search(r"Ответ клиенту:\s*\S.*?\n+Подсказка ассистенту:", text, re.DOTALL):
+        raise ReplyParseError("нет секций «Ответ клиенту» / «Подсказка ассистенту»")
+    return parse_gpt_reply(text)
 
-    client_name = client.name or f"ID {client.telegram_id}"
-    knowledge_block = await sync_to_async(get_latest_knowledge_block)()
 
-    history = await sync_to_async(list)(
-        Message.objects.filter(client=client).order_by("created_at")[:10]
-    )
+def parse_reply(content) -> tuple:
+    """
+    Разбирает ответ GPT на сообщение клиента в формате GPT_RESPONSE_FORMAT.
+    Возвращает (результат, "ok" | "repaired"); "repaired" — разобрался
+    только после локальной починки. Если не разобрался — ReplyParseError.
+    """
+    if GPT_RESPONSE_FORMAT != "json_schema":
+        return parse_sections(content), "ok"
+    try:
+        return reply_format.parse_json_reply(content), "ok"
+    except ReplyParseError as e:
+        error = e
+    # Модель могла уйти в прежний формат секций — ответ при этом годный
+    for repair in (reply_format.repair_json_reply, parse_sections):
+        try:
+            return repair(content), "repaired"
+        except ReplyParseError:
+            pass
+    raise error
 
-    lines = []
-    for msg in history:
-        prefix = {
-            "client": "Клиент:",
-            "bot": "Бот:",
-            "assistant": "Ассистент:"
-        }.get(msg.author, "Сообщение:")
-        lines.append(f"{prefix} {msg.text}")
-    history_text = "\n".join(lines)
 
-    return f"""
-{knowledge_block}
+def add_usage(usage: dict, more: dict) -> dict:
+    for kind, value in more.items():
+        usage[kind] = usage.get(kind, 0) + value
+    return usage
 
-Клиент по имени {client_name} ведет переписку.
 
-История сообщений:
-{history_text}
+def _parse_attempt(content):
+    """
+    (результат | None, ошибка | None); исход каждого платного ответа — в метрики.
+    """
+    try:
+        with metrics.span("parse"):
+            result, outcome = parse_reply(content)
+    except ReplyParseError as e:
+        metrics.count("gpt_reply_parse_total", result="failed")
+        if metrics.METRICS_TRACE_LOG:
+            print("Ответ GPT не разобрался:", e)
+        return None, str(e)
+    metrics.count("gpt_reply_parse_total", result=outcome)
+    return result, None
+
 
-Вопрос ассистента:
-"{assistant_question}"
+def _fallback_reply(content) -> dict:
+    # Ассистент увидит то же, что раньше при сбое регулярок; в кэш ответов такое не попадает
+    metrics.count("gpt_reply_fallback_total")
+    return dict(parse_gpt_reply(content or ""), parse_failed=True)
 
-Ты — опытный ассистент по продажам. Ответь своему коллеге, который интересуется этим клиентом.
-Отвечай ясно и кратко. Не нужно обращаться к клиенту. Просто дай суть.
-"""
 
+def _stream_options(system_prompt: str) -> dict:
+    return sales_options(stream=True) if system_prompt == SYSTEM_PROMPT else STREAM_USAGE_OPTIONS
 
-def call_gpt_plain(prompt: str) -> str:
+
+def sales_options(stream: bool = False) -> dict:
+    """
+    extra_body запроса ответа клиенту: схема ответа и usage в конце потока.
+    """
+    options = dict(STREAM_USAGE_OPTIONS) if stream else {}
+    if GPT_RESPONSE_FORMAT == "json_schema":
+        options["response_format"] = reply_format.RESPONSE_FORMAT
+    return options
+
+
+SECTION_HEADERS = (
+    ("reply", "Ответ клиенту:"),
+    ("assistant_hint", "Подсказка ассистенту:"),
+    ("stage", "#Этап:"),
+)
+
+
+class SectionStreamParser:
+    """
+    Инкрементально разбирает поток токенов GPT на секции
+    «Ответ клиенту» / «Подсказка ассистенту» / «#Этап».
+
+    feed() возвращает события:
+    - {"type": "delta", "section": ..., "text": ...} — новый кусок текста секции;
+    - {"type": "section", "section": ..., "text": ...} — секция закончилась (текст целиком).
+    Заголовки секций в события не попадают, даже если пришли по частям.
+    """
+
+    def __init__(self):
+        self.text = ""
+        self.index = -1          # -1 — текст до первого заголовка
+        self.section_start = 0
+        self.emitted = 0
+
+    def _current(self):
+        return SECTION_HEADERS[self.index][0] if self.index >= 0 else None
+
+    def _next_header(self):
+        if self.index + 1 < len(SECTION_HEADERS):
+            return SECTION_HEADERS[self.index + 1][1]
+        return None
+
+    def _delta(self, end: int) -> list:
+        section = self._current()
+        chunk = self.text[self.emitted:end]
+        self.emitted = max(self.emitted, end)
+        if section in ("reply", "assistant_hint") and chunk:
+            return [{"type": "delta", "section": section, "text": chunk}]
+        return []
+
+    def _finish_section(self, end: int) -> list:
+        events = self._delta(end)
+        section = self._current()
+        if section:
+            events.append({"type": "section", "section": section, "text": self.text[self.section_start:end].strip()})
+        return events
+
+    def feed(self, delta: str) -> list:
+        self.text += delta
+        events = []
+        while True:
+            header = self._next_header()
+            position = self.text.find(header, self.emitted) if header else -1
+            if position == -1:
+                break
+            events += self._finish_section(position)
+            self.index += 1
+            self.section_start = self.emitted = position + len(header)
+
+        # Придерживаем хвост, в котором может начинаться следующий заголовок
+        holdback = len(header) - 1 if header else 0
+        events += self._delta(max(self.emitted, len(self.text) - holdback))
+        return events
+
+    def close(self) -> list:
+        return self._finish_section(len(self.text))
+
+    def result(self) -> dict:
+        return parse_gpt_reply(self.text)
+
+
+class ReplyStreamParser:
+    """
+    Разбор потока ответа клиенту в любом формате: JSON (reply_format.JsonReplyStreamParser),
+    если ответ начался с «{» или ```-блока, иначе секции (SectionStreamParser).
+    События одинаковые; готовый ответ разбирает parse_reply по self.text.
+    """
+
+    def __init__(self):
+        self.parser = None
+        self.pending = ""
+
+    @property
+    def text(self) -> str:
+        return self.parser.text if self.parser is not None else self.pending
+
+    def feed(self, delta: str) -> list:
+        if self.parser is None:
+            self.pending += delta
+            head = self.pending.lstrip()
+            if not head:
+                return []
+            is_json = head.startswith(("{", "`"))
+            self.parser = reply_format.JsonReplyStreamParser() if is_json else SectionStreamParser()
+            delta, self.pending = self.pending, ""
+        return self.parser.feed(delta)
+
+    def close(self) -> list:
+        return self.parser.close() if self.parser is not None else []
+
+
+def _chat_messages(system_prompt: str, prompt) -> list:
+    # Prompt несёт собственный стабильный префикс; строка — старый формат
+    if isinstance(prompt, Prompt):
+        return prompt.messages()
+    return [
+        {"role": "system", "content": system_prompt},
+        {"role": "user", "content": prompt}
+    ]
+
+
+def usage_to_dict(usage) -> dict:
+    """
+    Токены запроса из поля usage ответа OpenAI, включая попавшие в кэш префикса.
+    """
+    if usage is None:
+        return {}
+    # Поля, которых нет в нашей версии SDK, приходят как dict (extra="allow")
+    if not isinstance(usage, dict):
+        usage = usage.model_dump()
+    details = usage.get("prompt_tokens_details") or {}
+    return {
+        "prompt_tokens": usage.get("prompt_tokens") or 0,
+        "cached_tokens": details.get("cached_tokens") or 0,
+        "completion_tokens": usage.get("completion_tokens") or 0,
+    }
+
+
+def log_usage(usage: dict):
+    metrics.record_usage(usage)
+    if usage and metrics.METRICS_TRACE_LOG:  # токены и так в /metrics и в строке trace
+        print(
+            f"Токены: prompt={usage['prompt_tokens']} "
+            f"(из кэша {usage['cached_tokens']}, без кэша {usage['prompt_tokens'] - usage['cached_tokens']}), "
+            f"ответ={usage['completion_tokens']}"
+        )
+
+
+def get_scheduler() -> GPTScheduler:
+    """
+    Общая на процесс очередь запросов к OpenAI (см. gpt_scheduler):
+    GPT_MAX_CONCURRENCY одновременных, не чаще GPT_RPM_LIMIT / GPT_TPM_LIMIT.
+    """
+    config = (GPT_MAX_CONCURRENCY, GPT_RPM_LIMIT, GPT_TPM_LIMIT)
+    if _scheduler["config"] != config:
+        _scheduler["value"] = GPTScheduler(*config)
+        _scheduler["config"] = config
+    return _scheduler["value"]
+
+
+def estimate_tokens(messages: list) -> int:
+    """
+    Оценка токенов запроса для лимита TPM: prompt целиком плюс типичный ответ.
+    """
+    return count_tokens("".join(m["content"] for m in messages)) + GPT_COMPLETION_TOKENS
+
+
+def used_tokens(usage: dict):
+    return usage["prompt_tokens"] + usage["completion_tokens"] if usage else None
+
+
+async def _acomplete(system_prompt: str, prompt, extra_body: dict = None) -> tuple:
+    return await _acomplete_messages(_chat_messages(system_prompt, prompt), extra_body)
+
+
+async def _acomplete_messages(messages: list, extra_body: dict = None) -> tuple:
+    async with get_scheduler().slot(estimate_tokens(messages)) as job:
+        with metrics.span("gpt"):
+            response = await async_client.chat.completions.create(
+                model=GPT_MODEL,
+                messages=messages,
+                temperature=0.7,
+                timeout=GPT_TIMEOUT,
+                extra_body=extra_body or None,
+            )
+        usage = usage_to_dict(response.usage)
+        job.used_tokens = used_tokens(usage)
+    log_usage(usage)
+    return response.choices[0].message.content, usage
+
+
+# Последний чанк потока несёт usage (stream_options появились в API позже нашей версии SDK,
+# response_format с json_schema — тоже, поэтому оба уходят в extra_body)
+STREAM_USAGE_OPTIONS = {"stream_options": {"include_usage": True}}
+
+
+async def astream_gpt(prompt, system_prompt: str = SYSTEM_PROMPT, usage: dict = None):
+    """
+    Асинхронный генератор кусков ответа GPT (stream=True).
+    Если передан словарь usage — по окончании потока в него пишутся токены.
+    С SYSTEM_PROMPT это ответ клиенту — в формате GPT_RESPONSE_FORMAT (sales_options).
+    Слот очереди (get_scheduler) занят, пока поток не дочитан.
+    Этап gpt в метриках — до конца потока, включая время, пока
+    читатель показывал куски в Telegram.
+    """
+    messages = _chat_messages(system_prompt, prompt)
+    usage = {} if usage is None else usage
+    async with get_scheduler().slot(estimate_tokens(messages)) as job:
+        with metrics.span("gpt"):
+            stream = await async_client.chat.completions.create(
+                model=GPT_MODEL,
+                messages=messages,
+                temperature=0.7,
+                timeout=GPT_TIMEOUT,
+                stream=True,
+                extra_body=_stream_options(system_prompt),
+            )
+            async for chunk in stream:
+                if chunk.choices and chunk.choices[0].delta.content:
+                    yield chunk.choices[0].delta.content
+                if getattr(chunk, "usage", None):
+                    usage.update(usage_to_dict(chunk.usage))
+        job.used_tokens = used_tokens(usage)
+    if usage:
+        log_usage(usage)
+
+
+def _complete_messages(messages: list, extra_body: dict = None) -> tuple:
+    with get_scheduler().slot_sync(estimate_tokens(messages)) as job:
+        with metrics.span("gpt"):
+            response = client.chat.completions.create(
+                model=GPT_MODEL,
+                messages=messages,
+                temperature=0.7,
+                extra_body=extra_body or None,
+            )
+        usage = usage_to_dict(response.usage)
+        job.used_tokens = used_tokens(usage)
+    log_usage(usage)
+    return response.choices[0].message.content, usage
+
+
+def call_gpt(prompt) -> dict:
+    """
+    Отправляет prompt в GPT и парсит:
+    - Ответ клиенту
+    - Подсказку ассистенту
+    - SPIN-этап
+    Плюс usage — токены запроса, в том числе из кэша префикса.
+    Неразобранный ответ — повторный запрос с описанием ошибки (GPT_PARSE_RETRIES).
+    """
+    messages = _chat_messages(SYSTEM_PROMPT, prompt)
+    full_reply, usage = _complete_messages(messages, sales_options())
+    for _attempt in range(GPT_PARSE_RETRIES):
+        result, error = _parse_attempt(full_reply)
+        if result is not None:
+            return dict(result, usage=usage)
+        messages = reply_format.repair_messages(messages, full_reply, error)
+        full_reply, more = _complete_messages(messages, sales_options())
+        add_usage(usage, more)
+    result, _error = _parse_attempt(full_reply)
+    return dict(result or _fallback_reply(full_reply), usage=usage)
+
+
+async def aparse_reply(prompt, full_reply, usage: dict) -> dict:
+    """
+    Разбирает готовый ответ на сообщение клиента (в том числе собранный
+    из потока); если не разобрался — до GPT_PARSE_RETRIES повторных запросов
+    с описанием ошибки. Токены повторов добавляются в usage.
+    """
+    messages = _chat_messages(SYSTEM_PROMPT, prompt)
+    for _attempt in range(GPT_PARSE_RETRIES):
+        result, error = _parse_attempt(full_reply)
+        if result is not None:
+            return dict(result, usage=usage)
+        messages = reply_format.repair_messages(messages, full_reply, error)
+        full_reply, more = await _acomplete_messages(messages, sales_options())
+        add_usage(usage, more)
+    result, _error = _parse_attempt(full_reply)
+    return dict(result or _fallback_reply(full_reply), usage=usage)
+
+
+async def acall_gpt(prompt) -> dict:
+    """
+    Асинхронная версия call_gpt: не занимает поток и не ждёт чужих запросов,
+    кроме ограничения GPT_MAX_CONCURRENCY.
+    """
+    full_reply, usage = await _acomplete(SYSTEM_PROMPT, prompt, sales_options())
+    return await aparse_reply(prompt, full_reply, usage)
+
+
+async def generate_assistant_prompt(client, assistant_question: str, context=None) -> Prompt:
+    """
+    Формирует prompt для GPT на вопрос ассистента по активному клиенту.
+    С context (ClientContext из context_cache) история не читается из БД.
+    """
+
+    client_name = client.name or f"ID {client.telegram_id}"
+
+    if context is not None:
+        summary_text, history = context.summary, context.history
+    else:
+        summary_text, history = await sync_to_async(get_conversation_context)(client)
+    history_lines = format_history(history)
+
+    return await sync_to_async(build_prompt)(
+        COLLEAGUE_INSTRUCTIONS,
+        query=assistant_question + "\n" + "\n".join(history_lines),
+        head=summary_head(f"Клиент по имени {client_name} ведет переписку.", summary_text),
+        history_title="История сообщений:",
+        history_lines=history_lines,
+        tail=f"Вопрос ассистента:\n\"{assistant_question}\"",
+    )
+
+
+def call_gpt_plain(prompt) -> str:
     """
     Отправляет prompt в GPT и возвращает просто текст без парсинга.
     """
-    response = client.chat.completions.create(
-        model="gpt-4o",
-        messages=[
-            {"role": "system", "content": "Ты — помощник по продажам. Отвечай коллеге по клиенту."},
-            {"role": "user", "content": prompt}
-        ],
-        temperature=0.7,
+    messages = _chat_messages(SYSTEM_PROMPT_PLAIN, prompt)
+    with get_scheduler().slot_sync(estimate_tokens(messages)) as job:
+        with metrics.span("gpt"):
+            response = client.chat.completions.create(
+                model=GPT_MODEL,
+                messages=messages,
+                temperature=0.7,
+            )
+        usage = usage_to_dict(response.usage)
+        job.used_tokens = used_tokens(usage)
+    log_usage(usage)
+    return response.choices[0].message.content.strip()
+
+
+async def acall_gpt_plain(prompt) -> str:
+    """
+    Асинхронная версия call_gpt_plain.
+    """
+    full_reply, _usage = await _acomplete(SYSTEM_PROMPT_PLAIN, prompt)
+    return full_reply.strip()
+
+
+def summarize_conversation(previous_summary: str, history_lines: list) -> str:
+    """
+    Дописывает резюме переписки новыми сообщениями (без пересчёта с нуля).
+    """
+    prompt = Prompt(
+        system=SUMMARY_INSTRUCTIONS,
+        user=f"Текущее резюме:\n{previous_summary or '—'}\n\nНовые сообщения:\n" + "\n".join(history_lines),
     )
+    messages = prompt.messages()
+    with get_scheduler().slot_sync(estimate_tokens(messages)) as job:
+        with metrics.span("gpt_summary"):
+            response = client.chat.completions.create(
+                model=GPT_SUMMARY_MODEL,
+                messages=messages,
+                temperature=0.3,
+            )
+        usage = usage_to_dict(response.usage)
+        job.used_tokens = used_tokens(usage)
+    log_usage(usage)
     return response.choices[0].message.content.strip()
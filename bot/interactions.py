@@ -0,0 +1,197 @@
+# bot/interactions.py
+
+"""
+Конвейер обработки пересланного сообщения клиента: сохранить сообщение,
+собрать prompt, получить ответ GPT, сохранить ответ, Interaction и SPIN-этап.
+
+Используется напрямую ботом (без HTTP-запроса к своему же серверу)
+и view /api/interaction/ для внешних вызовов.
+"""
+
+import time
+from contextlib import contextmanager
+
+from asgiref.sync import sync_to_async
+from django.db import transaction
+
+from . import context_cache, gpt_utils, metrics, response_cache
+from .db import run_write
+from .knowledge_cache import get_knowledge_version
+from .prompt_store import prompt_fields
+from .models import ActiveContext, Client, Message, Interaction, Stage
+from .summaries import schedule_summary_update
+
+
+@contextmanager
+def _timed(timings, stage: str):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        if timings is not None:
+            timings[stage] = timings.get(stage, 0.0) + time.perf_counter() - start
+
+
+async def get_client(telegram_id, name: str = None) -> Client:
+    """
+    Ищет клиента по telegram_id, если не найден — создаёт
+    (создание идёт через очередь записи db.run_write).
+    """
+    client = await Client.objects.filter(telegram_id=telegram_id).afirst()
+    if client is None:
+        client, _ = await run_write(
+            Client.objects.get_or_create,
+            telegram_id=telegram_id,
+            defaults={"name": name}
+        )
+    return client
+
+
+def persist_interaction(client, text: str, prompt=None, gpt_result: dict = None, assistant_id=None):
+    """
+    Одной транзакцией сохраняет сообщение клиента и, если GPT ответил,
+    ответ бота, Interaction и SPIN-этап. С assistant_id клиент становится
+    активным для ассистента (ActiveContext).
+
+    Вместо 6–8 отдельных автокоммитов — один коммит: сообщения одним
+    bulk_create, Stage и ActiveContext — INSERT ... ON CONFLICT DO UPDATE.
+    """
+    with metrics.span("db_write"), transaction.atomic():
+        messages = [Message(client=client, text=text, author="client")]
+        if gpt_result is not None:
+            messages.append(Message(client=client, text=gpt_result["reply"], author="bot"))
+        Message.objects.bulk_create(messages)
+        stage = gpt_result.get("stage") if gpt_result else None
+        transaction.on_commit(lambda: context_cache.record_forward(client, messages, stage, assistant_id))
+
+        if assistant_id is not None:
+            ActiveContext.objects.bulk_create(
+                [ActiveContext(assistant_telegram_id=str(assistant_id), client=client)],
+                update_conflicts=True,
+                unique_fields=["assistant_telegram_id"],
+                update_fields=["client", "updated_at"],
+            )
+
+        if gpt_result is None:
+            return
+
+        usage = gpt_result.get("usage") or {}
+        Interaction.objects.create(
+            client=client,
+            **prompt_fields(prompt),
+            gpt_response=gpt_result["reply"],
+            assistant_hint=gpt_result["assistant_hint"],
+            stage_detected=gpt_result["stage"],
+            prompt_tokens=usage.get("prompt_tokens"),
+            cached_tokens=usage.get("cached_tokens"),
+            completion_tokens=usage.get("completion_tokens"),
+        )
+        Stage.objects.bulk_create(
+            [Stage(client=client, stage=gpt_result["stage"])],
+            update_conflicts=True,
+            unique_fields=["client"],
+            update_fields=["stage", "updated_at"],
+        )
+
+        # Резюме длинной переписки обновляется в фоне, вне запроса
+        transaction.on_commit(lambda: schedule_summary_update(client.id))
+
+
+def _cached_or_prompt(client, text: str, context) -> tuple:
+    history = response_cache.history_fingerprint(context.summary, context.history)
+    key = response_cache.make_key(text, context.stage, get_knowledge_version(), history)
+    cached = response_cache.lookup(key, client)
+    if cached is not None:
+        return key, None, cached
+    with metrics.span("prompt"):
+        return key, gpt_utils.generate_prompt(client, text, context), None
+
+
+async def prepare_interaction(client, text: str, timings: dict = None, assistant_id=None) -> tuple:
+    """
+    Возвращает (ключ кэша ответов, prompt, ответ из кэша). Если на такой вопрос
+    на этом этапе уже отвечали (response_cache), prompt не собирается — None.
+    Само сообщение клиента сохраняется позже, вместе с ответом:
+    в prompt оно и так попадает отдельной строкой «Новое сообщение клиента».
+
+    Пересылки от бота (assistant_id задан) берут историю и этап из context_cache:
+    процесс бота сам записывает эти переписки, поэтому кэш у него актуален.
+    Внешние вызовы API могут идти в разные процессы и читают БД.
+    """
+    with _timed(timings, "prompt"):
+        with metrics.span("context"):
+            if assistant_id is not None:
+                context = await context_cache.aget_client_context(client)
+            else:
+                context = await sync_to_async(context_cache.read_client_context)(client)
+        return await sync_to_async(_cached_or_prompt)(client, text, context)
+
+
+async def run_interaction(client, text: str, timings: dict = None, assistant_id=None, on_reply=None) -> dict:
+    """
+    Полный ответ на сообщение клиента: {"reply", "assistant_hint", "stage", "usage"}.
+
+    on_reply(result) вызывается до записи в БД — бот успевает отправить ответ,
+    пока идёт коммит. Если GPT не ответил, сообщение клиента всё равно сохраняется.
+    В timings (если передан) складывается время каждого этапа, в секундах.
+    """
+    start = time.perf_counter()
+    key, prompt, gpt_result = await prepare_interaction(client, text, timings, assistant_id)
+
+    if gpt_result is None:
+        try:
+            with _timed(timings, "gpt"):
+                gpt_result = await gpt_utils.acall_gpt(prompt)
+        except Exception:
+            await run_write(persist_interaction, client, text, assistant_id=assistant_id)
+            raise
+        response_cache.store(key, gpt_result, client)
+    response_cache.record(key.stage, gpt_result.get("cached", False), time.perf_counter() - start)
+
+    if on_reply is not None:
+        await on_reply(gpt_result)
+
+    with _timed(timings, "save"):
+        await run_write(persist_interaction, client, text, prompt, gpt_result, assistant_id)
+    return gpt_result
+
+
+async def stream_interaction(client, text: str, timings: dict = None, assistant_id=None):
+    """
+    То же в потоковом режиме: события gpt_utils.ReplyStreamParser (delta / section)
+    по мере ответа GPT, затем {"type": "done", "result": {...}}.
+    Запись в БД идёт до "done": если клиент отвалится сразу после ответа,
+    взаимодействие всё равно сохранено.
+    Ответ из кэша приходит сразу целыми секциями.
+    """
+    start = time.perf_counter()
+    key, prompt, cached = await prepare_interaction(client, text, timings, assistant_id)
+
+    if cached is not None:
+        response_cache.record(key.stage, True, time.perf_counter() - start)
+        for section in ("reply", "assistant_hint"):
+            yield {"type": "section", "section": section, "text": cached[section]}
+        await run_write(persist_interaction, client, text, None, cached, assistant_id)
+        yield {"type": "done", "result": cached}
+        return
+
+    parser = gpt_utils.ReplyStreamParser()
+    usage = {}
+    try:
+        with _timed(timings, "gpt"):
+            async for delta in gpt_utils.astream_gpt(prompt, usage=usage):
+                for event in parser.feed(delta):
+                    yield event
+            for event in parser.close():
+                yield event
+            # Не разобрался — повторный запрос; "done" несёт итоговый текст, бот покажет его
+            gpt_result = await gpt_utils.aparse_reply(prompt, parser.text, usage)
+    except Exception:
+        await run_write(persist_interaction, client, text, assistant_id=assistant_id)
+        raise
+
+    response_cache.store(key, gpt_result, client)
+    response_cache.record(key.stage, False, time.perf_counter() - start)
+    with _timed(timings, "save"):
+        await run_write(persist_interaction, client, text, prompt, gpt_result, assistant_id)
+    yield {"type": "done", "result": gpt_result}
@@ -0,0 +1,112 @@
+# bot/knowledge_cache.py
+
+"""
+Кэш последнего KnowledgeBlock в памяти процесса.
+
+Внутри процесса кэш сбрасывается сигналами post_save/post_delete. Бот и
+Django-сервер — разные процессы, поэтому сигнал ещё и перезаписывает файл
+версии (KNOWLEDGE_VERSION_PATH): каждый процесс перед чтением делает stat()
+этого файла и перечитывает базу знаний из БД, только если файл изменился.
+
+Файл виден только процессам одного узла. На Postgres (несколько реплик
+на общей базе) версия берётся из самой БД — id и updated_at последнего
+KnowledgeBlock, не чаще раза в KNOWLEDGE_VERSION_DB_INTERVAL секунд.
+"""
+
+import hashlib
+import os
+import tempfile
+import threading
+import time
+from dataclasses import dataclass
+from pathlib import Path
+
+from django.conf import settings
+
+from .models import KnowledgeBlock
+
+
+KNOWLEDGE_VERSION_PATH = Path(os.getenv("KNOWLEDGE_VERSION_PATH", Path(settings.BASE_DIR) / "knowledge.version"))
+# file — файл версии (один узел), db — запрос к БД (реплики на общей базе)
+KNOWLEDGE_VERSION_SOURCE = os.getenv(
+    "KNOWLEDGE_VERSION_SOURCE", "db" if settings.DB_ENGINE == "postgres" else "file",
+)
+KNOWLEDGE_VERSION_DB_INTERVAL = float(os.getenv("KNOWLEDGE_VERSION_DB_INTERVAL", "2"))
+
+_lock = threading.Lock()
+_cache = {"stamp": None, "snapshot": None, "checked_at": 0.0}
+
+
+@dataclass(frozen=True)
+class KnowledgeSnapshot:
+    content: str
+    digest: str  # sha256 текста — версия базы знаний, одинаковая во всех процессах
+
+
+def _version_stamp():
+    """
+    Дешёвая проверка версии: inode + mtime файла версии (файл заменяется
+    через os.replace, поэтому inode меняется при каждом обновлении).
+    """
+    if KNOWLEDGE_VERSION_SOURCE == "db":
+        return _db_version_stamp()
+    try:
+        stat = os.stat(KNOWLEDGE_VERSION_PATH)
+    except FileNotFoundError:
+        bump_knowledge_version()
+        stat = os.stat(KNOWLEDGE_VERSION_PATH)
+    return stat.st_ino, stat.st_mtime_ns
+
+
+def _db_version_stamp():
+    now = time.monotonic()
+    with _lock:
+        if _cache["stamp"] is not None and now - _cache["checked_at"] < KNOWLEDGE_VERSION_DB_INTERVAL:
+            return _cache["stamp"]
+    latest = KnowledgeBlock.objects.order_by("-updated_at").values_list("pk", "updated_at").first()
+    with _lock:
+        _cache["checked_at"] = now
+    return "db", latest
+
+
+def bump_knowledge_version():
+    """
+    Сообщает всем процессам, что база знаний изменилась.
+    """
+    if KNOWLEDGE_VERSION_SOURCE == "db":
+        return  # версия — сама запись в БД
+    # У каждого процесса свой временный файл: общий .tmp два процесса перезаписали бы друг другу
+    fd, tmp_path = tempfile.mkstemp(dir=KNOWLEDGE_VERSION_PATH.parent, prefix=KNOWLEDGE_VERSION_PATH.name + ".")
+    try:
+        with os.fdopen(fd, "w") as f:
+            f.write(str(time.time_ns()))
+        os.replace(tmp_path, KNOWLEDGE_VERSION_PATH)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+def invalidate_knowledge_cache():
+    with _lock:
+        _cache["stamp"] = None
+        _cache["snapshot"] = None
+
+
+def get_knowledge_snapshot() -> KnowledgeSnapshot:
+    stamp = _version_stamp()
+    with _lock:
+        if _cache["snapshot"] is not None and _cache["stamp"] == stamp:
+            return _cache["snapshot"]
+
+    block = KnowledgeBlock.objects.order_by("-updated_at").first()
+    content = block.content if block else ""
+    snapshot = KnowledgeSnapshot(content, hashlib.sha256(content.encode()).hexdigest())
+
+    with _lock:
+        _cache["stamp"] = stamp
+        _cache["snapshot"] = snapshot
+    return snapshot
+
+
+def get_knowledge_version() -> str:
+    return get_knowledge_snapshot().digest
@@ -0,0 +1,191 @@
+# bot/knowledge_index.py
+
+"""
+BM25-индекс базы знаний: KnowledgeBlock режется на фрагменты, в prompt
+попадают только top-k фрагментов, релевантных сообщению клиента и истории.
+
+Индекс хранится рядом с БД (KNOWLEDGE_INDEX_PATH) и пересобирается
+сигналом при сохранении KnowledgeBlock. Каждый процесс держит загруженный
+индекс в памяти и перечитывает файл, когда меняется его mtime; индекс,
+построенный по другой версии базы знаний (digest), пересобирается.
+"""
+
+import os
+import re
+import tempfile
+import threading
+from pathlib import Path
+
+import numpy as np
+from django.conf import settings
+
+from .knowledge_cache import get_knowledge_snapshot
+
+
+KNOWLEDGE_MODE = os.getenv("KNOWLEDGE_MODE", "retrieval")  # retrieval | full
+KNOWLEDGE_TOP_K = int(os.getenv("KNOWLEDGE_TOP_K", "4"))
+KNOWLEDGE_CHUNK_CHARS = int(os.getenv("KNOWLEDGE_CHUNK_CHARS", "800"))
+KNOWLEDGE_INDEX_PATH = Path(os.getenv("KNOWLEDGE_INDEX_PATH", Path(settings.BASE_DIR) / "knowledge_index.npz"))
+
+BM25_K1 = 1.5
+BM25_B = 0.75
+# Грубый стемминг: в русском окончания сильно меняют слово («курс», «курса», «курсе»)
+STEM_LENGTH = 6
+ENDINGS = sorted((
+    "ами ями ого его ому ему ыми ими ах ях ов ев ей ой ый ий ая яя ое ее ые ие "
+    "ом ем ам ям ую юю а я о е ы и у ю ь й"
+).split(), key=len, reverse=True)
+
+_lock = threading.Lock()
+_loaded = {"mtime": None, "index": None}
+
+
+def stem(word: str) -> str:
+    for ending in ENDINGS:
+        if word.endswith(ending) and len(word) - len(ending) >= 3:
+            word = word[:-len(ending)]
+            break
+    return word[:STEM_LENGTH]
+
+
+def tokenize(text: str) -> list:
+    return [stem(word) for word in re.findall(r"\w+", text.lower()) if len(word) > 1]
+
+
+def chunk_text(content: str, max_chars: int = None) -> list:
+    """
+    Делит текст базы знаний на фрагменты по абзацам, склеивая короткие
+    абзацы, пока фрагмент не превысит max_chars.
+    """
+    max_chars = max_chars or KNOWLEDGE_CHUNK_CHARS
+    paragraphs = [p.strip() for p in re.split(r"\n\s*\n", content) if p.strip()]
+
+    chunks, current = [], ""
+    for paragraph in paragraphs:
+        if current and len(current) + len(paragraph) + 2 > max_chars:
+            chunks.append(current)
+            current = ""
+        current = f"{current}\n\n{paragraph}" if current else paragraph
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+class KnowledgeIndex:
+    def __init__(self, chunks, vocabulary, term_freqs, idf, digest=""):
+        self.digest = digest
+        self.chunks = list(chunks)
+        self.vocabulary = {term: i for i, term in enumerate(vocabulary)}
+        self.term_freqs = term_freqs
+        self.idf = idf
+        lengths = term_freqs.sum(axis=1)
+        avg_length = lengths.mean() if len(lengths) else 1.0
+        self.length_norm = BM25_K1 * (1 - BM25_B + BM25_B * lengths / max(avg_length, 1.0))
+
+    @classmethod
+    def build(cls, content: str, digest: str = "") -> "KnowledgeIndex":
+        chunks = chunk_text(content)
+        tokenized = [tokenize(chunk) for chunk in chunks]
+        vocabulary = sorted({term for tokens in tokenized for term in tokens})
+        positions = {term: i for i, term in enumerate(vocabulary)}
+
+        term_freqs = np.zeros((len(chunks), len(vocabulary)), dtype=np.float32)
+        for row, tokens in enumerate(tokenized):
+            for term in tokens:
+                term_freqs[row, positions[term]] += 1
+
+        doc_freq = (term_freqs > 0).sum(axis=0)
+        idf = np.log(1 + (len(chunks) - doc_freq + 0.5) / (doc_freq + 0.5)).astype(np.float32)
+        return cls(chunks, vocabulary, term_freqs, idf, digest)
+
+    def save(self, path: Path):
+        path = Path(path)
+        vocabulary = sorted(self.vocabulary, key=self.vocabulary.get)
+        # Свой временный файл у каждого процесса: индекс могут пересобирать API и бот одновременно
+        fd, tmp_path = tempfile.mkstemp(dir=path.parent, prefix=path.name + ".", suffix=".npz")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                np.savez(
+                    f,
+                    chunks=np.array(self.chunks, dtype=str),
+                    vocabulary=np.array(vocabulary, dtype=str),
+                    term_freqs=self.term_freqs,
+                    idf=self.idf,
+                    digest=np.array(self.digest),
+                )
+            os.replace(tmp_path, path)  # атомарно для процесса бота, читающего файл
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+
+    @classmethod
+    def load(cls, path: Path) -> "KnowledgeIndex":
+        with np.load(path, allow_pickle=False) as data:
+            return cls(
+                data["chunks"].tolist(), data["vocabulary"].tolist(),
+                data["term_freqs"], data["idf"], str(data["digest"]),
+            )
+
+    def scores(self, query: str) -> np.ndarray:
+        columns = [self.vocabulary[t] for t in set(tokenize(query)) if t in self.vocabulary]
+        if not columns or not self.chunks:
+            return np.zeros(len(self.chunks), dtype=np.float32)
+        tf = self.term_freqs[:, columns]
+        weights = tf * (BM25_K1 + 1) / (tf + self.length_norm[:, None])
+        return weights @ self.idf[columns]
+
+    def search(self, query: str, top_k: int = None) -> list:
+        """
+        Возвращает top-k релевантных фрагментов в порядке следования в базе знаний.
+        """
+        top_k = top_k or KNOWLEDGE_TOP_K
+        if len(self.chunks) <= top_k:
+            return list(self.chunks)
+        scores = self.scores(query)
+        best = np.argsort(-scores, kind="stable")[:top_k]
+        return [self.chunks[i] for i in sorted(best) if scores[i] > 0] or self.chunks[:top_k]
+
+
+def rebuild_knowledge_index() -> KnowledgeIndex:
+    """
+    Пересобирает индекс из последнего KnowledgeBlock и сохраняет его на диск.
+    """
+    snapshot = get_knowledge_snapshot()
+    index = KnowledgeIndex.build(snapshot.content, snapshot.digest)
+    with _lock:
+        index.save(KNOWLEDGE_INDEX_PATH)
+        _loaded["mtime"] = os.stat(KNOWLEDGE_INDEX_PATH).st_mtime_ns
+        _loaded["index"] = index
+    return index
+
+
+def get_knowledge_index() -> KnowledgeIndex:
+    """
+    Индекс из памяти процесса; перечитывается с диска, если файл обновил
+    другой процесс, и строится заново, если файла ещё нет.
+    """
+    try:
+        mtime = os.stat(KNOWLEDGE_INDEX_PATH).st_mtime_ns
+    except FileNotFoundError:
+        return rebuild_knowledge_index()
+
+    with _lock:
+        if _loaded["mtime"] != mtime:
+            _loaded["index"] = KnowledgeIndex.load(KNOWLEDGE_INDEX_PATH)
+            _loaded["mtime"] = mtime
+        index = _loaded["index"]
+
+    if index.digest != get_knowledge_snapshot().digest:
+        return rebuild_knowledge_index()
+    return index
+
+
+def get_relevant_knowledge(query: str, top_k: int = None) -> str:
+    """
+    Текст базы знаний для prompt: top-k фрагментов по запросу
+    (или весь KnowledgeBlock при KNOWLEDGE_MODE=full).
+    """
+    if KNOWLEDGE_MODE == "full":
+        return get_knowledge_snapshot().content
+
+    return "\n\n".join(get_knowledge_index().search(query, top_k))
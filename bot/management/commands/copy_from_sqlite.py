@@ -0,0 +1,130 @@
+# bot/management/commands/copy_from_sqlite.py
+
+"""
+Переносит данные бота из файла SQLite в текущую базу (обычно PostgreSQL):
+
+    DB_ENGINE=postgres python manage.py migrate
+    DB_ENGINE=postgres python manage.py copy_from_sqlite --source db.sqlite3
+
+Таблицы читаются порциями по первичному ключу (WHERE id > последний ORDER BY id
+LIMIT chunk), каждая порция пишется одним bulk_create в своей транзакции,
+поэтому память не зависит от размера таблиц. Первичные ключи сохраняются,
+после копирования последовательности PostgreSQL сдвигаются за максимальный id.
+С --resume копирование продолжается с последнего перенесённого id.
+"""
+
+from contextlib import contextmanager
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.core.management.color import no_style
+from django.db import connections, transaction
+
+from bot.knowledge_cache import bump_knowledge_version, invalidate_knowledge_cache
+from bot.models import (
+    ActiveContext, Assistant, Client, ClientSummary, Interaction,
+    KnowledgeBlock, Message, PromptBlock, Stage,
+)
+
+
+SOURCE_ALIAS = "sqlite_source"
+# Родительские таблицы раньше зависимых
+MODELS = [Client, Assistant, KnowledgeBlock, PromptBlock, Stage, Message, Interaction, ActiveContext, ClientSummary]
+
+
+def add_source_database(path, alias: str = SOURCE_ALIAS) -> str:
+    """
+    Регистрирует файл SQLite как дополнительную базу alias.
+    """
+    config = {"ENGINE": "django.db.backends.sqlite3", "NAME": str(path)}
+    connections.settings[alias] = connections.configure_settings({**settings.DATABASES, alias: config})[alias]
+    return alias
+
+
+@contextmanager
+def keep_timestamps(model):
+    """
+    Отключает auto_now/auto_now_add, иначе bulk_create перезапишет
+    created_at/updated_at текущим временем.
+    """
+    fields = [f for f in model._meta.concrete_fields if getattr(f, "auto_now", False) or getattr(f, "auto_now_add", False)]
+    saved = [(f, f.auto_now, f.auto_now_add) for f in fields]
+    for field in fields:
+        field.auto_now = field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field, auto_now, auto_now_add in saved:
+            field.auto_now, field.auto_now_add = auto_now, auto_now_add
+
+
+def copy_model(model, source: str, target: str, chunk_size: int, resume: bool = False) -> int:
+    """
+    Копирует таблицу model из source в target порциями по chunk_size строк.
+    Возвращает число скопированных строк.
+    """
+    target_rows = model.objects.using(target)
+    last_pk = 0
+    if resume:
+        last_pk = target_rows.order_by("-pk").values_list("pk", flat=True).first() or 0
+    elif target_rows.exists():
+        raise CommandError(
+            f"{model._meta.label}: в целевой базе уже есть данные (для продолжения — --resume)"
+        )
+
+    copied = 0
+    with keep_timestamps(model):
+        while True:
+            chunk = list(model.objects.using(source).filter(pk__gt=last_pk).order_by("pk")[:chunk_size])
+            if not chunk:
+                break
+            with transaction.atomic(using=target):
+                target_rows.bulk_create(chunk)
+            copied += len(chunk)
+            last_pk = chunk[-1].pk
+    return copied
+
+
+def reset_sequences(models, target: str):
+    connection = connections[target]
+    statements = connection.ops.sequence_reset_sql(no_style(), models)
+    if statements:
+        with connection.cursor() as cursor:
+            for sql in statements:
+                cursor.execute(sql)
+
+
+class Command(BaseCommand):
+    help = "Переносит данные бота из файла SQLite в текущую базу порциями"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--source", default=str(Path(settings.BASE_DIR) / "db.sqlite3"),
+                            help="путь к исходному файлу SQLite")
+        parser.add_argument("--database", default="default", help="целевая база (alias)")
+        parser.add_argument("--chunk-size", type=int, default=2000)
+        parser.add_argument("--resume", action="store_true", help="продолжить с последнего перенесённого id")
+
+    def handle(self, *args, **options):
+        source_path = Path(options["source"])
+        if not source_path.exists():
+            raise CommandError(f"Файл {source_path} не найден")
+
+        target = options["database"]
+        if str(connections[target].settings_dict["NAME"]) == str(source_path):
+            raise CommandError("Исходная и целевая база совпадают")
+
+        source = add_source_database(source_path)
+        try:
+            for model in MODELS:
+                copied = copy_model(model, source, target, options["chunk_size"], options["resume"])
+                self.stdout.write(f"{model._meta.label}: {copied}")
+            reset_sequences(MODELS, target)
+        finally:
+            connections[source].close()
+            del connections[source]
+
+        # bulk_create не шлёт сигналы — процессы бота перечитают базу знаний по версии
+        invalidate_knowledge_cache()
+        bump_knowledge_version()
+        self.stdout.write(self.style.SUCCESS("Готово"))
@@ -0,0 +1,335 @@
+# bot/management/commands/replay_interactions.py
+
+"""
+Прогоняет записанные переписки через весь конвейер ответа — без сети:
+
+    cp db.sqlite3 replay.sqlite3
+    SQLITE_PATH=replay.sqlite3 python manage.py replay_interactions --in-place --concurrency 20 --rate 50
+    SQLITE_PATH=replay.sqlite3 python manage.py replay_interactions --in-place --source backup.sqlite3
+    SQLITE_PATH=replay.sqlite3 python manage.py replay_interactions --in-place --export replay.jsonl --gpt-latency 0.8
+    python manage.py replay_interactions --dump replay.jsonl   # только выгрузить
+    python manage.py replay_interactions --cleanup             # удалить оставленное --keep
+
+Шаги пишутся в текущую базу (клиенты, сообщения, Interaction), поэтому без
+--in-place команда ничего не воспроизводит: запускайте её на копии базы
+(SQLITE_PATH или отдельная база Postgres), а не на рабочей.
+
+Каждая записанная Interaction и сообщение клиента перед ней превращаются
+в шаг: interactions.run_interaction → generate_prompt → GPT → запись в БД.
+Вместо GPT отвечает записанный ответ (через --gpt-latency секунд, со слотом
+очереди gpt_utils.get_scheduler), резюме переписки — заглушка. Кэш ответов
+и контекста работают как в бою.
+
+Клиенты воспроизводятся заново, с telegram_id «replay-…»: история у них
+копится по ходу прогона в исходном порядке. Шаги одного клиента идут
+по очереди, разные клиенты — параллельно (не больше --concurrency),
+новые шаги стартуют не чаще --rate в секунду. После отчёта клиенты
+replay-… удаляются вместе с сообщениями (--keep — оставить).
+
+Отчёт: пропускная способность, p50/p95/p99 шага, время этапов, токены
+prompt (собранного сейчас и записанного тогда) и запросы к БД на шаг.
+"""
+
+import asyncio
+import contextvars
+import json
+import statistics
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from unittest.mock import patch
+
+from asgiref.sync import async_to_sync
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.db.backends.signals import connection_created
+
+from bot import context_cache, gpt_utils, interactions, summaries
+from bot.management.commands.copy_from_sqlite import add_source_database
+from bot.models import Client, Interaction, Message
+from bot.tokens import count_tokens
+
+
+REPLAY_PREFIX = "replay-"
+
+_recorded = contextvars.ContextVar("recorded_step")
+
+
+def load_from_database(using: str = "default", limit: int = None) -> list:
+    """
+    Шаги из БД: Interaction и последнее сообщение клиента, сохранённое до неё
+    (persist_interaction пишет их одной транзакцией), в порядке записи.
+    """
+    recorded = Interaction.objects.using(using).select_related("client").order_by("created_at", "id")
+    if limit:
+        recorded = recorded[:limit]
+
+    messages = {}
+    for message in Message.objects.using(using).filter(author="client").order_by("created_at", "id"):
+        messages.setdefault(message.client_id, []).append(message)
+
+    items = []
+    taken = {}  # client_id -> сколько сообщений клиента уже просмотрено
+    for interaction in recorded:
+        client_messages = messages.get(interaction.client_id, [])
+        start = position = taken.get(interaction.client_id, 0)
+        while position < len(client_messages) and client_messages[position].created_at <= interaction.created_at:
+            position += 1
+        taken[interaction.client_id] = position
+        if position == start:
+            continue  # сообщение клиента не сохранилось или уже ушло в прошлый шаг
+        message = client_messages[position - 1]
+        items.append({
+            "telegram_id": interaction.client.telegram_id,
+            "name": interaction.client.name,
+            "text": message.text,
+            "reply": interaction.gpt_response,
+            "assistant_hint": interaction.assistant_hint,
+            "stage": interaction.stage_detected,
+            "prompt_tokens": interaction.prompt_tokens,
+            "completion_tokens": interaction.completion_tokens,
+        })
+    return items
+
+
+def load_from_export(path: Path, limit: int = None) -> list:
+    """
+    Шаги из JSONL, строка — как у load_from_database (ключи reply/stage обязательны).
+    """
+    items = [json.loads(line) for line in path.read_text(encoding="utf-8").splitlines() if line.strip()]
+    return items[:limit] if limit else items
+
+
+class QueryCounter:
+    """
+    Считает SQL-запросы во всех соединениях процесса, в том числе
+    в потоке записи db.run_write и потоках sync_to_async.
+    """
+
+    def __init__(self):
+        self.counts = {}
+        self._lock = threading.Lock()
+
+    def __call__(self, execute, sql, params, many, context):
+        kind = sql.lstrip().split(None, 1)[0].upper() if sql.strip() else "?"
+        with self._lock:
+            self.counts[kind] = self.counts.get(kind, 0) + 1
+        return execute(sql, params, many, context)
+
+    def install(self, connection, **kwargs):
+        if self not in connection.execute_wrappers:
+            connection.execute_wrappers.append(self)
+
+    @contextmanager
+    def counting(self):
+        for connection in connections.all():
+            self.install(connection)
+        connection_created.connect(self.install)
+        try:
+            yield self
+        finally:
+            connection_created.disconnect(self.install)
+            for connection in connections.all():
+                if self in connection.execute_wrappers:
+                    connection.execute_wrappers.remove(self)
+
+    @property
+    def total(self) -> int:
+        return sum(self.counts.values())
+
+
+def _prompt_tokens(prompt) -> int:
+    return count_tokens("".join(m["content"] for m in gpt_utils._chat_messages(gpt_utils.SYSTEM_PROMPT, prompt)))
+
+
+class Replay:
+    def __init__(self, items: list, concurrency: int, rate: float, gpt_latency: float):
+        self.items = items
+        self.concurrency = concurrency
+        self.rate = rate
+        self.gpt_latency = gpt_latency
+        self.latencies = []
+        self.timings = {}
+        self.prompt_tokens = []
+        self.errors = 0
+        self.cached = 0
+
+    async def recorded_gpt(self, prompt) -> dict:
+        """
+        Записанный ответ текущего шага вместо acall_gpt; токены prompt — по собранному сейчас.
+        """
+        item = _recorded.get()
+        messages = gpt_utils._chat_messages(gpt_utils.SYSTEM_PROMPT, prompt)
+        async with gpt_utils.get_scheduler().slot(gpt_utils.estimate_tokens(messages)):
+            if self.gpt_latency:
+                await asyncio.sleep(self.gpt_latency)
+        tokens = _prompt_tokens(prompt)
+        self.prompt_tokens.append(tokens)
+        return {
+            "reply": item["reply"],
+            "assistant_hint": item.get("assistant_hint") or "",
+            "stage": item["stage"],
+            "usage": {
+                "prompt_tokens": tokens,
+                "cached_tokens": 0,
+                "completion_tokens": item.get("completion_tokens") or count_tokens(item["reply"]),
+            },
+        }
+
+    async def _step(self, client, item: dict, semaphore: asyncio.Semaphore):
+        async with semaphore:
+            _recorded.set(item)
+            timings = {}
+            start = time.perf_counter()
+            try:
+                result = await interactions.run_interaction(client, item["text"], timings)
+            except Exception as e:
+                self.errors += 1
+                print("Ошибка шага:", e)
+                return
+            self.latencies.append(time.perf_counter() - start)
+            self.cached += bool(result.get("cached"))
+            for stage, seconds in timings.items():
+                self.timings.setdefault(stage, []).append(seconds)
+
+    async def run(self) -> float:
+        """
+        Прогоняет все шаги, возвращает время прогона в секундах.
+        """
+        semaphore = asyncio.Semaphore(self.concurrency)
+        chains = {}
+        for index, item in enumerate(self.items):
+            chains.setdefault(item["telegram_id"], []).append((index, item))
+
+        start = time.perf_counter()
+
+        async def run_chain(telegram_id, steps):
+            client = await interactions.get_client(REPLAY_PREFIX + str(telegram_id), steps[0][1].get("name"))
+            for index, item in steps:
+                if self.rate:
+                    await asyncio.sleep(max(start + index / self.rate - time.perf_counter(), 0))
+                await self._step(client, item, semaphore)
+
+        await asyncio.gather(*(run_chain(telegram_id, steps) for telegram_id, steps in chains.items()))
+        return time.perf_counter() - start
+
+
+def _stub_summary(previous_summary: str, history_lines: list) -> str:
+    return (previous_summary + "\n" if previous_summary else "") + f"[{len(history_lines)} сообщений]"
+
+
+def percentile(values: list, p: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, round(p / 100 * (len(ordered) - 1)))]
+
+
+def cleanup():
+    """
+    Удаляет клиентов replay-… (каскадом — сообщения, Interaction, этапы).
+    """
+    # Резюме пишутся в фоне: ждём очередь, иначе поток запишет удалённого клиента
+    summaries._executor.submit(lambda: None).result()
+    ids = list(Client.objects.filter(telegram_id__startswith=REPLAY_PREFIX).values_list("id", flat=True))
+    Client.objects.filter(id__in=ids).delete()
+    for client_id in ids:
+        context_cache.forget_client(client_id)
+    return len(ids)
+
+
+class Command(BaseCommand):
+    help = "Воспроизводит записанные переписки через конвейер ответа с записанными ответами GPT"
+
+    def add_arguments(self, parser):
+        source = parser.add_mutually_exclusive_group()
+        source.add_argument("--source", help="файл SQLite, из которого брать переписки (по умолчанию — текущая база)")
+        source.add_argument("--export", help="JSONL с шагами (см. --dump)")
+        parser.add_argument("--dump", help="только выгрузить шаги в JSONL")
+        parser.add_argument("--limit", type=int, default=None, help="не больше N шагов")
+        parser.add_argument("--concurrency", type=int, default=10, help="шагов одновременно")
+        parser.add_argument("--rate", type=float, default=0, help="новых шагов в секунду (0 — без ограничения)")
+        parser.add_argument("--gpt-latency", type=float, default=0, help="задержка записанного ответа GPT, с")
+        parser.add_argument("--keep", action="store_true", help="не удалять клиентов replay-… после прогона")
+        parser.add_argument("--cleanup", action="store_true", help="только удалить клиентов replay-…")
+        parser.add_argument(
+            "--in-place", action="store_true",
+            help="писать шаги в текущую базу — подтверждение, что это копия, а не рабочая база",
+        )
+
+    def handle(self, *args, **options):
+        if options["cleanup"]:
+            self.stdout.write(f"Удалено клиентов {REPLAY_PREFIX}…: {cleanup()}")
+            return
+        items = self.load(options)
+        if options["dump"]:
+            with open(options["dump"], "w", encoding="utf-8") as f:
+                for item in items:
+                    f.write(json.dumps(item, ensure_ascii=False) + "\n")
+            self.stdout.write(f"Выгружено шагов: {len(items)}")
+            return
+        if not items:
+            raise CommandError("Нет записанных переписок для воспроизведения")
+        if not options["in_place"]:
+            raise CommandError(
+                "Прогон пишет клиентов, сообщения и Interaction в текущую базу "
+                f"({connections['default'].settings_dict['NAME']}). Запустите его на копии "
+                "(SQLITE_PATH=replay.sqlite3, --source — рабочая база) с флагом --in-place"
+            )
+        if Client.objects.filter(telegram_id__startswith=REPLAY_PREFIX).exists():
+            raise CommandError(f"В базе остались клиенты {REPLAY_PREFIX}… от прошлого прогона (--cleanup)")
+
+        replay = Replay(items, options["concurrency"], options["rate"], options["gpt_latency"])
+        counter = QueryCounter()
+        try:
+            with counter.counting(), \
+                    patch.object(gpt_utils, "acall_gpt", replay.recorded_gpt), \
+                    patch.object(gpt_utils, "summarize_conversation", _stub_summary):
+                elapsed = async_to_sync(replay.run)()
+            self.report(replay, counter, elapsed)
+        finally:
+            if not options["keep"]:
+                self.stdout.write(f"Удалено клиентов {REPLAY_PREFIX}…: {cleanup()}")
+
+    def load(self, options) -> list:
+        if options["export"]:
+            return load_from_export(Path(options["export"]), options["limit"])
+        if not options["source"]:
+            return load_from_database(limit=options["limit"])
+        source_path = Path(options["source"])
+        if not source_path.exists():
+            raise CommandError(f"Файл {source_path} не найден")
+        alias = add_source_database(source_path)
+        try:
+            return load_from_database(alias, options["limit"])
+        finally:
+            connections[alias].close()
+            del connections[alias]
+
+    def report(self, replay: Replay, counter: QueryCounter, elapsed: float):
+        done = len(replay.latencies)
+        self.stdout.write(
+            f"шагов: {done} из {len(replay.items)}, ошибок: {replay.errors}, из кэша ответов: {replay.cached}, "
+            f"конкурентность: {replay.concurrency}, задержка GPT: {replay.gpt_latency}s"
+        )
+        if not done:
+            return
+        self.stdout.write(f"пропускная способность: {done / elapsed:.1f} шагов/с за {elapsed:.2f}s")
+        self.stdout.write(
+            "латентность шага: " + " ".join(
+                f"p{p}={percentile(replay.latencies, p) * 1000:.1f}ms" for p in (50, 95, 99)
+            ) + f" mean={statistics.mean(replay.latencies) * 1000:.1f}ms"
+        )
+        self.stdout.write("этапы (mean): " + " ".join(
+            f"{stage}={statistics.mean(values) * 1000:.1f}ms" for stage, values in replay.timings.items()
+        ))
+        if replay.prompt_tokens:
+            recorded = [item["prompt_tokens"] for item in replay.items if item.get("prompt_tokens")]
+            line = (
+                f"токены prompt: mean={statistics.mean(replay.prompt_tokens):.0f} "
+                f"p95={percentile(replay.prompt_tokens, 95)} max={max(replay.prompt_tokens)}"
+            )
+            if recorded:
+                line += f" (записанные: mean={statistics.mean(recorded):.0f})"
+            self.stdout.write(line)
+        kinds = " ".join(f"{kind}={count}" for kind, count in sorted(counter.counts.items()))
+        self.stdout.write(f"запросов к БД: {counter.total} ({counter.total / done:.1f} на шаг; {kinds})")
@@ -15,3 +15,9 @@ message_start = f"""
 • перешли его сообщение,
 • или ответь на ранее пересланное сообщение от него прямо здесь — я всё пойму.
 """
+
+
+message_queue_busy = (
+    "⏳ Сейчас много запросов к GPT (в очереди: {waiting}).\n"
+    "Ответ придёт чуть позже — повторно пересылать не нужно."
+)
@@ -0,0 +1,240 @@
+# bot/metrics.py
+
+"""
+Время этапов обработки сообщений и токены GPT — гистограммы в памяти
+процесса. Отдаются в текстовом формате Prometheus на /metrics
+(api.views.metrics_view).
+
+Этап замеряется span("имя"): allow_list, context, history, prompt,
+gpt_queue, gpt, parse, db_write, telegram_send. Этапы бывают вложены
+(history — внутри context, если контекста нет в кэше). Если в контексте открыт
+trace (handle_message бота, запрос к /api/interaction/), этапы копятся
+и в нём, а по окончании печатается одна строка с trace ID, этапами и
+токенами. Trace ID уходит в API заголовком X-Trace-Id — строки бота
+и API по одной пересылке находятся по одному ID.
+
+Метрики у каждого процесса свои: при SERVER_WORKERS > 1 Prometheus
+видит тот воркер, который ответил на запрос.
+"""
+
+import contextvars
+import functools
+import os
+import re
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Optional
+
+
+# Строка в stdout на каждый trace — для отладки: на потоке апдейтов это лишний синхронный вывод
+METRICS_TRACE_LOG = os.getenv("METRICS_TRACE_LOG", "0") == "1"
+TRACE_HEADER = "X-Trace-Id"
+
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+TOKEN_KINDS = ("prompt_tokens", "cached_tokens", "completion_tokens")
+
+_lock = threading.Lock()
+_stages = {}                                    # этап -> Histogram
+_tokens = {kind: 0 for kind in TOKEN_KINDS}
+_counters = {}                                  # (имя, метки) -> значение
+_gauges = {}                                    # (имя, метки) -> значение
+_trace = contextvars.ContextVar("trace", default=None)
+
+
+@dataclass
+class Histogram:
+    counts: list = field(default_factory=lambda: [0] * len(BUCKETS))
+    total: float = 0.0
+    count: int = 0
+
+    def observe(self, value: float):
+        for i, bound in enumerate(BUCKETS):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+        self.total += value
+        self.count += 1
+
+
+@dataclass
+class Trace:
+    trace_id: str
+    spans: list = field(default_factory=list)  # (этап, секунды) в порядке завершения
+    tokens: dict = field(default_factory=dict)
+    started: float = field(default_factory=time.perf_counter)
+
+    def summary(self) -> str:
+        stages = {}
+        for stage, seconds in self.spans:
+            stages[stage] = stages.get(stage, 0.0) + seconds
+        parts = [f"{stage}={seconds * 1000:.1f}ms" for stage, seconds in stages.items()]
+        if self.tokens:
+            parts.append("tokens=" + "/".join(str(self.tokens.get(kind, 0)) for kind in TOKEN_KINDS))
+        parts.append(f"total={(time.perf_counter() - self.started) * 1000:.1f}ms")
+        return f"trace={self.trace_id} " + " ".join(parts)
+
+
+def clear_metrics():
+    with _lock:
+        _stages.clear()
+        _counters.clear()
+        _gauges.clear()
+        for kind in TOKEN_KINDS:
+            _tokens[kind] = 0
+
+
+def new_trace_id() -> str:
+    return uuid.uuid4().hex[:16]
+
+
+def trace_id_from(header: Optional[str]) -> str:
+    """
+    ID из заголовка X-Trace-Id, если он похож на ID (он попадает в лог), иначе новый.
+    """
+    if header and re.fullmatch(r"[\w-]{1,64}", header):
+        return header
+    return new_trace_id()
+
+
+def current_trace_id() -> Optional[str]:
+    trace = _trace.get()
+    return trace.trace_id if trace is not None else None
+
+
+@contextmanager
+def trace(trace_id: str = None):
+    """
+    Открывает trace на время блока (ID — переданный, например из заголовка, или новый).
+    Вложенный trace с тем же контекстом не открывается — этапы идут во внешний.
+    """
+    if _trace.get() is not None:
+        yield _trace.get()
+        return
+    current = Trace(trace_id or new_trace_id())
+    token = _trace.set(current)
+    try:
+        yield current
+    finally:
+        try:
+            _trace.reset(token)
+        except ValueError:
+            pass  # потоковый ответ закрыли из другого контекста — контекст и так уже не наш
+        if METRICS_TRACE_LOG:
+            print(current.summary())
+
+
+def traced(handler):
+    """
+    Декоратор async-обработчика: каждый вызов — в своём trace.
+    """
+    @functools.wraps(handler)
+    async def wrapper(*args, **kwargs):
+        with trace():
+            return await handler(*args, **kwargs)
+    return wrapper
+
+
+def observe(stage: str, seconds: float):
+    with _lock:
+        histogram = _stages.get(stage)
+        if histogram is None:
+            histogram = _stages[stage] = Histogram()
+        histogram.observe(seconds)
+    current = _trace.get()
+    if current is not None:
+        current.spans.append((stage, seconds))
+
+
+@contextmanager
+def span(stage: str):
+    """
+    with span("gpt"): ... — время блока в гистограмму этапа и в текущий trace.
+    Работает и вокруг await, и в потоках sync_to_async (контекст копируется).
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(stage, time.perf_counter() - start)
+
+
+def record_usage(usage: dict):
+    """
+    Токены ответа OpenAI (gpt_utils.usage_to_dict) — в счётчики и текущий trace.
+    """
+    if not usage:
+        return
+    with _lock:
+        for kind in TOKEN_KINDS:
+            _tokens[kind] += usage.get(kind) or 0
+    current = _trace.get()
+    if current is not None:
+        for kind in TOKEN_KINDS:
+            current.tokens[kind] = current.tokens.get(kind, 0) + (usage.get(kind) or 0)
+
+
+def count(name: str, amount: float = 1, **labels):
+    """
+    Счётчик событий, например count("gpt_replies_total", outcome="repaired").
+    """
+    key = (name, tuple(sorted(labels.items())))
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + amount
+
+
+def counter_value(name: str, **labels) -> float:
+    with _lock:
+        return _counters.get((name, tuple(sorted(labels.items()))), 0)
+
+
+def set_gauge(name: str, value: float, **labels):
+    with _lock:
+        _gauges[(name, tuple(sorted(labels.items())))] = value
+
+
+def _labels(**labels) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{v}"' for k, v in labels.items()) + "}"
+
+
+def _number(value: float) -> str:
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def render() -> str:
+    """
+    Все метрики процесса в текстовом формате Prometheus.
+    """
+    lines = [
+        "# HELP bot_stage_seconds Время этапа обработки сообщения.",
+        "# TYPE bot_stage_seconds histogram",
+    ]
+    with _lock:
+        for stage, histogram in sorted(_stages.items()):
+            cumulative = 0
+            for bound, count in zip(BUCKETS, histogram.counts):
+                cumulative += count
+                lines.append(f"bot_stage_seconds_bucket{_labels(stage=stage, le=bound)} {cumulative}")
+            lines.append(f"bot_stage_seconds_bucket{_labels(stage=stage, le='+Inf')} {histogram.count}")
+            lines.append(f"bot_stage_seconds_sum{_labels(stage=stage)} {_number(histogram.total)}")
+            lines.append(f"bot_stage_seconds_count{_labels(stage=stage)} {histogram.count}")
+
+        lines += [
+            "# HELP gpt_tokens_total Токены запросов к OpenAI.",
+            "# TYPE gpt_tokens_total counter",
+        ]
+        for kind in TOKEN_KINDS:
+            lines.append(f"gpt_tokens_total{_labels(kind=kind.removesuffix('_tokens'))} {_tokens[kind]}")
+
+        for kind, values in (("counter", _counters), ("gauge", _gauges)):
+            names = []
+            for (name, labels), value in sorted(values.items()):
+                if name not in names:
+                    names.append(name)
+                    lines.append(f"# TYPE {name} {kind}")
+                lines.append(f"{name}{_labels(**dict(labels))} {_number(value)}")
+    return "\n".join(lines) + "\n"
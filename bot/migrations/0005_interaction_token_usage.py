@@ -0,0 +1,28 @@
+# Generated by Django 4.2 on 2026-10-18 10:52
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("bot", "0004_activecontext"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="interaction",
+            name="cached_tokens",
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="interaction",
+            name="completion_tokens",
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="interaction",
+            name="prompt_tokens",
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 4.2 on 2026-10-18 10:53
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("bot", "0005_interaction_token_usage"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="message",
+            index=models.Index(
+                fields=["client", "created_at"], name="message_client_created_idx"
+            ),
+        ),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 4.2 on 2026-10-18 10:55
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("bot", "0006_message_client_created_idx"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ClientSummary",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("text", models.TextField(blank=True, default="")),
+                ("last_message_id", models.BigIntegerField(default=0)),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+                (
+                    "client",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="summary",
+                        to="bot.client",
+                    ),
+                ),
+            ],
+        ),
+    ]
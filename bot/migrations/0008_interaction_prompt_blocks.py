@@ -0,0 +1,63 @@
+# Generated by Django 4.2 on 2026-10-18 11:12
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("bot", "0007_clientsummary"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="PromptBlock",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("digest", models.CharField(max_length=64, unique=True)),
+                ("text", models.TextField()),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name="interaction",
+            name="prompt_user",
+            field=models.TextField(blank=True, default=""),
+        ),
+        migrations.AlterField(
+            model_name="interaction",
+            name="prompt",
+            field=models.TextField(blank=True, default=""),
+        ),
+        migrations.AddField(
+            model_name="interaction",
+            name="prompt_knowledge",
+            field=models.ForeignKey(
+                blank=True,
+                null=True,
+                on_delete=django.db.models.deletion.PROTECT,
+                related_name="+",
+                to="bot.promptblock",
+            ),
+        ),
+        migrations.AddField(
+            model_name="interaction",
+            name="prompt_system",
+            field=models.ForeignKey(
+                blank=True,
+                null=True,
+                on_delete=django.db.models.deletion.PROTECT,
+                related_name="+",
+                to="bot.promptblock",
+            ),
+        ),
+    ]
@@ -40,16 +40,49 @@ class Message(models.Model):
     text = models.TextField()
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            # Последние N сообщений клиента: WHERE client_id = ? ORDER BY created_at DESC
+            models.Index(fields=["client", "created_at"], name="message_client_created_idx"),
+        ]
+
     def __str__(self):
         return f"[{self.author}] {self.text[:30]}"
 
 
+class PromptBlock(models.Model):
+    """
+    Неизменяемый кусок prompt, общий для многих Interaction: стабильный
+    префикс (инструкции, при KNOWLEDGE_MODE=full — вся база знаний)
+    или набор фрагментов базы знаний. Адресуется sha256 от текста.
+    """
+    digest = models.CharField(max_length=64, unique=True)
+    text = models.TextField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.digest[:12]} ({len(self.text)} симв.)"
+
+
 class Interaction(models.Model):
     client = models.ForeignKey(Client, on_delete=models.CASCADE, related_name='interactions')
-    prompt = models.TextField()
+    # Полный текст prompt — только у старых записей; новые хранят ссылки
+    # на PromptBlock и переменную часть (см. bot/prompt_store.py)
+    prompt = models.TextField(blank=True, default="")
+    prompt_system = models.ForeignKey(
+        PromptBlock, on_delete=models.PROTECT, null=True, blank=True, related_name='+'
+    )
+    prompt_knowledge = models.ForeignKey(
+        PromptBlock, on_delete=models.PROTECT, null=True, blank=True, related_name='+'
+    )
+    prompt_user = models.TextField(blank=True, default="")
     gpt_response = models.TextField()
     assistant_hint = models.TextField()
     stage_detected = models.CharField(max_length=1, choices=Stage.STAGE_CHOICES)
+    # Токены из usage ответа OpenAI; cached_tokens — часть prompt, попавшая в кэш префикса
+    prompt_tokens = models.PositiveIntegerField(null=True, blank=True)
+    cached_tokens = models.PositiveIntegerField(null=True, blank=True)
+    completion_tokens = models.PositiveIntegerField(null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
 
     def __str__(self):
@@ -78,3 +111,17 @@ class ActiveContext(models.Model):
     assistant_telegram_id = models.CharField(max_length=100, unique=True)
     client = models.ForeignKey(Client, on_delete=models.CASCADE)
     updated_at = models.DateTimeField(auto_now=True)
+
+
+class ClientSummary(models.Model):
+    """
+    Сжатое резюме старой части переписки с клиентом.
+    Обновляется инкрементально: last_message_id — последнее учтённое сообщение.
+    """
+    client = models.OneToOneField(Client, on_delete=models.CASCADE, related_name='summary')
+    text = models.TextField(blank=True, default="")
+    last_message_id = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Резюме: {self.client}"
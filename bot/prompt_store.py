@@ -0,0 +1,85 @@
+# bot/prompt_store.py
+
+"""
+Хранение prompt в Interaction без повторов.
+
+Стабильный префикс и фрагменты базы знаний одинаковы у тысяч Interaction,
+поэтому лежат один раз в PromptBlock (ключ — sha256 текста), а Interaction
+ссылается на них и хранит только переменную часть: имя, SPIN-этап, резюме,
+историю и новое сообщение. Полный текст собирается по требованию (rebuild_prompt).
+"""
+
+import hashlib
+import threading
+
+from django.db import transaction
+
+from .models import PromptBlock
+from .prompts import Prompt
+
+
+PROMPT_BLOCK_CACHE_SIZE = 1024
+
+_block_ids = {}  # digest -> id, только для уже закоммиченных блоков
+_lock = threading.Lock()
+
+
+def text_digest(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def _remember(digest: str, block_id: int):
+    with _lock:
+        if len(_block_ids) >= PROMPT_BLOCK_CACHE_SIZE:
+            _block_ids.clear()
+        _block_ids[digest] = block_id
+
+
+def clear_block_cache():
+    with _lock:
+        _block_ids.clear()
+
+
+def get_block_id(text: str):
+    """
+    id PromptBlock с таким текстом (создаёт при необходимости); None для пустого текста.
+    Известные процессу блоки не требуют запроса к БД.
+    """
+    if not text:
+        return None
+    digest = text_digest(text)
+    with _lock:
+        block_id = _block_ids.get(digest)
+    if block_id is not None:
+        return block_id
+
+    block, _ = PromptBlock.objects.get_or_create(digest=digest, defaults={"text": text})
+    # Внутри транзакции блок может откатиться вместе с ней — запоминаем после коммита
+    transaction.on_commit(lambda: _remember(digest, block.id))
+    return block.id
+
+
+def prompt_fields(prompt) -> dict:
+    """
+    Поля Interaction для сохранения prompt. Строка (старый формат) пишется целиком.
+    """
+    if not isinstance(prompt, Prompt):
+        return {"prompt": str(prompt or "")}
+    return {
+        "prompt_system_id": get_block_id(prompt.system),
+        "prompt_knowledge_id": get_block_id(prompt.knowledge),
+        "prompt_user": prompt.user,
+    }
+
+
+def rebuild_prompt(interaction) -> str:
+    """
+    Полный текст prompt, отправленного в GPT, — для аудита и админки.
+    """
+    if interaction.prompt:
+        return interaction.prompt
+    return str(Prompt(
+        system=interaction.prompt_system.text if interaction.prompt_system_id else "",
+        user=interaction.prompt_user,
+        knowledge=interaction.prompt_knowledge.text if interaction.prompt_knowledge_id else "",
+    ))
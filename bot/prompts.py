@@ -0,0 +1,135 @@
+# bot/prompts.py
+
+"""
+Prompt = стабильный префикс (system) + переменная часть (user).
+
+OpenAI кэширует совпадающий префикс запроса длиной от 1024 токенов, поэтому
+в system попадает только то, что побайтно одинаково между вызовами:
+инструкции, формат ответа и — при KNOWLEDGE_MODE=full — вся база знаний.
+Всё, что зависит от клиента (фрагменты базы знаний при retrieval, имя,
+SPIN-этап, история, новое сообщение), идёт в user в фиксированном порядке.
+
+С KNOWLEDGE_MODE=retrieval префикс короткий и в кэш не попадает, зато сам
+prompt в разы меньше; какой режим дешевле, видно по cached_tokens в Interaction.
+"""
+
+import os
+from dataclasses import dataclass
+
+from . import knowledge_index
+from .knowledge_cache import get_knowledge_snapshot
+from .tokens import count_tokens
+
+
+PROMPT_TOKEN_BUDGET = int(os.getenv("PROMPT_TOKEN_BUDGET", "12000"))
+
+
+SALES_INSTRUCTIONS = """Ты ассистент по продажам онлайн-курса, общающийся в чате.
+
+Ответь клиенту так, как если бы ты был опытным ассистентом, продающим онлайн-курс.
+Отвечай на «вы»(пока он сам не попросит перейти на "ты"), используй методику SPIN, развивай диалог.
+
+⚠️ Ответ обязательно верни в таком формате:
+
+Ответ клиенту:
+{здесь текст ответа клиенту}
+
+Подсказка ассистенту:
+{что порекомендуешь ассистенту сделать дальше в соответствии со SPIN методикой — уточнить, спросить и т.д.}
+
+#Этап: S / P / I / N (например, #Этап: P, #Этап: I и т.д.)"""
+
+
+# То же для GPT_RESPONSE_FORMAT=json_schema: формат задаёт схема в response_format
+SALES_INSTRUCTIONS_JSON = """Ты ассистент по продажам онлайн-курса, общающийся в чате.
+
+Ответь клиенту так, как если бы ты был опытным ассистентом, продающим онлайн-курс.
+Отвечай на «вы»(пока он сам не попросит перейти на "ты"), используй методику SPIN, развивай диалог.
+
+Верни JSON-объект:
+- reply — текст ответа клиенту;
+- assistant_hint — что порекомендуешь ассистенту сделать дальше в соответствии со SPIN методикой — уточнить, спросить и т.д.;
+- stage — текущий SPIN-этап клиента, одна буква: S, P, I или N."""
+
+
+COLLEAGUE_INSTRUCTIONS = """Ты — помощник по продажам. Отвечай коллеге по клиенту.
+
+Ты — опытный ассистент по продажам. Ответь своему коллеге, который интересуется этим клиентом.
+Отвечай ясно и кратко. Не нужно обращаться к клиенту. Просто дай суть."""
+
+
+SUMMARY_INSTRUCTIONS = """Ты ведёшь краткое резюме переписки ассистента по продажам с клиентом.
+
+Обнови резюме с учётом новых сообщений. Сохрани важное для продажи:
+цели и ситуацию клиента, его проблемы и возражения, бюджет и сроки,
+о чём уже договорились и что обещали. Пиши кратко, по пунктам, не больше 200 слов.
+Верни только обновлённое резюме."""
+
+
+KNOWLEDGE_FRAGMENTS_TITLE = "База знаний (фрагменты по теме):"
+
+
+@dataclass
+class Prompt:
+    system: str
+    user: str
+    # Фрагменты базы знаний (retrieval), идут в начале user-сообщения.
+    # Хранятся отдельно, чтобы Interaction ссылался на них, а не копировал.
+    knowledge: str = ""
+
+    def user_content(self) -> str:
+        if not self.knowledge:
+            return self.user
+        return f"{KNOWLEDGE_FRAGMENTS_TITLE}\n{self.knowledge}\n\n{self.user}"
+
+    def messages(self) -> list:
+        return [
+            {"role": "system", "content": self.system},
+            {"role": "user", "content": self.user_content()},
+        ]
+
+    def __str__(self):
+        return f"{self.system}\n\n{self.user_content()}"
+
+
+def knowledge_parts(query: str) -> tuple:
+    """
+    Возвращает (часть для стабильного префикса, часть для переменного блока).
+    """
+    if knowledge_index.KNOWLEDGE_MODE == "full":
+        return get_knowledge_snapshot().content, ""
+    return "", knowledge_index.get_relevant_knowledge(query)
+
+
+def fit_history(lines: list, budget: int) -> list:
+    """
+    Оставляет самые свежие строки истории, которые помещаются в budget токенов;
+    старые отбрасываются первыми. Порядок строк сохраняется.
+    """
+    kept, used = [], 0
+    for line in reversed(lines):
+        used += count_tokens(line) + 1
+        if used > budget:
+            break
+        kept.append(line)
+    return kept[::-1]
+
+
+def build_prompt(instructions: str, query: str, head: str, history_title: str,
+                 history_lines: list, tail: str, budget: int = None) -> Prompt:
+    """
+    Собирает Prompt: instructions (+ база знаний) в префикс, затем
+    head, история и tail. История урезается под PROMPT_TOKEN_BUDGET.
+    """
+    stable_knowledge, variable_knowledge = knowledge_parts(query)
+    system = f"{instructions}\n\nБаза знаний:\n{stable_knowledge}" if stable_knowledge else instructions
+
+    budget = budget or PROMPT_TOKEN_BUDGET
+    fixed = sum(count_tokens(part) for part in (system, variable_knowledge, head, history_title, tail))
+    history_text = "\n".join(fit_history(history_lines, budget - fixed))
+
+    return Prompt(
+        system=system,
+        user=f"{head}\n\n{history_title}\n{history_text}\n\n{tail}",
+        knowledge=variable_knowledge,
+    )
@@ -0,0 +1,213 @@
+# bot/reply_format.py
+
+"""
+Структурированный ответ GPT на сообщение клиента: JSON по схеме
+{"reply", "assistant_hint", "stage"} вместо трёх секций свободного текста.
+
+OpenAI получает схему в response_format (json_schema, strict) и не может
+вернуть другие поля или этап не из S/P/I/N. Сломанным ответ бывает всё
+равно: обрезан по длине, отказ модели, JSON в ```-блоке. Такое чинится
+локально (repair_json_reply), а если не вышло — gpt_utils повторяет запрос
+с описанием ошибки (не больше GPT_PARSE_RETRIES раз).
+"""
+
+import json
+import re
+from typing import Literal
+
+from pydantic import BaseModel, ValidationError, field_validator
+
+
+class ReplyParseError(ValueError):
+    """Ответ GPT не удалось разобрать — показывать ассистенту нечего."""
+
+
+class GPTReply(BaseModel):
+    reply: str
+    assistant_hint: str
+    stage: Literal["S", "P", "I", "N"]
+
+    @field_validator("reply")
+    @classmethod
+    def reply_not_empty(cls, value: str) -> str:
+        if not value.strip():
+            raise ValueError("пустой ответ клиенту")
+        return value.strip()
+
+    @field_validator("assistant_hint")
+    @classmethod
+    def strip_hint(cls, value: str) -> str:
+        return value.strip()
+
+
+RESPONSE_FORMAT = {
+    "type": "json_schema",
+    "json_schema": {
+        "name": "sales_reply",
+        "strict": True,
+        "schema": {
+            "type": "object",
+            "properties": {
+                "reply": {"type": "string", "description": "Ответ клиенту"},
+                "assistant_hint": {"type": "string", "description": "Подсказка ассистенту по SPIN"},
+                "stage": {"type": "string", "enum": ["S", "P", "I", "N"], "description": "SPIN-этап клиента"},
+            },
+            "required": ["reply", "assistant_hint", "stage"],
+            "additionalProperties": False,
+        },
+    },
+}
+
+REPAIR_INSTRUCTION = (
+    "Предыдущий ответ не разобрался: {error}. Верни тот же ответ строго одним "
+    "JSON-объектом с полями reply, assistant_hint и stage (одна буква S, P, I или N), без пояснений."
+)
+
+_FENCE = re.compile(r"^\s*```(?:json)?\s*|\s*```\s*$")
+_STAGE_LETTER = re.compile(r"\b([SPIN])\b")
+
+
+def _validate(data) -> dict:
+    try:
+        return GPTReply.model_validate(data).model_dump()
+    except ValidationError as e:
+        raise ReplyParseError(_short_error(e)) from e
+
+
+def _short_error(error: ValidationError) -> str:
+    return "; ".join(f"{'.'.join(map(str, e['loc'])) or 'ответ'}: {e['msg']}" for e in error.errors())
+
+
+def parse_json_reply(content) -> dict:
+    """
+    Строгий разбор: ответ — ровно JSON по схеме.
+    """
+    if content is None:
+        raise ReplyParseError("пустой ответ (отказ модели)")
+    try:
+        return GPTReply.model_validate_json(content).model_dump()
+    except ValidationError as e:
+        raise ReplyParseError(_short_error(e)) from e
+
+
+def repair_json_reply(content) -> dict:
+    """
+    Починка без нового запроса: ```-блок и текст вокруг объекта,
+    этап словами («P — Problem»), недописанный хвост после последнего поля.
+    """
+    if not content:
+        raise ReplyParseError("пустой ответ (отказ модели)")
+    text = _FENCE.sub("", content)
+    start, end = text.find("{"), text.rfind("}")
+    if start == -1:
+        raise ReplyParseError("в ответе нет JSON-объекта")
+    candidates = [text[start:end + 1]] if end > start else []
+    candidates.append(text[start:].rstrip().rstrip(",") + '"}')  # обрезан внутри строки
+    candidates.append(text[start:].rstrip().rstrip(",") + "}")
+
+    error = "JSON не разобрался"
+    for candidate in candidates:
+        try:
+            data = json.loads(candidate, strict=False)
+        except json.JSONDecodeError as e:
+            error = f"некорректный JSON: {e.msg}"
+            continue
+        if not isinstance(data, dict):
+            continue
+        if isinstance(data.get("stage"), str):
+            match = _STAGE_LETTER.search(data["stage"].upper())
+            data["stage"] = match.group(1) if match else data["stage"]
+        return _validate(data)
+    raise ReplyParseError(error)
+
+
+def repair_messages(messages: list, content, error: str) -> list:
+    """
+    Сообщения для повторного запроса: исходный диалог, неудачный ответ и что с ним не так.
+    """
+    return messages + [
+        {"role": "assistant", "content": content or ""},
+        {"role": "user", "content": REPAIR_INSTRUCTION.format(error=error)},
+    ]
+
+
+_KEY = re.compile(r'"(reply|assistant_hint|stage)"\s*:\s*"')
+
+
+class JsonReplyStreamParser:
+    """
+    Инкрементальный разбор JSON-ответа: те же события, что у
+    gpt_utils.SectionStreamParser, — delta по мере дописывания строк
+    reply и assistant_hint, section, когда строка закрылась.
+    """
+
+    def __init__(self):
+        self.text = ""
+        self.position = 0   # откуда продолжать разбор self.text
+        self.field = None   # поле, строку которого сейчас читаем
+        self.value = ""
+
+    def _read_string(self) -> tuple:
+        """
+        (раскодированный кусок строки, закрылась ли она). Незаконченную
+        escape-последовательность (и половину суррогатной пары) придерживаем.
+        """
+        text, start, i = self.text, self.position, self.position
+        closed = False
+        while i < len(text):
+            char = text[i]
+            if char == '"':
+                closed = True
+                break
+            if char != "\\":
+                i += 1
+                continue
+            if i + 1 >= len(text):
+                break
+            if text[i + 1] != "u":
+                i += 2
+                continue
+            if i + 6 > len(text):
+                break
+            if text[i + 2:i + 4].lower() in ("d8", "d9", "da", "db"):  # первая половина пары
+                if i + 12 > len(text):
+                    break
+                i += 12
+                continue
+            i += 6
+
+        raw = text[start:i]
+        self.position = i + 1 if closed else i
+        try:
+            return json.loads(f'"{raw}"', strict=False), closed
+        except json.JSONDecodeError:
+            return raw, closed
+
+    def feed(self, delta: str) -> list:
+        self.text += delta
+        events = []
+        while True:
+            if self.field is None:
+                match = _KEY.search(self.text, self.position)
+                if match is None:
+                    break
+                self.field, self.value, self.position = match.group(1), "", match.end()
+
+            chunk, closed = self._read_string()
+            if chunk and self.field != "stage":
+                if not self.value:
+                    chunk = chunk.lstrip()
+                if chunk:
+                    events.append({"type": "delta", "section": self.field, "text": chunk})
+            self.value += chunk
+            if not closed:
+                break
+            events.append({"type": "section", "section": self.field, "text": self.value.strip()})
+            self.field = None
+        return events
+
+    def close(self) -> list:
+        if self.field is None:
+            return []
+        field, self.field = self.field, None
+        return [{"type": "section", "section": field, "text": self.value.strip()}]
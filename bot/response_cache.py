@@ -0,0 +1,260 @@
+# bot/response_cache.py
+
+"""
+Кэш ответов GPT на повторяющиеся вопросы клиентов («сколько стоит курс?»,
+«когда старт?»).
+
+Ключ — нормализованный текст сообщения (utils.normalize_text), текущий
+SPIN-этап клиента, отпечаток переписки до него и версия базы знаний: после
+правки базы знаний старые ответы не используются, а «Да» посреди разговора
+с одним клиентом не отвечает другому, у которого разговор был другой.
+На деле повторно отдаются в основном ответы на первое сообщение клиента.
+Записи живут RESPONSE_CACHE_TTL секунд, всего их не больше
+RESPONSE_CACHE_SIZE (LRU).
+
+Имя клиента в ответе заменяется на имя того, кому отвечаем из кэша.
+Ответ, где имя осталось в другой форме («Анне»), в кэш не попадает;
+клиенту без имени ответ с именем из кэша не отдаётся.
+
+С RESPONSE_CACHE_SIMILARITY > 0 подходит и похожий вопрос: тексты
+сравниваются по косинусу векторов символьных триграмм (считаются локально,
+без внешних моделей). Ответ из кэша помечается в подсказке ассистенту.
+
+Статистика попаданий и времени ответа по этапам — stats().
+"""
+
+import hashlib
+import os
+import re
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Optional
+
+import numpy as np
+
+from .utils import normalize_text
+
+
+RESPONSE_CACHE = os.getenv("RESPONSE_CACHE", "1") == "1"
+RESPONSE_CACHE_TTL = float(os.getenv("RESPONSE_CACHE_TTL", "3600"))
+RESPONSE_CACHE_SIZE = int(os.getenv("RESPONSE_CACHE_SIZE", "1000"))
+RESPONSE_CACHE_SIMILARITY = float(os.getenv("RESPONSE_CACHE_SIMILARITY", "0"))  # 0 — только точное совпадение
+
+VECTOR_DIM = 1024
+NGRAM = 3
+CACHED_HINT_MARK = "♻️ Ответ из кэша на похожий вопрос — проверь, подходит ли он клиенту."
+NAME_PLACEHOLDER = "\x00name\x00"
+
+_lock = threading.Lock()
+_entries = OrderedDict()  # CacheKey -> Entry
+_stats = {}               # этап -> StageStats
+# Векторы всех записей — строками одной матрицы: похожий вопрос ищется одним умножением
+_vectors = {"matrix": None, "keys": [], "free": []}
+
+
+@dataclass(frozen=True)
+class CacheKey:
+    text: str
+    stage: str
+    knowledge_version: str
+    history: str = ""  # отпечаток переписки до сообщения, "" — сообщение первое
+
+
+@dataclass
+class Entry:
+    result: dict
+    row: int
+    created_at: float = field(default_factory=time.monotonic)
+
+
+@dataclass
+class StageStats:
+    hits: int = 0
+    misses: int = 0
+    hit_seconds: float = 0.0
+    miss_seconds: float = 0.0
+
+
+def history_fingerprint(summary: str, history) -> str:
+    """
+    Отпечаток переписки (резюме и последние сообщения), "" — переписки ещё нет.
+    """
+    if not summary and not history:
+        return ""
+    digest = hashlib.sha1(normalize_text(summary or "").encode())
+    for message in history:
+        digest.update(f"\n{message.author}:{normalize_text(message.text)}".encode())
+    return digest.hexdigest()
+
+
+def make_key(text: str, stage: Optional[str], knowledge_version: str, history: str = "") -> CacheKey:
+    return CacheKey(normalize_text(text), stage or "S", knowledge_version, history)
+
+
+def text_vector(text: str) -> np.ndarray:
+    """
+    Нормированный вектор хэшированных символьных триграмм.
+    """
+    vector = np.zeros(VECTOR_DIM, dtype=np.float32)
+    padded = f" {text} "
+    for i in range(max(len(padded) - NGRAM + 1, 1)):
+        vector[zlib.crc32(padded[i:i + NGRAM].encode()) % VECTOR_DIM] += 1.0
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+
+def _name_variants(client) -> list:
+    name = (getattr(client, "name", None) or "").strip()
+    variants = [name, name.split(" ")[0]] if name else []
+    return [v for v in variants if len(v) > 1]
+
+
+def _name_stem(name: str) -> str:
+    # «Анна» → «Анн»: ловит «Анне», «Анну»; короткие имена — целиком
+    return name[:-1] if len(name) >= 4 else name
+
+
+def _depersonalize(result: dict, client) -> Optional[dict]:
+    """
+    Ответ для кэша с NAME_PLACEHOLDER вместо имени клиента; None, если
+    имя осталось в другой падежной форме — такой ответ чужому клиенту не годится.
+    """
+    stored = {k: result[k] for k in ("reply", "assistant_hint", "stage") if k in result}
+    variants = _name_variants(client)
+    for variant in variants:
+        stored["reply"] = stored.get("reply", "").replace(variant, NAME_PLACEHOLDER)
+        stored["assistant_hint"] = stored.get("assistant_hint", "").replace(variant, NAME_PLACEHOLDER)
+    for variant in variants:
+        pattern = re.compile(rf"\b{re.escape(_name_stem(variant))}\w*")
+        if pattern.search(stored.get("reply", "")) or pattern.search(stored.get("assistant_hint", "")):
+            return None
+    return stored
+
+
+def _personalize(result: dict, client) -> Optional[dict]:
+    """
+    Подставляет имя клиента; None, если ответ с именем, а у клиента имени нет.
+    """
+    variants = _name_variants(client)
+    if not variants and any(NAME_PLACEHOLDER in v for v in result.values() if isinstance(v, str)):
+        return None
+    name = variants[-1] if variants else ""
+    return {k: v.replace(NAME_PLACEHOLDER, name) if isinstance(v, str) else v for k, v in result.items()}
+
+
+def _fresh(entry: Entry) -> bool:
+    return time.monotonic() - entry.created_at < RESPONSE_CACHE_TTL
+
+
+def clear_response_cache():
+    with _lock:
+        _entries.clear()
+        _stats.clear()
+        _vectors.update(matrix=None, keys=[], free=[])
+
+
+def _take_row(key: CacheKey, vector: np.ndarray) -> int:
+    if _vectors["matrix"] is None:
+        _vectors["matrix"] = np.zeros((RESPONSE_CACHE_SIZE + 1, VECTOR_DIM), dtype=np.float32)
+        _vectors["keys"] = [None] * (RESPONSE_CACHE_SIZE + 1)
+        _vectors["free"] = list(range(RESPONSE_CACHE_SIZE, -1, -1))
+    row = _vectors["free"].pop()
+    _vectors["matrix"][row] = vector
+    _vectors["keys"][row] = key
+    return row
+
+
+def _drop(key: CacheKey):
+    entry = _entries.pop(key)
+    _vectors["matrix"][entry.row] = 0.0
+    _vectors["keys"][entry.row] = None
+    _vectors["free"].append(entry.row)
+
+
+def _find_similar(key: CacheKey):
+    if _vectors["matrix"] is None:
+        return None
+    scores = _vectors["matrix"] @ text_vector(key.text)
+    for row in np.argsort(-scores):
+        if scores[row] < RESPONSE_CACHE_SIMILARITY:
+            break
+        other = _vectors["keys"][row]
+        if (other is not None and other.stage == key.stage and other.history == key.history
+                and other.knowledge_version == key.knowledge_version and _fresh(_entries[other])):
+            return other
+    return None
+
+
+def lookup(key: CacheKey, client) -> Optional[dict]:
+    """
+    Ответ из кэша в формате acall_gpt (с "cached": True) или None.
+    """
+    if not RESPONSE_CACHE or not key.text:
+        return None
+    with _lock:
+        entry = _entries.get(key)
+        if entry is not None and not _fresh(entry):
+            _drop(key)
+            entry = None
+        if entry is None and RESPONSE_CACHE_SIMILARITY > 0:
+            similar = _find_similar(key)
+            entry = _entries[similar] if similar else None
+            key = similar or key
+        if entry is None:
+            return None
+        result = _personalize(entry.result, client)
+        if result is None:
+            return None
+        _entries.move_to_end(key)
+
+    result["assistant_hint"] = f"{CACHED_HINT_MARK}\n\n{result.get('assistant_hint', '')}".strip()
+    return dict(result, usage={}, cached=True)
+
+
+def store(key: CacheKey, result: dict, client):
+    if not RESPONSE_CACHE or not key.text or result.get("cached") or result.get("parse_failed"):
+        return
+    stored = _depersonalize(result, client)
+    if stored is None:
+        return
+    vector = text_vector(key.text)
+    with _lock:
+        if key in _entries:
+            _drop(key)
+        _entries[key] = Entry(stored, _take_row(key, vector))
+        while len(_entries) > RESPONSE_CACHE_SIZE:
+            _drop(next(iter(_entries)))
+
+
+def record(stage: Optional[str], hit: bool, seconds: float):
+    """
+    Учитывает ответ на сообщение клиента: из кэша или от GPT, и сколько он занял.
+    """
+    with _lock:
+        stats = _stats.setdefault(stage or "S", StageStats())
+        if hit:
+            stats.hits += 1
+            stats.hit_seconds += seconds
+        else:
+            stats.misses += 1
+            stats.miss_seconds += seconds
+
+
+def stats() -> dict:
+    """
+    {этап: {"hits", "misses", "hit_rate", "hit_latency", "miss_latency"}}, время — в секундах.
+    """
+    with _lock:
+        return {
+            stage: {
+                "hits": s.hits,
+                "misses": s.misses,
+                "hit_rate": s.hits / (s.hits + s.misses) if s.hits + s.misses else 0.0,
+                "hit_latency": s.hit_seconds / s.hits if s.hits else None,
+                "miss_latency": s.miss_seconds / s.misses if s.misses else None,
+            }
+            for stage, s in sorted(_stats.items())
+        }
@@ -0,0 +1,71 @@
+# bot/signals.py
+
+from django.db import transaction
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from . import context_cache, db
+from .assistants import invalidate_assistant_cache
+from .models import ActiveContext, Assistant, Client, ClientSummary, KnowledgeBlock, Message, PromptBlock, Stage
+from .prompt_store import clear_block_cache
+from .knowledge_cache import bump_knowledge_version, invalidate_knowledge_cache
+from .knowledge_index import rebuild_knowledge_index
+
+
+def _knowledge_committed():
+    invalidate_knowledge_cache()
+    bump_knowledge_version()
+    rebuild_knowledge_index()
+
+
+@receiver(post_save, sender=KnowledgeBlock)
+@receiver(post_delete, sender=KnowledgeBlock)
+def knowledge_block_changed(sender, instance, **kwargs):
+    invalidate_knowledge_cache()
+    # Версию и индекс обновляем после коммита, чтобы другие процессы прочитали уже сохранённый текст
+    transaction.on_commit(_knowledge_committed)
+
+
+@receiver(post_save, sender=Assistant)
+@receiver(post_delete, sender=Assistant)
+def assistant_changed(sender, instance, **kwargs):
+    invalidate_assistant_cache()
+    # после коммита — чтобы не перечитать список до сохранения правки
+    transaction.on_commit(invalidate_assistant_cache)
+
+
+@receiver(post_save, sender=ActiveContext)
+@receiver(post_delete, sender=ActiveContext)
+def active_context_changed(sender, instance, **kwargs):
+    assistant_id = instance.assistant_telegram_id
+    context_cache.forget_assistant(assistant_id)
+    transaction.on_commit(lambda: context_cache.forget_assistant(assistant_id))
+
+
+@receiver(post_save, sender=Client)
+@receiver(post_delete, sender=Client)
+@receiver(post_save, sender=Stage)
+@receiver(post_delete, sender=Stage)
+@receiver(post_save, sender=Message)
+@receiver(post_delete, sender=Message)
+@receiver(post_save, sender=ClientSummary)
+@receiver(post_delete, sender=ClientSummary)
+def client_context_changed(sender, instance, **kwargs):
+    # Правки в админке и новое резюме; пересылки бота пишут bulk_create без сигналов
+    # и обновляют context_cache сами (interactions.persist_interaction)
+    client_id = instance.pk if sender is Client else instance.client_id
+    context_cache.forget_client(client_id)
+    transaction.on_commit(lambda: context_cache.forget_client(client_id))
+
+
+@receiver(post_delete, sender=PromptBlock)
+def prompt_block_deleted(sender, instance, **kwargs):
+    clear_block_cache()
+
+
+@receiver(connection_created)
+def configure_sqlite(sender, connection, **kwargs):
+    if connection.vendor == "sqlite" and db.SQLITE_PRODUCTION:
+        with connection.cursor() as cursor:
+            db.apply_sqlite_pragmas(cursor)
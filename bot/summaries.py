@@ -0,0 +1,86 @@
+# bot/summaries.py
+
+"""
+Фоновое инкрементальное резюмирование длинных переписок.
+
+Когда у клиента больше SUMMARY_THRESHOLD сообщений, всё, что старше окна
+последних HISTORY_LIMIT сообщений, сжимается в ClientSummary. Каждое
+обновление дописывает к прежнему резюме только новые сообщения.
+
+Обновление выполняется в отдельном потоке (один на процесс), поэтому
+запрос к /api/interaction/ не ждёт лишнего вызова GPT.
+"""
+
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.db import close_old_connections
+
+from . import gpt_utils
+from .gpt_scheduler import PRIORITY_BACKGROUND, gpt_job
+from .models import Client, ClientSummary, Message
+
+
+SUMMARY_THRESHOLD = int(os.getenv("SUMMARY_THRESHOLD", "20"))  # сообщений до первого резюме
+SUMMARY_MAX_BATCH = int(os.getenv("SUMMARY_MAX_BATCH", "100"))  # сообщений за один вызов GPT
+
+_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="summaries")
+_pending = set()
+_pending_lock = threading.Lock()
+
+
+def update_summary(client_id: int) -> bool:
+    """
+    Дописывает резюме клиента сообщениями, вышедшими за окно истории.
+    Возвращает True, если резюме обновилось.
+    """
+    client = Client.objects.get(pk=client_id)
+    summary = ClientSummary.objects.filter(client=client).first()
+    last_message_id = summary.last_message_id if summary else 0
+
+    if summary is None and Message.objects.filter(client=client).count() <= SUMMARY_THRESHOLD:
+        return False
+
+    pending = list(
+        Message.objects.filter(client=client, id__gt=last_message_id).order_by("created_at", "id")
+    )
+    outside_window = pending[:-gpt_utils.HISTORY_LIMIT] if gpt_utils.HISTORY_LIMIT else pending
+    if len(outside_window) < gpt_utils.SUMMARY_STEP:
+        return False
+
+    text = summary.text if summary else ""
+    for start in range(0, len(outside_window), SUMMARY_MAX_BATCH):
+        batch = outside_window[start:start + SUMMARY_MAX_BATCH]
+        text = gpt_utils.summarize_conversation(text, gpt_utils.format_history(batch))
+        ClientSummary.objects.update_or_create(
+            client=client,
+            defaults={"text": text, "last_message_id": batch[-1].id},
+        )
+    return True
+
+
+def _run(client_id: int):
+    with _pending_lock:
+        _pending.discard(client_id)
+    close_old_connections()
+    try:
+        # Резюме подождёт: вперёд пропускаем ответы, которых ждут ассистенты
+        with gpt_job(PRIORITY_BACKGROUND):
+            update_summary(client_id)
+    except Exception as e:
+        print("Ошибка при обновлении резюме клиента", client_id, e)
+    finally:
+        close_old_connections()
+
+
+def schedule_summary_update(client_id: int):
+    """
+    Ставит обновление резюме в фоновую очередь; повторные запросы
+    для клиента, который уже ждёт в очереди, схлопываются.
+    """
+    with _pending_lock:
+        if client_id in _pending:
+            return
+        _pending.add(client_id)
+    _executor.submit(_run, client_id)
@@ -0,0 +1,81 @@
+# bot/telegram_stream.py
+
+import asyncio
+import os
+import time
+
+from telegram.error import BadRequest, RetryAfter
+
+from . import metrics
+
+
+STREAM_EDIT_INTERVAL = float(os.getenv("STREAM_EDIT_INTERVAL", "1.0"))  # секунд между правками
+STREAM_PLACEHOLDER = "✍️ Печатаю…"
+TELEGRAM_MESSAGE_LIMIT = 4096
+
+
+class StreamingReply:
+    """
+    Сообщение в Telegram, которое дописывается по мере генерации ответа.
+
+    start() сразу отправляет заглушку, append() копит текст и редактирует
+    сообщение не чаще раза в STREAM_EDIT_INTERVAL секунд, finish() выставляет
+    итоговый текст.
+    """
+
+    def __init__(self, message, prefix: str = "", interval: float = None):
+        self.message = message
+        self.prefix = prefix
+        self.interval = STREAM_EDIT_INTERVAL if interval is None else interval
+        self.text = ""
+        self.sent = None
+        self.shown = None
+        self.last_edit = 0.0
+        self.first_text_at = None
+
+    async def start(self, placeholder: str = STREAM_PLACEHOLDER):
+        if self.sent is None:
+            with metrics.span("telegram_send"):
+                self.sent = await self.message.reply_text(self.prefix + placeholder)
+            self.shown = self.prefix + placeholder
+        return self
+
+    async def _edit(self, text: str, final: bool = False):
+        text = text[:TELEGRAM_MESSAGE_LIMIT]
+        if not text.strip() or text == self.shown:
+            return
+        try:
+            with metrics.span("telegram_send"):
+                await self.sent.edit_text(text)
+        except RetryAfter as e:
+            if not final:
+                return  # пропускаем промежуточную правку, финальная догонит
+            await asyncio.sleep(e.retry_after)
+            with metrics.span("telegram_send"):
+                await self.sent.edit_text(text)
+        except BadRequest as e:
+            if "not modified" not in str(e).lower():
+                raise
+        self.shown = text
+        self.last_edit = time.monotonic()
+        if self.first_text_at is None:
+            self.first_text_at = self.last_edit
+
+    async def append(self, delta: str):
+        self.text += delta
+        if not self.text.strip():
+            return
+        await self.start()
+        if time.monotonic() - self.last_edit >= self.interval:
+            await self._edit(self.prefix + self.text.strip())
+
+    async def finish(self, final_text: str = None):
+        if final_text is not None:
+            self.text = final_text
+        if self.sent is None:
+            # Заглушку ещё не показывали — сразу отправляем готовый текст
+            with metrics.span("telegram_send"):
+                self.sent = await self.message.reply_text((self.prefix + self.text.strip())[:TELEGRAM_MESSAGE_LIMIT])
+            self.shown = self.sent.text
+            return
+        await self._edit(self.prefix + self.text.strip(), final=True)
@@ -0,0 +1,42 @@
+# bot/tokens.py
+
+import math
+import os
+
+try:
+    import tiktoken
+except ImportError:  # tiktoken необязателен: без него считаем приблизительно
+    tiktoken = None
+
+
+TOKENIZER_MODEL = os.getenv("GPT_MODEL", "gpt-4o")
+CHARS_PER_TOKEN = 3.0  # грубая оценка для русского текста
+
+_encoding = {}
+
+
+def get_encoding():
+    """
+    Токенизатор модели. None, если tiktoken не установлен или не смог
+    загрузить словарь (например, без сети) — тогда count_tokens оценивает.
+    """
+    if "value" not in _encoding:
+        encoding = None
+        if tiktoken is not None:
+            try:
+                encoding = tiktoken.encoding_for_model(TOKENIZER_MODEL)
+            except KeyError:
+                encoding = tiktoken.get_encoding("o200k_base")
+            except Exception:
+                encoding = None
+        _encoding["value"] = encoding
+    return _encoding["value"]
+
+
+def count_tokens(text: str) -> int:
+    if not text:
+        return 0
+    encoding = get_encoding()
+    if encoding is not None:
+        return len(encoding.encode(text))
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
@@ -0,0 +1,32 @@
+# bot/utils.py
+
+import re
+
+
+EMOJI_PATTERN = re.compile("["
+    u"\U0001F600-\U0001F64F"
+    u"\U0001F300-\U0001F5FF"
+    u"\U0001F680-\U0001F6FF"
+    u"\U0001F1E0-\U0001F1FF"
+    u"\U00002700-\U000027BF"
+    u"\U0001F900-\U0001F9FF"
+    u"\U0001FA70-\U0001FAFF"
+    u"\U00002600-\U000026FF"
+    "]+", flags=re.UNICODE)
+
+
+# Функция для удаления emoji из текста
+def remove_emojis(text: str) -> str:
+    """
+    Удаляет все emoji из строки.
+    """
+    return EMOJI_PATTERN.sub(r'', text).strip()
+
+
+def normalize_text(text: str) -> str:
+    """
+    Текст для сравнения вопросов: без emoji, в нижнем регистре,
+    с одиночными пробелами и без знаков препинания по краям.
+    """
+    text = re.sub(r"\s+", " ", remove_emojis(text).lower())
+    return text.strip(" .,!?…;:-—")
@@ -80,12 +80,42 @@ WSGI_APPLICATION = "core.wsgi.application"
 # Database
 # https://docs.djangoproject.com/en/4.2/ref/settings/#databases
 
-DATABASES = {
-    "default": {
-        "ENGINE": "django.db.backends.sqlite3",
-        "NAME": BASE_DIR / "db.sqlite3",
+# DB_ENGINE=sqlite (по умолчанию) — один узел; WAL и прочие прагмы SQLite
+# включаются на каждом соединении (см. bot/db.py).
+# DB_ENGINE=postgres — несколько реплик бота/API на общей базе.
+DB_ENGINE = os.getenv("DB_ENGINE", "sqlite")
+
+if DB_ENGINE == "postgres":
+    # За PgBouncer в режиме transaction pooling (DB_PGBOUNCER=1) нельзя держать
+    # серверные курсоры и prepared statements между транзакциями.
+    DB_PGBOUNCER = os.getenv("DB_PGBOUNCER", "0") == "1"
+    DATABASES = {
+        "default": {
+            "ENGINE": "django.db.backends.postgresql",
+            "NAME": os.getenv("POSTGRES_DB", "insidersale"),
+            "USER": os.getenv("POSTGRES_USER", "insidersale"),
+            "PASSWORD": os.getenv("POSTGRES_PASSWORD", ""),
+            "HOST": os.getenv("POSTGRES_HOST", "127.0.0.1"),
+            "PORT": os.getenv("POSTGRES_PORT", "5432"),
+            # Постоянные соединения переиспользует поток бота и поток записи;
+            # ASGI-запросы получают свои потоки, поэтому на много реплик — PgBouncer.
+            "CONN_MAX_AGE": int(os.getenv("DB_CONN_MAX_AGE", "60")),
+            "CONN_HEALTH_CHECKS": True,
+            "DISABLE_SERVER_SIDE_CURSORS": DB_PGBOUNCER,
+            "OPTIONS": {
+                "connect_timeout": int(os.getenv("DB_CONNECT_TIMEOUT", "5")),
+                "application_name": os.getenv("DB_APPLICATION_NAME", "insidersale"),
+                **({"prepare_threshold": None} if DB_PGBOUNCER else {}),
+            },
+        }
+    }
+else:
+    DATABASES = {
+        "default": {
+            "ENGINE": "django.db.backends.sqlite3",
+            "NAME": os.getenv("SQLITE_PATH", BASE_DIR / "db.sqlite3"),
+        }
     }
-}
 
 
 # Password validation
@@ -1,24 +1,216 @@
 # serve_and_run_bot.py
-import subprocess
-import threading
+
+"""
+Запускает API (ASGI-приложение под uvicorn) и Telegram-бота.
+
+При SERVER_WORKERS=1 оба работают в одном процессе и одном event loop.
+Бот стартует, как только /api/health/ ответил 200, а не через фиксированную паузу.
+По SIGINT/SIGTERM бот перестаёт брать апдейты и дожидается начатых ответов GPT,
+затем API дообслуживает открытые запросы (не дольше SHUTDOWN_TIMEOUT секунд).
+
+При SERVER_WORKERS>1 супервизор открывает сокет и держит на нём N процессов uvicorn.
+Бот работает только в первом процессе (long polling). Webhook (BOT_MODE=webhook)
+с несколькими процессами не запускается: апдейты одного чата попадали бы
+в разные процессы, и ни порядок, ни схлопывание пересылок не соблюдались бы.
+Для webhook — SERVER_WORKERS=1 или бот отдельно от API (--no-bot).
+Упавший процесс перезапускается.
+
+    python serve_and_run_bot.py [--workers 4] [--no-bot]
+"""
+
 import time
-import sys
 
+STARTED_AT = time.perf_counter()
+
+import argparse
+import asyncio
+import contextlib
+import multiprocessing
+import os
+import signal
+
+import httpx
+import uvicorn
+from dotenv import load_dotenv
+
+load_dotenv()
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "core.settings")
+
+ASGI_APP = "core.asgi:application"
+SERVER_HOST = os.getenv("SERVER_HOST", "0.0.0.0")
+SERVER_PORT = int(os.getenv("SERVER_PORT", "8000"))
+SERVER_WORKERS = int(os.getenv("SERVER_WORKERS", "1"))
+READY_TIMEOUT = float(os.getenv("READY_TIMEOUT", "30"))
+SHUTDOWN_TIMEOUT = float(os.getenv("SHUTDOWN_TIMEOUT", "60"))
+
+
+class Server(uvicorn.Server):
+    """
+    uvicorn.Server без собственных обработчиков сигналов:
+    порядок остановки бота и API задаёт serve().
+    """
+
+    @contextlib.contextmanager
+    def capture_signals(self):
+        yield
+
+
+def since_start(started_at: float) -> str:
+    return f"{time.perf_counter() - started_at:.2f} с"
+
+
+async def wait_until_ready(server: Server, url: str, task: asyncio.Task):
+    """
+    Ждёт, пока uvicorn начнёт принимать соединения и /api/health/ ответит 200.
+    """
+    deadline = time.perf_counter() + READY_TIMEOUT
+    async with httpx.AsyncClient(timeout=2) as client:
+        while time.perf_counter() < deadline:
+            if task.done():
+                raise RuntimeError("API не запустился")
+            if server.started:
+                try:
+                    if (await client.get(url)).status_code == 200:
+                        return
+                except httpx.HTTPError:
+                    pass
+            await asyncio.sleep(0.05)
+    raise RuntimeError(f"API не ответил на {url} за {READY_TIMEOUT:.0f} с")
+
+
+async def start_bot(started_at: float, register_webhook: bool = True):
+    from telegram import Update
+    from telegram.ext import TypeHandler
+    from bot.bot_main import build_application
+    from bot.dispatcher import start_application
+
+    app = build_application()
+    first_update = []
+
+    async def report_first_update(update, context):
+        if not first_update:
+            first_update.append(update.update_id)
+            print(f"Первый апдейт обработан через {since_start(started_at)} после старта")
+
+    # group=1 выполняется после основных обработчиков того же апдейта
+    app.add_handler(TypeHandler(Update, report_first_update), group=1)
+
+    dispatcher = await start_application(app, register_webhook)
+    print(f"Бот принимает апдейты через {since_start(started_at)}")
+    return app, dispatcher
+
+
+async def stop_bot(bot):
+    """
+    Перестаёт забирать апдейты и ждёт уже начатые обработчики (ответы GPT).
+    """
+    from bot.dispatcher import stop_application
+
+    app, dispatcher = bot
+    await stop_application(app, dispatcher, SHUTDOWN_TIMEOUT)
+
+
+async def serve(host: str, port: int, run_bot: bool = True, sockets=None, started_at: float = STARTED_AT,
+                register_webhook: bool = True):
+    """
+    API и бот в одном event loop: API → проверка готовности → бот;
+    остановка в обратном порядке, с ожиданием начатых запросов.
+    """
+    config = uvicorn.Config(
+        ASGI_APP, host=host, port=port, lifespan="off",
+        timeout_graceful_shutdown=SHUTDOWN_TIMEOUT,
+    )
+    server = Server(config)
+
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop.set)
+
+    server_task = asyncio.create_task(server.serve(sockets=sockets))
+    bot = None
+    try:
+        check_host = "127.0.0.1" if host in ("0.0.0.0", "::") else host
+        await wait_until_ready(server, f"http://{check_host}:{port}/api/health/", server_task)
+        print(f"API готов через {since_start(started_at)}")
+
+        if run_bot:
+            bot = await start_bot(started_at, register_webhook)
+
+        await asyncio.wait(
+            [asyncio.create_task(stop.wait()), server_task],
+            return_when=asyncio.FIRST_COMPLETED,
+        )
+        print("Останавливаюсь…")
+    finally:
+        if bot is not None:
+            await stop_bot(bot)
+        server.should_exit = True
+        await server_task
+
+        from bot import gpt_utils
+        await gpt_utils.async_client.close()
+
+
+def run_worker(host: str, port: int, run_bot: bool, sockets, started_at: float, register_webhook: bool):
+    asyncio.run(serve(host, port, run_bot=run_bot, sockets=sockets, started_at=started_at,
+                      register_webhook=register_webhook))
+
+
+def supervise(host: str, port: int, workers: int, run_bot: bool):
+    """
+    Держит workers процессов на общем сокете и перезапускает упавшие.
+    SIGINT/SIGTERM пересылается процессам; каждый останавливается мягко.
+    """
+    sock = uvicorn.Config(ASGI_APP, host=host, port=port).bind_socket()
+    context = multiprocessing.get_context("spawn")
+
+    def spawn(index: int):
+        process = context.Process(
+            target=run_worker,
+            args=(host, port, run_bot and index == 0, [sock], STARTED_AT, index == 0),
+            name=f"worker-{index}",
+        )
+        process.start()
+        return process
+
+    stopping = []
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        signal.signal(sig, lambda *_: stopping.append(True))
 
-def run_django():
-    subprocess.call([sys.executable, "manage.py", "runserver", "0.0.0.0:8000"])
+    processes = [spawn(index) for index in range(workers)]
+    print(f"Запущено процессов: {workers}")
+    while not stopping:
+        for index, process in enumerate(processes):
+            if not process.is_alive():
+                print(f"{process.name} завершился с кодом {process.exitcode}, перезапускаю")
+                processes[index] = spawn(index)
+        time.sleep(0.5)
 
+    for process in processes:
+        process.terminate()
+    for process in processes:
+        process.join(SHUTDOWN_TIMEOUT + 5)
+        if process.is_alive():
+            process.kill()
+    sock.close()
 
-def run_bot():
-    time.sleep(5)  # подождать, пока Django поднимется
-    subprocess.call([sys.executable, "-m", "bot.bot_main"])
 
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--host", default=SERVER_HOST)
+    parser.add_argument("--port", type=int, default=SERVER_PORT)
+    parser.add_argument("--workers", type=int, default=SERVER_WORKERS)
+    parser.add_argument("--no-bot", action="store_true", help="только API")
+    args = parser.parse_args()
 
-t1 = threading.Thread(target=run_django)
-t2 = threading.Thread(target=run_bot)
+    if args.workers > 1 and not args.no_bot and os.getenv("BOT_MODE", "polling") == "webhook":
+        parser.error("BOT_MODE=webhook работает только с одним процессом: порядок апдейтов чата держится внутри процесса")
+    if args.workers > 1:
+        supervise(args.host, args.port, args.workers, run_bot=not args.no_bot)
+    else:
+        asyncio.run(serve(args.host, args.port, run_bot=not args.no_bot))
 
-t1.start()
-t2.start()
 
-t1.join()
-t2.join()
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,52 @@
+# tests/conftest.py
+
+import pytest
+
+from bot import context_cache, db, knowledge_cache, knowledge_index, metrics, prompt_store, response_cache
+
+
+@pytest.fixture(autouse=True)
+def isolated_knowledge_files(tmp_path, monkeypatch):
+    """
+    Индекс и файл версии базы знаний пишутся во временный каталог, а не рядом с db.sqlite3.
+    """
+    monkeypatch.setattr(knowledge_index, "KNOWLEDGE_INDEX_PATH", tmp_path / "knowledge_index.npz")
+    monkeypatch.setitem(knowledge_index._loaded, "mtime", None)
+    monkeypatch.setitem(knowledge_index._loaded, "index", None)
+    monkeypatch.setattr(knowledge_cache, "KNOWLEDGE_VERSION_PATH", tmp_path / "knowledge.version")
+    knowledge_cache.invalidate_knowledge_cache()
+
+
+@pytest.fixture(autouse=True)
+def writes_in_test_thread(monkeypatch):
+    """
+    pytest-django держит тест в транзакции соединения главного потока,
+    поток-писатель db.run_write её не видит — в тестах пишем без очереди.
+    """
+    monkeypatch.setattr(db, "SQLITE_WRITE_QUEUE", False)
+
+
+@pytest.fixture(autouse=True)
+def fresh_prompt_block_cache():
+    """
+    id PromptBlock, запомненные в прошлых тестах, указывают на удалённые строки.
+    """
+    prompt_store.clear_block_cache()
+
+
+@pytest.fixture(autouse=True)
+def fresh_context_cache():
+    """
+    Контекст клиентов из прошлых тестов ссылается на откатившиеся строки.
+    """
+    context_cache.clear_context_cache()
+
+
+@pytest.fixture(autouse=True)
+def fresh_response_cache():
+    response_cache.clear_response_cache()
+
+
+@pytest.fixture(autouse=True)
+def fresh_metrics():
+    metrics.clear_metrics()
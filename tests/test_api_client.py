@@ -0,0 +1,39 @@
+# tests/test_api_client.py
+
+import asyncio
+import time
+
+from benchmarks.fakes import FakeHTTPServer, make_json_handler
+from bot import api_client
+
+
+LATENCY = 0.4
+CONCURRENT_FORWARDS = 20
+
+
+def test_concurrent_forwards_finish_in_about_one_round_trip(monkeypatch):
+    payload = {"reply": "Ответ", "assistant_hint": "Подсказка", "stage": "S"}
+
+    with FakeHTTPServer(make_json_handler(payload, latency=LATENCY)) as server:
+        monkeypatch.setattr(api_client, "API_URL", server.url)
+
+        async def run():
+            try:
+                start = time.perf_counter()
+                await api_client.post_interaction({"telegram_id": 1, "text": "Привет"})
+                single = time.perf_counter() - start
+
+                start = time.perf_counter()
+                results = await asyncio.gather(*(
+                    api_client.post_interaction({"telegram_id": i, "text": "Привет"})
+                    for i in range(CONCURRENT_FORWARDS)
+                ))
+                return single, time.perf_counter() - start, results
+            finally:
+                await api_client.close_api_client()
+
+        single, burst, results = asyncio.run(run())
+
+    assert all(r == payload for r in results)
+    # Последовательно это заняло бы ~CONCURRENT_FORWARDS * LATENCY секунд
+    assert burst < single * 2, f"{CONCURRENT_FORWARDS} пересылок: {burst:.2f}s, одна: {single:.2f}s"
@@ -0,0 +1,45 @@
+# tests/test_assistants.py
+
+import pytest
+from asgiref.sync import async_to_sync
+
+from bot import assistants
+from bot.models import Assistant
+
+
+@pytest.fixture(autouse=True)
+def empty_cache():
+    assistants.invalidate_assistant_cache()
+
+
+@pytest.mark.django_db
+def test_checks_after_load_do_not_touch_database(django_assert_num_queries):
+    Assistant.objects.create(telegram_id="100")
+    assistants.load_allowed_assistants()
+
+    with django_assert_num_queries(0):
+        assert async_to_sync(assistants.is_allowed_assistant)(100) is True
+        assert async_to_sync(assistants.is_allowed_assistant)(200) is False
+
+
+@pytest.mark.django_db
+def test_admin_changes_invalidate_the_list():
+    assistants.load_allowed_assistants()
+    assert async_to_sync(assistants.is_allowed_assistant)(300) is False
+
+    assistant = Assistant.objects.create(telegram_id="300")
+    assert async_to_sync(assistants.is_allowed_assistant)(300) is True
+
+    assistant.delete()
+    assert async_to_sync(assistants.is_allowed_assistant)(300) is False
+
+
+@pytest.mark.django_db
+def test_list_is_reloaded_after_ttl(monkeypatch):
+    assistants.load_allowed_assistants()
+    # Правка из другого процесса: сигнал сюда не приходит
+    Assistant.objects.bulk_create([Assistant(telegram_id="400")])
+    assert async_to_sync(assistants.is_allowed_assistant)(400) is False
+
+    monkeypatch.setattr(assistants, "ASSISTANT_CACHE_TTL", 0)
+    assert async_to_sync(assistants.is_allowed_assistant)(400) is True
@@ -0,0 +1,64 @@
+# tests/test_coalescing.py
+
+import asyncio
+
+from bot.coalescing import ForwardCoalescer
+
+
+def test_burst_of_forwards_gets_one_reply():
+    handled = []
+
+    async def handler(burst):
+        handled.append((burst.message, burst.text))
+
+    async def run():
+        coalescer = ForwardCoalescer(handler, window=0.05)
+        await asyncio.gather(*(
+            coalescer.submit(("assistant", "client"), f"msg{i}", f"часть {i}") for i in range(3)
+        ))
+        await coalescer.submit(("assistant", "other"), "msg", "другой клиент")
+
+    asyncio.run(run())
+
+    assert handled == [("msg2", "часть 0\nчасть 1\nчасть 2"), ("msg", "другой клиент")]
+
+
+def test_new_fragment_cancels_generation_in_flight():
+    started, handled = [], []
+
+    async def handler(burst):
+        started.append(burst.text)
+        await asyncio.sleep(0.2)  # GPT думает
+        handled.append(burst.text)
+
+    async def run():
+        coalescer = ForwardCoalescer(handler, window=0)
+        first = asyncio.create_task(coalescer.submit("key", "m1", "Сколько стоит?"))
+        await asyncio.sleep(0.05)
+        await coalescer.submit("key", "m2", "И когда старт?")
+        await first
+
+    asyncio.run(run())
+
+    assert started == ["Сколько стоит?", "Сколько стоит?\nИ когда старт?"]
+    assert handled == ["Сколько стоит?\nИ когда старт?"]
+
+
+def test_reply_already_shown_is_not_cancelled():
+    handled = []
+
+    async def handler(burst):
+        burst.claim()
+        await asyncio.sleep(0.1)
+        handled.append(burst.text)
+
+    async def run():
+        coalescer = ForwardCoalescer(handler, window=0)
+        first = asyncio.create_task(coalescer.submit("key", "m1", "первое"))
+        await asyncio.sleep(0.02)
+        await coalescer.submit("key", "m2", "второе")
+        await first
+
+    asyncio.run(run())
+
+    assert handled == ["первое", "второе"]
@@ -0,0 +1,111 @@
+# tests/test_context_cache.py
+
+import os
+import subprocess
+import sys
+
+import pytest
+from asgiref.sync import async_to_sync
+from unittest.mock import patch
+
+from bot import context_cache, interactions
+from bot.gpt_utils import generate_assistant_prompt
+from bot.models import ActiveContext, Client, Message, Stage
+
+
+GPT_RESULT = {"reply": "Стоит 10 000 ₽.", "assistant_hint": "Спроси про сроки.", "stage": "P"}
+
+
+def forward(client, text, assistant_id, on_commit):
+    # Колбэки после коммита выполняем, кроме фонового резюме — его поток лезет в тестовую БД
+    with on_commit(execute=True), patch("bot.gpt_utils.acall_gpt", return_value=GPT_RESULT), \
+            patch("bot.interactions.schedule_summary_update"):
+        async_to_sync(interactions.run_interaction)(client, text, assistant_id=assistant_id)
+
+
+@pytest.mark.django_db
+def test_follow_up_after_forward_needs_no_queries(django_assert_num_queries, django_capture_on_commit_callbacks):
+    client = Client.objects.create(telegram_id="700", name="Анна")
+    forward(client, "Сколько стоит курс?", 42, django_capture_on_commit_callbacks)
+    forward(client, "А рассрочка есть?", 42, django_capture_on_commit_callbacks)
+    # Индекс базы знаний строится при первом обращении — прогреваем
+    async_to_sync(generate_assistant_prompt)(client, "прогрев", context_cache.get_active_context(42))
+
+    with django_assert_num_queries(0):
+        context = async_to_sync(context_cache.aget_active_context)(42)
+        prompt = async_to_sync(generate_assistant_prompt)(context.client, "Что ответить?", context)
+
+    assert context.client.pk == client.pk
+    assert context.stage == "P"
+    assert [m.text for m in context.history] == [
+        "Сколько стоит курс?", "Стоит 10 000 ₽.", "А рассрочка есть?", "Стоит 10 000 ₽.",
+    ]
+    assert "А рассрочка есть?" in prompt.user
+
+
+@pytest.mark.django_db
+def test_cached_context_matches_database(django_capture_on_commit_callbacks):
+    client = Client.objects.create(telegram_id="701")
+    for i in range(3):
+        forward(client, f"вопрос {i}", 43, django_capture_on_commit_callbacks)
+
+    cached = context_cache.get_active_context(43)
+    context_cache.clear_context_cache()
+    loaded = context_cache.get_active_context(43)
+
+    assert [m.pk for m in cached.history] == [m.pk for m in loaded.history]
+    assert cached.stage == loaded.stage
+
+
+@pytest.mark.django_db
+def test_admin_edits_invalidate_context():
+    client = Client.objects.create(telegram_id="702")
+    other = Client.objects.create(telegram_id="703")
+    ActiveContext.objects.create(assistant_telegram_id="44", client=client)
+    Stage.objects.create(client=client, stage="S")
+    assert context_cache.get_active_context(44).stage == "S"
+
+    Stage.objects.filter(client=client).update(stage="I")
+    Stage.objects.get(client=client).save()
+    assert context_cache.get_active_context(44).stage == "I"
+
+    Message.objects.create(client=client, text="правка из админки", author="client")
+    assert [m.text for m in context_cache.get_active_context(44).history] == ["правка из админки"]
+
+    ActiveContext.objects.filter(assistant_telegram_id="44").update(client=other)
+    ActiveContext.objects.get(assistant_telegram_id="44").save()
+    assert context_cache.get_active_context(44).client.pk == other.pk
+
+
+@pytest.mark.django_db
+def test_context_is_reloaded_after_ttl(monkeypatch):
+    client = Client.objects.create(telegram_id="704")
+    ActiveContext.objects.create(assistant_telegram_id="45", client=client)
+    assert context_cache.get_active_context(45).stage is None
+
+    # Запись из другого процесса: сигнал сюда не приходит
+    Stage.objects.bulk_create([Stage(client=client, stage="N")])
+    assert context_cache.get_active_context(45).stage is None
+
+    monkeypatch.setattr(context_cache, "CONTEXT_CACHE_TTL", 0)
+    assert context_cache.get_active_context(45).stage == "N"
+
+
+@pytest.mark.django_db
+def test_cache_is_bounded(monkeypatch):
+    monkeypatch.setattr(context_cache, "CONTEXT_CACHE_SIZE", 2)
+    clients = [Client.objects.create(telegram_id=str(800 + i)) for i in range(3)]
+    for client in clients:
+        context_cache.load_client_context(client)
+
+    assert list(context_cache._clients) == [clients[1].pk, clients[2].pk]
+
+
+def test_django_setup_does_not_need_openai_key():
+    # signals.py импортирует context_cache: migrate и админка работают без OPENAI_API_KEY
+    env = {k: v for k, v in os.environ.items() if k != "OPENAI_API_KEY"}
+    env["DJANGO_SETTINGS_MODULE"] = "core.settings"
+    code = "import django, sys; django.setup(); print('bot.gpt_utils' in sys.modules)"
+    result = subprocess.run([sys.executable, "-c", code], env=env, capture_output=True, text=True, timeout=60)
+    assert result.returncode == 0, result.stderr
+    assert result.stdout.strip() == "False"
@@ -0,0 +1,78 @@
+# tests/test_copy_from_sqlite.py
+
+"""
+Целевая база — тестовая база pytest-django: SQLite по умолчанию,
+PostgreSQL при запуске с DB_ENGINE=postgres (например, против локального контейнера).
+"""
+
+from datetime import timedelta
+
+import pytest
+from django.core.management import call_command
+from django.db import connections
+from django.utils import timezone
+
+from bot.management.commands import copy_from_sqlite
+from bot.models import Client, Interaction, KnowledgeBlock, Message, PromptBlock, Stage
+
+
+@pytest.fixture
+def source_db(tmp_path):
+    alias = copy_from_sqlite.add_source_database(tmp_path / "old.sqlite3")
+    call_command("migrate", database=alias, verbosity=0, skip_checks=True)
+    yield alias
+    connections[alias].close()
+    del connections[alias]
+    del connections.settings[alias]
+
+
+@pytest.mark.django_db
+def test_copies_tables_in_chunks_keeping_ids_and_timestamps(source_db, tmp_path):
+    long_ago = timezone.now() - timedelta(days=30)
+    client = Client.objects.using(source_db).create(telegram_id="1", name="Клиент")
+    Client.objects.using(source_db).filter(pk=client.pk).update(created_at=long_ago)
+    Stage.objects.using(source_db).create(client=client, stage="P")
+    KnowledgeBlock.objects.using(source_db).create(content="База знаний")
+    for i in range(7):
+        Message.objects.using(source_db).create(client=client, author="client", text=f"Сообщение {i}")
+    Interaction.objects.using(source_db).create(
+        client=client, prompt="p", gpt_response="r", assistant_hint="h", stage_detected="P"
+    )
+    # Новый формат: prompt по ссылкам на PromptBlock (PROTECT)
+    system = PromptBlock.objects.using(source_db).create(digest="a" * 64, text="Инструкции")
+    knowledge = PromptBlock.objects.using(source_db).create(digest="b" * 64, text="Фрагменты базы знаний")
+    Interaction.objects.using(source_db).create(
+        client=client, prompt_system=system, prompt_knowledge=knowledge, prompt_user="Вопрос",
+        gpt_response="r2", assistant_hint="h2", stage_detected="P",
+    )
+
+    call_command(
+        "copy_from_sqlite", source=str(tmp_path / "old.sqlite3"), chunk_size=3, verbosity=0,
+    )
+
+    copied = Client.objects.get(telegram_id="1")
+    assert copied.pk == client.pk
+    assert copied.created_at == long_ago
+    assert copied.stage.stage == "P"
+    assert list(copied.messages.order_by("id").values_list("text", flat=True)) == [f"Сообщение {i}" for i in range(7)]
+    old, new = Interaction.objects.order_by("id")
+    assert old.client == copied and old.prompt == "p"
+    assert (new.prompt_system.text, new.prompt_knowledge.text) == ("Инструкции", "Фрагменты базы знаний")
+    assert PromptBlock.objects.count() == 2
+    assert KnowledgeBlock.objects.get().content == "База знаний"
+
+    # Последовательности сдвинуты: новые строки не конфликтуют с перенесёнными id
+    assert Message.objects.create(client=copied, author="bot", text="Новое").pk > 7
+
+
+@pytest.mark.django_db
+def test_refuses_to_copy_into_non_empty_database_without_resume(source_db, tmp_path):
+    first = Client.objects.using(source_db).create(telegram_id="1")
+    Client.objects.using(source_db).create(telegram_id="2")
+    Client.objects.create(pk=first.pk, telegram_id="1")  # прерванный прошлый перенос
+
+    with pytest.raises(Exception, match="--resume"):
+        call_command("copy_from_sqlite", source=str(tmp_path / "old.sqlite3"), verbosity=0)
+
+    call_command("copy_from_sqlite", source=str(tmp_path / "old.sqlite3"), resume=True, verbosity=0)
+    assert Client.objects.count() == 2
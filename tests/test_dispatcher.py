@@ -0,0 +1,156 @@
+# tests/test_dispatcher.py
+
+import asyncio
+import json
+import time
+from types import SimpleNamespace
+
+import pytest
+from django.test import Client
+
+from bot import dispatcher
+from bot.dispatcher import UpdateDispatcher, release_chat_order
+
+
+def update(update_id, chat_id):
+    return SimpleNamespace(update_id=update_id, effective_chat=SimpleNamespace(id=chat_id))
+
+
+class FakeApp:
+    def __init__(self, delay=0.05, release=False):
+        self.delay = delay
+        self.release = release
+        self.log = []
+        self.bot = None
+
+    async def process_update(self, update):
+        chat = update.effective_chat.id
+        self.log.append(("start", chat, update.update_id))
+        if self.release:
+            release_chat_order()
+        await asyncio.sleep(self.delay)
+        self.log.append(("end", chat, update.update_id))
+
+
+def run_updates(app, updates, workers=4):
+    async def run():
+        current = UpdateDispatcher(app, workers=workers, queue_size=100)
+        current.start()
+        start = time.perf_counter()
+        for item in updates:
+            await current.put(item)
+        await current.stop(timeout=5)
+        return time.perf_counter() - start
+
+    return asyncio.run(run())
+
+
+def test_updates_of_one_chat_are_handled_in_order_other_chats_in_parallel():
+    app = FakeApp(delay=0.05)
+    elapsed = run_updates(app, [update(i, chat_id=i % 4) for i in range(12)])
+
+    for chat in range(4):
+        events = [(kind, update_id) for kind, c, update_id in app.log if c == chat]
+        ids = [update_id for _, update_id in events]
+        assert ids == sorted(ids) and all(ids[i] == ids[i + 1] for i in range(0, len(ids), 2))
+    assert elapsed < 12 * 0.05 / 2  # 4 чата параллельно
+
+
+def test_handler_can_release_chat_order_early():
+    app = FakeApp(delay=0.1, release=True)
+    elapsed = run_updates(app, [update(i, chat_id=1) for i in range(5)])
+
+    assert [kind for kind, _, _ in app.log[:5]] == ["start"] * 5
+    assert elapsed < 0.3
+
+
+@pytest.fixture
+def webhook_dispatcher(monkeypatch):
+    current = UpdateDispatcher(FakeApp(), workers=1, queue_size=1)
+    monkeypatch.setitem(dispatcher._current, "dispatcher", current)
+    monkeypatch.setattr(dispatcher, "TELEGRAM_WEBHOOK_SECRET", "s3cret")
+    return current
+
+
+def post_update(update_id, secret="s3cret"):
+    payload = {"update_id": update_id, "message": {
+        "message_id": update_id, "date": 0, "chat": {"id": 7, "type": "private"}, "text": "привет",
+    }}
+    return Client().post(
+        "/api/telegram/webhook/", json.dumps(payload), content_type="application/json",
+        HTTP_X_TELEGRAM_BOT_API_SECRET_TOKEN=secret,
+    )
+
+
+def test_webhook_enqueues_update_and_pushes_back_when_full(webhook_dispatcher):
+    assert post_update(1, secret="wrong").status_code == 403
+    assert post_update(1).status_code == 200
+    assert post_update(2).status_code == 429  # Telegram повторит доставку
+
+    queued = webhook_dispatcher._queues[0].get_nowait()
+    assert (queued.update_id, queued.effective_chat.id, queued.message.text) == (1, 7, "привет")
+
+
+def test_webhook_without_running_bot_asks_telegram_to_retry():
+    assert post_update(1).status_code == 503
+
+
+def test_webhook_rejects_non_object_json(webhook_dispatcher):
+    response = Client().post(
+        "/api/telegram/webhook/", "[1, 2]", content_type="application/json",
+        HTTP_X_TELEGRAM_BOT_API_SECRET_TOKEN="s3cret",
+    )
+    assert response.status_code == 400
+
+
+class FakeTelegram:
+    """
+    getUpdates как у Telegram: offset навсегда подтверждает все апдейты до него.
+    """
+
+    def __init__(self, updates):
+        self.pending = list(updates)
+
+    async def delete_webhook(self):
+        pass
+
+    async def get_updates(self, offset=None, timeout=0, **kwargs):
+        if offset is not None:
+            self.pending = [u for u in self.pending if u.update_id >= offset]
+        if not self.pending and timeout:
+            await asyncio.sleep(0.01)
+        return list(self.pending)
+
+
+class StuckApp(FakeApp):
+    async def process_update(self, update):
+        if update.update_id == 11:
+            await asyncio.sleep(3600)  # не успеет до остановки
+        await super().process_update(update)
+
+
+def poll_and_stop(app, seconds=0.1):
+    async def run():
+        current = UpdateDispatcher(app, workers=4, queue_size=100)
+        current.start()
+        current.start_polling()
+        await asyncio.sleep(seconds)
+        await current.stop(timeout=0.2)
+
+    asyncio.run(run())
+
+
+def test_update_unhandled_before_stop_is_redelivered_after_restart():
+    telegram = FakeTelegram([update(10, chat_id=1), update(11, chat_id=2), update(12, chat_id=3)])
+    first = StuckApp(delay=0.01)
+    first.bot = telegram
+    poll_and_stop(first)
+    assert ("end", 1, 10) in first.log and ("end", 3, 12) in first.log
+    assert not any(update_id == 11 for kind, _, update_id in first.log if kind == "end")
+
+    restarted = FakeApp(delay=0.01)
+    restarted.bot = telegram
+    poll_and_stop(restarted)
+    # 11 не потерян; 10 подтверждён и снова не приходит
+    handled = {update_id for kind, _, update_id in restarted.log if kind == "end"}
+    assert 11 in handled and 10 not in handled
@@ -0,0 +1,61 @@
+# tests/test_gpt_async.py
+
+import asyncio
+import time
+
+from openai import AsyncOpenAI
+
+from benchmarks.fakes import FakeHTTPServer, make_openai_handler
+from bot import gpt_utils
+
+
+LATENCY = 0.3
+
+
+def _run_questions(monkeypatch, server, questions: int):
+    async def run():
+        monkeypatch.setattr(
+            gpt_utils, "async_client",
+            AsyncOpenAI(api_key="sk-test", base_url=server.url + "/v1", max_retries=0),
+        )
+        start = time.perf_counter()
+        replies = await asyncio.gather(*(gpt_utils.acall_gpt_plain(f"Вопрос {i}") for i in range(questions)))
+        return time.perf_counter() - start, replies
+
+    return asyncio.run(run())
+
+
+def test_assistant_questions_run_in_parallel(monkeypatch):
+    handler = make_openai_handler(latency=LATENCY, content="  Клиент готов к покупке.  ")
+    with FakeHTTPServer(handler) as server:
+        elapsed, replies = _run_questions(monkeypatch, server, questions=10)
+
+    assert replies == ["Клиент готов к покупке."] * 10
+    assert handler.stats["max_in_flight"] > 1
+    assert elapsed < LATENCY * 3
+
+
+def test_concurrency_limit_is_respected(monkeypatch):
+    monkeypatch.setattr(gpt_utils, "GPT_MAX_CONCURRENCY", 2)
+    handler = make_openai_handler(latency=0.1)
+    with FakeHTTPServer(handler) as server:
+        _run_questions(monkeypatch, server, questions=6)
+
+    assert handler.stats["max_in_flight"] == 2
+
+
+def test_acall_gpt_parses_sections(monkeypatch):
+    with FakeHTTPServer(make_openai_handler()) as server:
+        async def run():
+            monkeypatch.setattr(
+                gpt_utils, "async_client",
+                AsyncOpenAI(api_key="sk-test", base_url=server.url + "/v1", max_retries=0),
+            )
+            return await gpt_utils.acall_gpt("prompt")
+
+        result = asyncio.run(run())
+
+    assert result["reply"] == "Здравствуйте!"
+    assert result["assistant_hint"] == "Уточни цель."
+    assert result["stage"] == "S"
+    assert result["usage"] == {"prompt_tokens": 100, "cached_tokens": 0, "completion_tokens": 20}
@@ -0,0 +1,137 @@
+# tests/test_gpt_scheduler.py
+
+import asyncio
+
+import openai
+from openai import AsyncOpenAI
+
+from benchmarks.fakes import FakeHTTPServer, make_openai_handler
+from bot import gpt_utils
+from bot.gpt_scheduler import (
+    GPTScheduler, PRIORITY_BACKGROUND, PRIORITY_FOLLOW_UP, PRIORITY_FORWARD, gpt_job,
+)
+
+
+def test_rate_limited_server_gets_no_429_and_assistants_share_fairly(monkeypatch):
+    # «Аккаунт» на фейковом сервере — 5 запросов в секунду, очередь настроена с запасом на 4
+    handler = make_openai_handler(latency=0.02, rate_limit=5, rate_period=1.0)
+    done = []
+
+    async def ask(assistant, i):
+        with gpt_job(PRIORITY_FORWARD, assistant):
+            await gpt_utils.acall_gpt_plain(f"{assistant} {i}")
+        done.append(assistant)
+
+    async def run():
+        monkeypatch.setattr(
+            gpt_utils, "async_client",
+            AsyncOpenAI(api_key="sk-test", base_url=server.url + "/v1", max_retries=0),
+        )
+        flood = [asyncio.create_task(ask("a", i)) for i in range(12)]
+        await asyncio.sleep(0.05)
+        await asyncio.gather(*flood, *(ask("b", i) for i in range(3)))
+
+    with FakeHTTPServer(handler) as server:
+        scheduler = GPTScheduler(max_concurrency=16, rpm=4, period=1.0)
+        monkeypatch.setattr(gpt_utils, "get_scheduler", lambda: scheduler)
+        asyncio.run(run())
+
+    assert handler.stats.get("rate_limited", 0) == 0
+    assert handler.stats["requests"] == 15
+    # Ассистент «b» пришёл позже, но не ждёт, пока «a» выберет все свои 12 запросов
+    assert done.index("b") < 8 and len(done) - 1 - done[::-1].index("b") < 12
+
+
+def test_without_scheduler_limit_fake_server_answers_429(monkeypatch):
+    handler = make_openai_handler(rate_limit=2, rate_period=60.0)
+
+    async def run():
+        monkeypatch.setattr(
+            gpt_utils, "async_client",
+            AsyncOpenAI(api_key="sk-test", base_url=server.url + "/v1", max_retries=0),
+        )
+        return await asyncio.gather(
+            *(gpt_utils.acall_gpt_plain(str(i)) for i in range(3)), return_exceptions=True
+        )
+
+    with FakeHTTPServer(handler) as server:
+        monkeypatch.setattr(gpt_utils, "get_scheduler", lambda: GPTScheduler(max_concurrency=16))
+        results = asyncio.run(run())
+
+    assert sum(isinstance(r, openai.RateLimitError) for r in results) == 1
+
+
+def test_follow_up_questions_overtake_forwards_and_background_work():
+    scheduler = GPTScheduler(max_concurrency=1)
+    order = []
+
+    async def job(name, priority, owner="a"):
+        with gpt_job(priority, owner):
+            async with scheduler.slot():
+                order.append(name)
+                await asyncio.sleep(0.01)
+
+    async def run():
+        busy = asyncio.create_task(job("занят", PRIORITY_FORWARD))
+        await asyncio.sleep(0)
+        waiting = [
+            asyncio.create_task(job("резюме", PRIORITY_BACKGROUND)),
+            asyncio.create_task(job("пересылка", PRIORITY_FORWARD)),
+            asyncio.create_task(job("вопрос", PRIORITY_FOLLOW_UP, owner="b")),
+        ]
+        await asyncio.gather(busy, *waiting)
+
+    asyncio.run(run())
+
+    assert order == ["занят", "вопрос", "пересылка", "резюме"]
+
+
+def test_tokens_per_minute_and_queue_notice():
+    scheduler = GPTScheduler(max_concurrency=4, tpm=1000, period=0.5)
+    notices = []
+
+    async def notify(waiting):
+        notices.append(waiting)
+
+    async def request(tokens, used):
+        with gpt_job(on_queued=notify):
+            async with scheduler.slot(tokens) as job:
+                job.used_tokens = used
+                return asyncio.get_running_loop().time()
+
+    async def run():
+        start = asyncio.get_running_loop().time()
+        first = await request(800, 800)
+        second = await request(800, 100)
+        # Ответ оказался коротким — лишнее вернулось в ведро, третий не ждёт
+        third = await request(600, 600)
+        return first - start, second - start, third - start
+
+    first, second, third = asyncio.run(run())
+
+    assert first < 0.05
+    assert second >= 0.2  # ждал, пока ведро наполнится до 800 токенов
+    assert third - second < 0.05
+    assert notices == [1]
+
+
+def test_failing_queue_notice_does_not_leak_slot():
+    scheduler = GPTScheduler(max_concurrency=1)
+
+    async def notify(waiting):
+        raise RuntimeError("RetryAfter")
+
+    async def request():
+        with gpt_job(on_queued=notify):
+            async with scheduler.slot():
+                await asyncio.sleep(0.05)
+                return "ответ"
+
+    async def run():
+        # Второй встаёт в очередь, уведомление падает — ответ всё равно приходит
+        results = await asyncio.gather(request(), request())
+        third = await asyncio.wait_for(request(), timeout=1)
+        return results + [third]
+
+    assert asyncio.run(run()) == ["ответ"] * 3
+    assert scheduler._in_flight == 0
@@ -0,0 +1,98 @@
+# tests/test_gpt_transport.py
+
+import asyncio
+import json
+import time
+
+import httpx
+import openai
+import pytest
+from openai import AsyncOpenAI, OpenAI
+
+from benchmarks.fakes import FakeHTTPServer, make_openai_handler
+from bot import gpt_transport, gpt_utils
+
+
+REPLY = json.dumps(
+    {"reply": "Анна, старт 1 июня 🚀", "assistant_hint": "Спроси про цель.", "stage": "P"}, ensure_ascii=False,
+)
+BASE_URL = "http://127.0.0.1:9/v1"  # в режиме replay сеть не нужна
+
+
+def use_clients(monkeypatch, transport, base_url=BASE_URL, max_retries=0):
+    monkeypatch.setattr(gpt_utils, "client", OpenAI(
+        api_key="sk-test", base_url=base_url, max_retries=max_retries, http_client=httpx.Client(transport=transport),
+    ))
+    monkeypatch.setattr(gpt_utils, "async_client", AsyncOpenAI(
+        api_key="sk-test", base_url=base_url, max_retries=max_retries,
+        http_client=httpx.AsyncClient(transport=transport),
+    ))
+
+
+async def reply_and_stream():
+    result = await gpt_utils.acall_gpt("prompt")
+    usage, deltas = {}, []
+    async for delta in gpt_utils.astream_gpt("prompt", usage=usage):
+        deltas.append(delta)
+    return result, deltas, usage
+
+
+@pytest.fixture
+def cassette_path(tmp_path, monkeypatch):
+    handler = make_openai_handler(latency=0.2, content=REPLY, chunk_size=6, chunk_delay=0.02)
+    path = tmp_path / "gpt_cassette.jsonl"
+    with FakeHTTPServer(handler) as server:
+        cassette = gpt_transport.Cassette(path)
+        monkeypatch.setattr(gpt_utils, "async_client", AsyncOpenAI(
+            api_key="sk-test", base_url=server.url + "/v1", max_retries=0,
+            http_client=httpx.AsyncClient(transport=gpt_transport.AsyncRecordingTransport(cassette)),
+        ))
+        recorded = asyncio.run(reply_and_stream())
+    return path, recorded
+
+
+def test_replays_recorded_responses_with_timing_and_chunks(cassette_path, monkeypatch):
+    path, recorded = cassette_path
+    entries = [json.loads(line) for line in path.read_text(encoding="utf-8").splitlines()]
+    assert [(e["stream"], e["status"]) for e in entries] == [(False, 200), (True, 200)]
+    assert entries[0]["ttfb"] >= 0.2
+    assert len(entries[1]["chunks"]) > 1  # поток записан кусками, как пришёл
+
+    transport = gpt_transport.ReplayTransport(gpt_transport.Cassette(path), strict=True)
+    use_clients(monkeypatch, transport)
+    start = time.perf_counter()
+    replayed = asyncio.run(reply_and_stream())
+    elapsed = time.perf_counter() - start
+
+    assert replayed == recorded
+    assert recorded[0]["stage"] == "P" and "".join(recorded[1]) == REPLY
+    assert len(replayed[1]) > 1
+    assert elapsed >= 0.35  # две записанные задержки сервера по 0.2 с
+    # Тот же запрос из синхронного клиента берёт ту же запись
+    assert gpt_utils.call_gpt("prompt")["reply"] == recorded[0]["reply"]
+    assert transport.stats == {"requests": 3, "exact": 3, "reused": 0, "injected": 0}
+
+
+def test_injected_errors_are_retried_by_sdk(cassette_path, monkeypatch):
+    path, recorded = cassette_path
+    transport = gpt_transport.ReplayTransport(
+        gpt_transport.Cassette(path), latency=0, error_rate=0.5, errors=(429,), retry_after=0.01, seed=1,
+    )
+    use_clients(monkeypatch, transport, max_retries=10)
+
+    async def run():
+        return await asyncio.gather(*(gpt_utils.acall_gpt_plain(f"Вопрос {i}") for i in range(10)))
+
+    assert asyncio.run(run()) == [REPLY] * 10
+    assert transport.stats["injected"] > 0
+    assert transport.stats["reused"] == 10  # другие prompt — ответ той же формы из кассеты
+
+    use_clients(monkeypatch, gpt_transport.ReplayTransport(
+        gpt_transport.Cassette(path), latency=0, error_rate=1, errors=(503,),
+    ))
+    with pytest.raises(openai.InternalServerError):
+        gpt_utils.call_gpt_plain("Вопрос")
+
+    use_clients(monkeypatch, gpt_transport.ReplayTransport(gpt_transport.Cassette(path), strict=True))
+    with pytest.raises(openai.APIConnectionError):
+        gpt_utils.call_gpt_plain("Вопрос, которого не записывали")
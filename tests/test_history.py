@@ -0,0 +1,32 @@
+# tests/test_history.py
+
+import pytest
+from django.db import connection
+
+from bot.gpt_utils import get_history_text, get_recent_messages
+from bot.models import Client, Message
+
+
+@pytest.mark.django_db
+def test_history_returns_latest_messages_in_chronological_order():
+    client = Client.objects.create(telegram_id="1", name="Анна")
+    for i in range(15):
+        Message.objects.create(client=client, author="client" if i % 2 else "bot", text=f"сообщение {i}")
+
+    messages = get_recent_messages(client, limit=10)
+
+    assert [m.text for m in messages] == [f"сообщение {i}" for i in range(5, 15)]
+    assert get_history_text(client, limit=2) == "Клиент: сообщение 13\nБот: сообщение 14"
+
+
+@pytest.mark.django_db
+def test_history_query_uses_composite_index():
+    client = Client.objects.create(telegram_id="1")
+    sql, params = Message.objects.filter(client=client).order_by("-created_at", "-id")[:10].query.sql_with_params()
+
+    with connection.cursor() as cursor:
+        cursor.execute("EXPLAIN QUERY PLAN " + sql, params)
+        plan = " ".join(row[-1] for row in cursor.fetchall())
+
+    assert "message_client_created_idx" in plan
+    assert "TEMP B-TREE" not in plan
@@ -1,11 +1,17 @@
 # tests/test_interaction.py
 
 import pytest
+from asgiref.sync import async_to_sync
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 from rest_framework.test import APIClient
 from unittest.mock import patch
 
-from bot.models import Client, Message, Interaction
+from bot import interactions
+from bot.prompt_store import rebuild_prompt
+from bot.prompts import Prompt
+from bot.models import ActiveContext, Client, Message, Interaction, PromptBlock, Stage
 
 
 @pytest.mark.django_db
@@ -24,12 +30,12 @@ def test_interaction_creates_client_message_response_and_interaction():
         "stage": "P"
     }
 
-    with patch("bot.gpt_utils.call_gpt", return_value=mock_gpt_result):
+    with patch("bot.gpt_utils.acall_gpt", return_value=mock_gpt_result):
         response = client.post("/api/interaction/", payload, format="json")
 
     assert response.status_code == 200
-    assert response.data["reply"] == mock_gpt_result["reply"]
-    assert response.data["assistant_hint"] == mock_gpt_result["assistant_hint"]
+    assert response.json()["reply"] == mock_gpt_result["reply"]
+    assert response.json()["assistant_hint"] == mock_gpt_result["assistant_hint"]
 
     db_client = Client.objects.get(telegram_id="12345")
     assert db_client.name == "Тестовый Клиент"
@@ -42,10 +48,91 @@ def test_interaction_creates_client_message_response_and_interaction():
     assert messages[1].text == mock_gpt_result["reply"]
 
     interaction = Interaction.objects.get(client=db_client)
-    assert interaction.prompt
+    assert "Привет! Хочу узнать про курс." in rebuild_prompt(interaction)
     assert interaction.gpt_response == mock_gpt_result["reply"]
     assert interaction.assistant_hint == mock_gpt_result["assistant_hint"]
     assert interaction.stage_detected == mock_gpt_result["stage"]
 
     # Проверка модели Stage
     assert db_client.stage.stage == mock_gpt_result["stage"]
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize("body", ["[1, 2]", '"текст"', "не json"])
+def test_interaction_rejects_malformed_body(body):
+    response = APIClient().post("/api/interaction/", body, content_type="application/json")
+
+    assert response.status_code == 400
+    assert not Client.objects.exists()
+
+
+@pytest.mark.django_db
+def test_health_endpoint_reports_ready():
+    response = APIClient().get("/api/health/")
+
+    assert response.status_code == 200
+    assert response.json() == {"status": "ok"}
+
+
+@pytest.mark.django_db
+def test_run_interaction_in_process_uses_given_client_and_reports_stage_timings():
+    db_client = Client.objects.create(telegram_id="555", name="Клиент")
+    gpt_result = {"reply": "Здравствуйте!", "assistant_hint": "Уточни цель.", "stage": "S"}
+    timings = {}
+
+    with patch("bot.gpt_utils.acall_gpt", return_value=gpt_result):
+        result = async_to_sync(interactions.run_interaction)(db_client, "Сколько стоит?", timings)
+
+    assert result["reply"] == "Здравствуйте!"
+    assert set(timings) == {"prompt", "gpt", "save"}
+    assert Client.objects.count() == 1
+    assert list(Message.objects.values_list("author", flat=True).order_by("id")) == ["client", "bot"]
+    assert db_client.stage.stage == "S"
+
+
+@pytest.mark.django_db
+def test_persist_interaction_writes_everything_in_one_transaction():
+    db_client = Client.objects.create(telegram_id="556", name="Клиент")
+    gpt_result = {"reply": "Ответ", "assistant_hint": "Подсказка", "stage": "P", "usage": {}}
+
+    with CaptureQueriesContext(connection) as queries:
+        interactions.persist_interaction(db_client, "Вопрос", "prompt", gpt_result, assistant_id=77)
+    # повторно — Stage и ActiveContext обновляются, а не дублируются
+    interactions.persist_interaction(db_client, "Ещё вопрос", "prompt", dict(gpt_result, stage="I"), assistant_id=77)
+
+    writes = [q["sql"] for q in queries.captured_queries if q["sql"].startswith(("INSERT", "UPDATE"))]
+    assert len(writes) == 4
+    assert Message.objects.filter(client=db_client).count() == 4
+    assert ActiveContext.objects.get(assistant_telegram_id="77").client == db_client
+    assert Stage.objects.get(client=db_client).stage == "I"
+
+
+@pytest.mark.django_db
+def test_client_message_is_kept_when_gpt_fails():
+    db_client = Client.objects.create(telegram_id="557", name="Клиент")
+
+    with patch("bot.gpt_utils.acall_gpt", side_effect=RuntimeError("timeout")):
+        with pytest.raises(RuntimeError):
+            async_to_sync(interactions.run_interaction)(db_client, "Алло?", assistant_id=78)
+
+    assert list(Message.objects.filter(client=db_client).values_list("author", "text")) == [("client", "Алло?")]
+    assert not Interaction.objects.filter(client=db_client).exists()
+    assert ActiveContext.objects.get(assistant_telegram_id="78").client == db_client
+
+
+@pytest.mark.django_db(transaction=True)
+def test_prompt_is_stored_as_shared_blocks_and_rebuilt_exactly():
+    db_client = Client.objects.create(telegram_id="558", name="Клиент")
+    gpt_result = {"reply": "Ответ", "assistant_hint": "Подсказка", "stage": "S", "usage": {}}
+    prompts = [
+        Prompt(system="Инструкции " * 500, user=f"История {i}\n\nНовое сообщение", knowledge="Курс стоит 10 000 ₽.")
+        for i in range(3)
+    ]
+
+    for prompt in prompts:
+        interactions.persist_interaction(db_client, "Вопрос", prompt, gpt_result)
+
+    assert PromptBlock.objects.count() == 2  # префикс и фрагменты базы знаний — по одному разу
+    stored = Interaction.objects.order_by("id")
+    assert [rebuild_prompt(i) for i in stored] == [str(p) for p in prompts]
+    assert all(i.prompt == "" and len(i.prompt_user) < 30 for i in stored)
@@ -0,0 +1,74 @@
+# tests/test_knowledge_cache.py
+
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from django.utils import timezone
+
+from bot import knowledge_cache
+from bot.gpt_utils import get_latest_knowledge_block
+from bot.models import KnowledgeBlock
+
+
+@pytest.mark.django_db
+def test_repeated_reads_do_not_query_db(django_assert_num_queries):
+    KnowledgeBlock.objects.create(content="Курс стоит 49 000 рублей.")
+
+    assert get_latest_knowledge_block() == "Курс стоит 49 000 рублей."
+    with django_assert_num_queries(0):
+        assert get_latest_knowledge_block() == "Курс стоит 49 000 рублей."
+
+
+@pytest.mark.django_db
+def test_save_signal_invalidates_cache(django_capture_on_commit_callbacks):
+    block = KnowledgeBlock.objects.create(content="Старая версия")
+    version = knowledge_cache.get_knowledge_version()
+
+    with django_capture_on_commit_callbacks(execute=True):
+        block.content = "Новая версия"
+        block.save()
+
+    assert get_latest_knowledge_block() == "Новая версия"
+    assert knowledge_cache.get_knowledge_version() != version
+
+    with django_capture_on_commit_callbacks(execute=True):
+        block.delete()
+    assert get_latest_knowledge_block() == ""
+
+
+@pytest.mark.django_db
+def test_version_file_keeps_other_processes_coherent():
+    block = KnowledgeBlock.objects.create(content="Версия 1")
+    assert get_latest_knowledge_block() == "Версия 1"
+
+    # Другой процесс изменил базу знаний: сигнал здесь не сработал, но файл версии обновлён
+    KnowledgeBlock.objects.filter(pk=block.pk).update(content="Версия 2")
+    assert get_latest_knowledge_block() == "Версия 1"
+
+    knowledge_cache.bump_knowledge_version()
+    assert get_latest_knowledge_block() == "Версия 2"
+
+
+@pytest.mark.django_db
+def test_db_version_keeps_replicas_on_other_hosts_coherent(monkeypatch, django_assert_num_queries):
+    monkeypatch.setattr(knowledge_cache, "KNOWLEDGE_VERSION_SOURCE", "db")
+    monkeypatch.setattr(knowledge_cache, "KNOWLEDGE_VERSION_DB_INTERVAL", 60)
+    block = KnowledgeBlock.objects.create(content="Версия 1")
+    assert get_latest_knowledge_block() == "Версия 1"
+    with django_assert_num_queries(0):
+        assert get_latest_knowledge_block() == "Версия 1"
+
+    # Реплика на другом узле сохранила правку: ни сигнала, ни общего файла версии
+    KnowledgeBlock.objects.filter(pk=block.pk).update(content="Версия 2", updated_at=timezone.now())
+    monkeypatch.setattr(knowledge_cache, "KNOWLEDGE_VERSION_DB_INTERVAL", 0)
+    assert get_latest_knowledge_block() == "Версия 2"
+    assert not knowledge_cache.KNOWLEDGE_VERSION_PATH.exists()
+
+
+def test_concurrent_bumps_do_not_collide():
+    with ThreadPoolExecutor(8) as pool:
+        list(pool.map(lambda _: knowledge_cache.bump_knowledge_version(), range(200)))
+
+    path = knowledge_cache.KNOWLEDGE_VERSION_PATH
+    assert path.read_text().isdigit()
+    assert [p.name for p in path.parent.iterdir() if p.name.startswith(path.name)] == [path.name]
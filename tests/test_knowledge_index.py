@@ -0,0 +1,76 @@
+# tests/test_knowledge_index.py
+
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from bot import knowledge_index
+from bot.gpt_utils import generate_prompt
+from bot.knowledge_index import KnowledgeIndex, get_knowledge_index
+from bot.models import Client, KnowledgeBlock
+
+
+KNOWLEDGE = "\n\n".join([
+    "Стоимость курса — 49 000 рублей, возможна рассрочка на 6 месяцев.",
+    "Старт ближайшего потока — 1 сентября, занятия проходят по вторникам и четвергам.",
+    "Курс ведут практикующие маркетологи с опытом от 10 лет.",
+    "После курса выдаётся сертификат и доступ к закрытому чату выпускников.",
+    "Возврат денег возможен в течение 14 дней после старта.",
+])
+
+
+@pytest.fixture
+def small_chunks(monkeypatch):
+    monkeypatch.setattr(knowledge_index, "KNOWLEDGE_CHUNK_CHARS", 100)
+    monkeypatch.setattr(knowledge_index, "KNOWLEDGE_TOP_K", 1)
+
+
+def test_search_returns_relevant_chunk(small_chunks):
+    index = KnowledgeIndex.build(KNOWLEDGE)
+
+    assert len(index.chunks) == 5
+    assert index.search("Сколько стоит курс? Есть рассрочка?") == [index.chunks[0]]
+    assert index.search("когда старт потока") == [index.chunks[1]]
+
+
+def test_index_survives_save_and_load(small_chunks, tmp_path):
+    index = KnowledgeIndex.build(KNOWLEDGE)
+    index.save(tmp_path / "index.npz")
+    loaded = KnowledgeIndex.load(tmp_path / "index.npz")
+
+    assert loaded.chunks == index.chunks
+    assert loaded.search("возврат денег") == index.search("возврат денег")
+
+
+def test_concurrent_saves_do_not_collide(small_chunks, tmp_path):
+    index = KnowledgeIndex.build(KNOWLEDGE)
+    path = tmp_path / "index.npz"
+    with ThreadPoolExecutor(8) as pool:
+        list(pool.map(lambda _: index.save(path), range(50)))
+
+    assert KnowledgeIndex.load(path).chunks == index.chunks
+    assert [p.name for p in tmp_path.iterdir()] == ["index.npz"]
+
+
+@pytest.mark.django_db
+def test_saving_knowledge_block_rebuilds_index(small_chunks, django_capture_on_commit_callbacks):
+    with django_capture_on_commit_callbacks(execute=True):
+        block = KnowledgeBlock.objects.create(content=KNOWLEDGE)
+    assert len(get_knowledge_index().chunks) == 5
+
+    with django_capture_on_commit_callbacks(execute=True):
+        block.content = "Сертификат государственного образца не выдаётся."
+        block.save()
+    assert get_knowledge_index().chunks == ["Сертификат государственного образца не выдаётся."]
+
+
+@pytest.mark.django_db
+def test_prompt_contains_only_relevant_knowledge(small_chunks, django_capture_on_commit_callbacks):
+    with django_capture_on_commit_callbacks(execute=True):
+        KnowledgeBlock.objects.create(content=KNOWLEDGE)
+    client = Client.objects.create(telegram_id="1", name="Анна")
+
+    prompt = str(generate_prompt(client, "А сколько стоит обучение, есть рассрочка?"))
+
+    assert "49 000 рублей" in prompt
+    assert "1 сентября" not in prompt
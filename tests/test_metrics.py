@@ -0,0 +1,108 @@
+# tests/test_metrics.py
+
+import asyncio
+from unittest.mock import patch
+
+import httpx
+import pytest
+from asgiref.sync import async_to_sync, sync_to_async
+from rest_framework.test import APIClient
+
+from bot import api_client, metrics
+
+
+@pytest.fixture
+def trace_log(monkeypatch):
+    monkeypatch.setattr(metrics, "METRICS_TRACE_LOG", True)
+
+
+def test_trace_collects_spans_from_threads_and_tokens(capsys, trace_log):
+    def history_query():
+        with metrics.span("history"):
+            pass
+
+    async def handle():
+        with metrics.trace("abc123") as current:
+            with metrics.span("context"):
+                await sync_to_async(history_query)()
+            metrics.record_usage({"prompt_tokens": 100, "cached_tokens": 20, "completion_tokens": 10})
+        return current
+
+    current = async_to_sync(handle)()
+
+    assert [stage for stage, _ in current.spans] == ["history", "context"]
+    assert metrics.current_trace_id() is None
+    line = capsys.readouterr().out
+    assert "trace=abc123 history=" in line and "tokens=100/20/10" in line
+
+    text = metrics.render()
+    assert 'bot_stage_seconds_count{stage="context"} 1' in text
+    assert 'bot_stage_seconds_bucket{stage="history",le="+Inf"} 1' in text
+    assert 'gpt_tokens_total{kind="prompt"} 100' in text
+    assert 'gpt_tokens_total{kind="completion"} 10' in text
+
+
+def test_histogram_buckets_are_cumulative():
+    for seconds in (0.002, 0.2, 100.0):
+        metrics.observe("gpt", seconds)
+
+    text = metrics.render()
+    assert 'bot_stage_seconds_bucket{stage="gpt",le="0.001"} 0' in text
+    assert 'bot_stage_seconds_bucket{stage="gpt",le="0.0025"} 1' in text
+    assert 'bot_stage_seconds_bucket{stage="gpt",le="0.25"} 2' in text
+    assert 'bot_stage_seconds_bucket{stage="gpt",le="60.0"} 2' in text
+    assert 'bot_stage_seconds_bucket{stage="gpt",le="+Inf"} 3' in text
+
+
+def test_api_client_passes_trace_id(monkeypatch):
+    seen = []
+
+    def handler(request):
+        seen.append(request.headers.get(metrics.TRACE_HEADER))
+        return httpx.Response(200, json={"reply": "Ответ"})
+
+    async def run():
+        client = httpx.AsyncClient(transport=httpx.MockTransport(handler), base_url="http://api")
+        monkeypatch.setattr(api_client, "_client", client)
+        with metrics.trace("from-bot"):
+            await api_client.post_interaction({"telegram_id": 1, "text": "Привет"})
+        await api_client.post_interaction({"telegram_id": 1, "text": "Привет"})
+        await client.aclose()
+
+    asyncio.run(run())
+    assert seen == ["from-bot", None]
+
+
+@pytest.mark.django_db
+def test_interaction_api_continues_trace_and_exposes_stage_metrics(capsys, trace_log):
+    gpt_result = {"reply": "Здравствуйте!", "assistant_hint": "Уточни цель.", "stage": "S"}
+    client = APIClient()
+
+    with patch("bot.gpt_utils.acall_gpt", return_value=gpt_result):
+        response = client.post(
+            "/api/interaction/", {"telegram_id": "1", "text": "Сколько стоит?"},
+            format="json", HTTP_X_TRACE_ID="bot-trace-1",
+        )
+
+    assert response["X-Trace-Id"] == "bot-trace-1"
+    line = next(l for l in capsys.readouterr().out.splitlines() if l.startswith("trace="))
+    assert line.startswith("trace=bot-trace-1 ")
+    for stage in ("context", "history", "prompt", "db_write"):
+        assert f" {stage}=" in line
+
+    text = client.get("/metrics").content.decode()
+    assert 'bot_stage_seconds_count{stage="db_write"} 1' in text
+    assert 'gpt_queue_waiting{priority="forward"} 0' in text
+    assert 'response_cache_hit_rate{stage="S"} 0.0' in text
+
+
+@pytest.mark.django_db
+def test_interaction_api_ignores_malformed_trace_id():
+    with patch("bot.gpt_utils.acall_gpt", return_value={"reply": "-", "assistant_hint": "-", "stage": "S"}):
+        response = APIClient().post(
+            "/api/interaction/", {"telegram_id": "1", "text": "Привет"},
+            format="json", HTTP_X_TRACE_ID="bad id\nforged=1",
+        )
+
+    assert response["X-Trace-Id"] != "bad id\nforged=1"
+    assert len(response["X-Trace-Id"]) == 16
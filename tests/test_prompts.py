@@ -0,0 +1,63 @@
+# tests/test_prompts.py
+
+import asyncio
+
+import pytest
+from openai import AsyncOpenAI
+
+from benchmarks.fakes import FakeHTTPServer, make_openai_handler
+from bot import gpt_utils, knowledge_index, prompts
+from bot.gpt_utils import generate_prompt
+from bot.models import Client, KnowledgeBlock, Message, Stage
+
+
+@pytest.mark.django_db
+def test_prefix_is_identical_across_clients_in_full_mode(monkeypatch):
+    monkeypatch.setattr(knowledge_index, "KNOWLEDGE_MODE", "full")
+    KnowledgeBlock.objects.create(content="Курс стоит 49 000 рублей.")
+    anna = Client.objects.create(telegram_id="1", name="Анна")
+    oleg = Client.objects.create(telegram_id="2", name="Олег")
+    Stage.objects.create(client=oleg, stage="P")
+    Message.objects.create(client=oleg, author="client", text="Дорого")
+
+    first = generate_prompt(anna, "Сколько стоит?")
+    second = generate_prompt(oleg, "А скидки есть?")
+
+    assert first.system == second.system
+    assert "49 000 рублей" in first.system
+    assert "Анна" in first.user and "Олег" in second.user
+    assert "Анна" not in first.system
+
+
+def test_history_is_trimmed_oldest_first(monkeypatch):
+    monkeypatch.setattr(knowledge_index, "KNOWLEDGE_MODE", "retrieval")
+    monkeypatch.setattr(knowledge_index, "get_relevant_knowledge", lambda query: "")
+    lines = [f"Клиент: сообщение номер {i} " + "слово " * 30 for i in range(20)]
+
+    prompt = prompts.build_prompt(
+        "Инструкции", query="", head="Клиент", history_title="История",
+        history_lines=lines, tail="Новое сообщение", budget=300,
+    )
+
+    assert "сообщение номер 19" in prompt.user
+    assert "сообщение номер 0 " not in prompt.user
+    kept = [line for line in lines if line in prompt.user]
+    assert kept == lines[-len(kept):]
+
+
+def test_usage_reports_cached_tokens(monkeypatch):
+    with FakeHTTPServer(make_openai_handler(cached_tokens=64)) as server:
+        async def run():
+            monkeypatch.setattr(
+                gpt_utils, "async_client",
+                AsyncOpenAI(api_key="sk-test", base_url=server.url + "/v1", max_retries=0),
+            )
+            usage = {}
+            async for _ in gpt_utils.astream_gpt(prompts.Prompt("system", "user"), usage=usage):
+                pass
+            return (await gpt_utils.acall_gpt(prompts.Prompt("system", "user")))["usage"], usage
+
+        result_usage, stream_usage = asyncio.run(run())
+
+    assert result_usage == {"prompt_tokens": 100, "cached_tokens": 64, "completion_tokens": 20}
+    assert stream_usage == result_usage
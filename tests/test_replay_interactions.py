@@ -0,0 +1,84 @@
+# tests/test_replay_interactions.py
+
+import json
+from datetime import timedelta
+from io import StringIO
+
+import pytest
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.utils import timezone
+
+from bot.models import Client, Interaction, Message
+
+
+def record(client, text, reply, stage, at):
+    message = Message.objects.create(client=client, author="client", text=text)
+    Message.objects.filter(pk=message.pk).update(created_at=at)
+    interaction = Interaction.objects.create(
+        client=client, prompt="p", gpt_response=reply, assistant_hint="Подсказка", stage_detected=stage,
+        prompt_tokens=1000,
+    )
+    Interaction.objects.filter(pk=interaction.pk).update(created_at=at + timedelta(seconds=1))
+
+
+@pytest.fixture
+def recorded():
+    start = timezone.now() - timedelta(days=1)
+    anna = Client.objects.create(telegram_id="1", name="Анна")
+    oleg = Client.objects.create(telegram_id="2", name="Олег")
+    record(anna, "Сколько стоит курс?", "10 000 ₽.", "S", start)
+    record(oleg, "Когда старт?", "1 июня.", "S", start + timedelta(minutes=1))
+    # Сообщение без ответа GPT шагом не становится — в прогоне его нет
+    Message.objects.create(client=anna, author="client", text="Алло?")
+    Message.objects.filter(text="Алло?").update(created_at=start + timedelta(minutes=2))
+    record(anna, "А рассрочка есть?", "Есть, на 6 месяцев.", "P", start + timedelta(minutes=3))
+
+
+@pytest.mark.django_db
+def test_replays_history_through_pipeline_and_cleans_up(recorded):
+    out = StringIO()
+    call_command("replay_interactions", concurrency=2, keep=True, in_place=True, stdout=out)
+    report = out.getvalue()
+
+    assert "шагов: 3 из 3, ошибок: 0" in report
+    assert "запросов к БД:" in report and "(записанные: mean=1000)" in report
+
+    anna = Client.objects.get(telegram_id="replay-1")
+    replayed = list(Interaction.objects.filter(client=anna).order_by("id"))
+    assert [i.gpt_response for i in replayed] == ["10 000 ₽.", "Есть, на 6 месяцев."]
+    assert anna.stage.stage == "P"
+    # Второй шаг видит историю первого — она накопилась по ходу прогона
+    assert "Сколько стоит курс?" in replayed[1].prompt_user
+    assert "Алло?" not in replayed[1].prompt_user
+    assert replayed[1].prompt_tokens > 0
+
+    with pytest.raises(CommandError):
+        call_command("replay_interactions", in_place=True, stdout=StringIO())  # клиенты прошлого прогона мешают
+    call_command("replay_interactions", cleanup=True, stdout=StringIO())
+    assert not Client.objects.filter(telegram_id__startswith="replay-").exists()
+    assert Interaction.objects.count() == 3
+
+
+@pytest.mark.django_db
+def test_dump_and_replay_from_export(recorded, tmp_path):
+    path = tmp_path / "replay.jsonl"
+    call_command("replay_interactions", dump=str(path), stdout=StringIO())
+    items = [json.loads(line) for line in path.read_text(encoding="utf-8").splitlines()]
+    assert [(i["telegram_id"], i["text"]) for i in items] == [
+        ("1", "Сколько стоит курс?"), ("2", "Когда старт?"), ("1", "А рассрочка есть?"),
+    ]
+
+    out = StringIO()
+    call_command("replay_interactions", export=str(path), limit=2, rate=100, in_place=True, stdout=out)
+    assert "шагов: 2 из 2" in out.getvalue()
+    assert not Client.objects.filter(telegram_id__startswith="replay-").exists()
+
+
+@pytest.mark.django_db
+def test_refuses_to_write_into_current_database_without_in_place(recorded):
+    with pytest.raises(CommandError, match="--in-place"):
+        call_command("replay_interactions", stdout=StringIO())
+
+    assert not Client.objects.filter(telegram_id__startswith="replay-").exists()
+    assert Interaction.objects.count() == 3
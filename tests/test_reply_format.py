@@ -0,0 +1,88 @@
+# tests/test_reply_format.py
+
+import asyncio
+import json
+
+import pytest
+from openai import AsyncOpenAI
+
+from benchmarks.fakes import FakeHTTPServer, make_openai_handler
+from bot import gpt_utils, metrics, reply_format
+from bot.reply_format import ReplyParseError
+
+
+GOOD = json.dumps(
+    {"reply": "Анна, \"старт\" — 1 июня 🚀", "assistant_hint": "Спроси про цель.\nПотом — бюджет.", "stage": "P"},
+    ensure_ascii=False,
+)
+
+
+def test_json_stream_parser_emits_same_events_char_by_char():
+    # ensure_ascii=True: эмодзи приходит суррогатной парой 🚀
+    content = json.dumps(json.loads(GOOD))
+    parser = reply_format.JsonReplyStreamParser()
+    events = []
+    for char in content:
+        events += parser.feed(char)
+    events += parser.close()
+
+    reply = "".join(e["text"] for e in events if e["type"] == "delta" and e["section"] == "reply")
+    assert reply == "Анна, \"старт\" — 1 июня 🚀"
+    sections = {e["section"]: e["text"] for e in events if e["type"] == "section"}
+    assert sections == {"reply": reply, "assistant_hint": "Спроси про цель.\nПотом — бюджет.", "stage": "P"}
+    assert not any(e["type"] == "delta" and e["section"] == "stage" for e in events)
+
+
+def test_parse_reply_outcomes():
+    assert gpt_utils.parse_reply(GOOD)[1] == "ok"
+
+    fenced, outcome = gpt_utils.parse_reply("Вот ответ:\n```json\n" + GOOD.replace('"P"', '"P — Problem"') + "\n```")
+    assert outcome == "repaired"
+    assert fenced["stage"] == "P"
+
+    legacy, outcome = gpt_utils.parse_reply(
+        "**Ответ клиенту:** Здравствуйте!\n\n**Подсказка ассистенту:** Уточни цель.\n\nЭтап: I"
+    )
+    assert outcome == "repaired"
+    assert (legacy["reply"], legacy["assistant_hint"], legacy["stage"]) == ("Здравствуйте!", "Уточни цель.", "I")
+
+    with pytest.raises(ReplyParseError):
+        gpt_utils.parse_reply('{"reply": "Здравствуйте!", "assistant_hint": "Уточни')  # обрезан до stage
+    with pytest.raises(ReplyParseError):
+        gpt_utils.parse_reply(None)
+
+
+def _acall(monkeypatch, handler):
+    with FakeHTTPServer(handler) as server:
+        async def run():
+            monkeypatch.setattr(
+                gpt_utils, "async_client",
+                AsyncOpenAI(api_key="sk-test", base_url=server.url + "/v1", max_retries=0),
+            )
+            return await gpt_utils.acall_gpt("prompt")
+
+        return asyncio.run(run())
+
+
+def test_unparsed_reply_is_retried_once(monkeypatch):
+    handler = make_openai_handler(replies=["Извините, не могу помочь.", GOOD])
+    result = _acall(monkeypatch, handler)
+
+    assert handler.stats["requests"] == 2
+    assert result["stage"] == "P" and "parse_failed" not in result
+    assert result["usage"] == {"prompt_tokens": 200, "cached_tokens": 0, "completion_tokens": 40}
+    last = handler.stats["last_request"]
+    assert last["response_format"]["json_schema"]["name"] == "sales_reply"
+    assert last["messages"][-1]["content"].startswith("Предыдущий ответ не разобрался")
+    assert metrics.counter_value("gpt_reply_parse_total", result="failed") == 1
+    assert metrics.counter_value("gpt_reply_parse_total", result="ok") == 1
+
+
+def test_fallback_after_retries_is_marked(monkeypatch):
+    monkeypatch.setattr(gpt_utils, "GPT_PARSE_RETRIES", 1)
+    handler = make_openai_handler(replies=["Извините, не могу помочь."])
+    result = _acall(monkeypatch, handler)
+
+    assert handler.stats["requests"] == 2
+    assert result["parse_failed"] is True
+    assert metrics.counter_value("gpt_reply_fallback_total") == 1
@@ -0,0 +1,109 @@
+# tests/test_response_cache.py
+
+import pytest
+from asgiref.sync import async_to_sync
+from unittest.mock import patch
+
+from bot import interactions, response_cache
+from bot.models import Client, Interaction, Stage
+from bot.utils import normalize_text
+
+
+GPT_RESULT = {
+    "reply": "Анна, курс стоит 10 000 ₽.",
+    "assistant_hint": "Спроси, когда Анна хочет начать.",
+    "stage": "S",
+    "usage": {"prompt_tokens": 900},
+}
+
+
+def ask(client, text, gpt_result=GPT_RESULT):
+    with patch("bot.gpt_utils.acall_gpt", return_value=gpt_result) as gpt:
+        result = async_to_sync(interactions.run_interaction)(client, text)
+    return result, gpt.call_count
+
+
+def test_normalize_text():
+    assert normalize_text("  Сколько   СТОИТ курс?? 😊") == "сколько стоит курс"
+
+
+@pytest.mark.django_db
+def test_repeated_question_is_answered_from_cache():
+    anna = Client.objects.create(telegram_id="900", name="Анна")
+    oleg = Client.objects.create(telegram_id="901", name="Олег")
+
+    _, calls = ask(anna, "Сколько стоит курс?")
+    assert calls == 1
+
+    result, calls = ask(oleg, "сколько  стоит курс 🙂")
+    assert calls == 0
+    assert result["cached"] is True
+    assert result["reply"] == "Олег, курс стоит 10 000 ₽."
+    assert result["assistant_hint"].startswith(response_cache.CACHED_HINT_MARK)
+    assert result["assistant_hint"].endswith("Спроси, когда Олег хочет начать.")
+
+    cached = Interaction.objects.get(client=oleg)
+    assert cached.prompt == "" and cached.prompt_tokens is None
+    assert cached.gpt_response == result["reply"]
+
+    stats = response_cache.stats()["S"]
+    assert (stats["hits"], stats["misses"], stats["hit_rate"]) == (1, 1, 0.5)
+    assert stats["hit_latency"] is not None and stats["miss_latency"] is not None
+
+
+@pytest.mark.django_db
+def test_cached_reply_does_not_leak_between_clients():
+    anna = Client.objects.create(telegram_id="910", name="Анна")
+    oleg = Client.objects.create(telegram_id="911", name="Олег")
+    nameless = Client.objects.create(telegram_id="912")
+
+    # Имя в другом падеже не заменить — такой ответ не кэшируется
+    declined = dict(GPT_RESULT, assistant_hint="Спроси, когда Анне удобно начать.")
+    ask(anna, "Сколько стоит курс?", declined)
+    assert ask(oleg, "Сколько стоит курс?")[1] == 1
+
+    # «Да» посреди переписки зависит от неё: другому клиенту ответ не отдаётся
+    ask(oleg, "А рассрочка есть?")
+    booking = {"reply": "Отлично, тогда бронирую вам место.", "assistant_hint": "Пришли ссылку на оплату.", "stage": "N"}
+    ask(anna, "Да", booking)
+    result, calls = ask(oleg, "Да")
+    assert calls == 1 and result["reply"] == GPT_RESULT["reply"]
+    assert Stage.objects.get(client=oleg).stage == "S"
+
+    # Клиенту без имени ответ с именем из кэша не подходит
+    fresh = Client.objects.create(telegram_id="913", name="Мария")
+    ask(fresh, "Когда старт?", {"reply": "Мария, старт 1 июня.", "assistant_hint": "Спроси про цель.", "stage": "S"})
+    result, calls = ask(nameless, "Когда старт?")
+    assert calls == 1 and not result["reply"].startswith(",")
+
+
+@pytest.mark.django_db
+def test_stage_and_knowledge_version_are_part_of_the_key():
+    anna = Client.objects.create(telegram_id="902", name="Анна")
+    oleg = Client.objects.create(telegram_id="903", name="Олег")
+    Stage.objects.create(client=oleg, stage="I")
+
+    ask(anna, "Когда старт?")
+    assert ask(oleg, "Когда старт?")[1] == 1
+
+    with patch("bot.interactions.get_knowledge_version", return_value="другая версия"):
+        assert ask(Client.objects.create(telegram_id="904"), "Когда старт?")[1] == 1
+
+
+@pytest.mark.django_db
+def test_similar_question_hits_only_with_threshold(monkeypatch):
+    ask(Client.objects.create(telegram_id="905", name="Анна"), "Сколько стоит ваш курс?")
+
+    assert ask(Client.objects.create(telegram_id="907"), "А сколько стоит ваш курс?")[1] == 1
+
+    monkeypatch.setattr(response_cache, "RESPONSE_CACHE_SIMILARITY", 0.8)
+    assert ask(Client.objects.create(telegram_id="908"), "а сколько стоит ваш курс, подскажите")[1] == 1
+    assert ask(Client.objects.create(telegram_id="909", name="Олег"), "Подскажите, сколько стоит ваш курс")[1] == 0
+
+
+@pytest.mark.django_db
+def test_expired_entries_are_not_used(monkeypatch):
+    ask(Client.objects.create(telegram_id="906", name="Анна"), "Когда старт?")
+
+    monkeypatch.setattr(response_cache, "RESPONSE_CACHE_TTL", 0)
+    assert ask(Client.objects.create(telegram_id="914", name="Олег"), "Когда старт?")[1] == 1
@@ -0,0 +1,88 @@
+# tests/test_sqlite.py
+
+import asyncio
+import sqlite3
+import threading
+import time
+
+import pytest
+from asgiref.sync import ThreadSensitiveContext, async_to_sync
+from django.db import connections
+from rest_framework.test import APIClient
+from unittest.mock import patch
+
+from bot import db, interactions
+from bot.models import Client, Interaction, Message
+
+
+def test_pragmas_switch_file_database_to_wal(tmp_path):
+    connection = sqlite3.connect(tmp_path / "db.sqlite3")
+    try:
+        db.apply_sqlite_pragmas(connection.cursor())
+
+        assert connection.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+        assert connection.execute("PRAGMA synchronous").fetchone()[0] == 1  # NORMAL
+        assert connection.execute("PRAGMA busy_timeout").fetchone()[0] == db.SQLITE_PRAGMAS["busy_timeout"]
+    finally:
+        connection.close()
+
+
+def test_run_write_executes_writes_one_at_a_time(monkeypatch):
+    monkeypatch.setattr(db, "SQLITE_WRITE_QUEUE", True)
+    state = {"active": 0, "max_active": 0}
+    lock = threading.Lock()
+
+    def write(i):
+        with lock:
+            state["active"] += 1
+            state["max_active"] = max(state["max_active"], state["active"])
+        time.sleep(0.01)
+        with lock:
+            state["active"] -= 1
+        return i
+
+    async def request(i):
+        # как в ASGIHandler: у каждого запроса свой поток для sync_to_async
+        async with ThreadSensitiveContext():
+            return await db.run_write(write, i)
+
+    async def run():
+        return await asyncio.gather(*(request(i) for i in range(10)))
+
+    assert asyncio.run(run()) == list(range(10))
+    assert state["max_active"] == 1
+
+    with patch("bot.db.serialize_writes", return_value=False):
+        asyncio.run(run())
+    assert state["max_active"] > 1
+
+
+@pytest.mark.django_db(transaction=True)
+def test_interactions_are_written_by_writer_thread(monkeypatch):
+    # Без транзакции теста: запись потока-писателя видна главному потоку после коммита
+    monkeypatch.setattr(db, "SQLITE_WRITE_QUEUE", True)
+    threads = []
+    persist = interactions.persist_interaction
+
+    def recording_persist(*args, **kwargs):
+        threads.append(threading.current_thread().name)
+        return persist(*args, **kwargs)
+
+    monkeypatch.setattr(interactions, "persist_interaction", recording_persist)
+    gpt_result = {"reply": "Старт 1 июня.", "assistant_hint": "Спроси про цель.", "stage": "P"}
+    try:
+        with patch("bot.gpt_utils.acall_gpt", return_value=gpt_result):
+            for text in ("Когда старт?", "А сколько стоит?"):
+                response = APIClient().post(
+                    "/api/interaction/", {"telegram_id": "42", "text": text}, format="json",
+                )
+                assert response.status_code == 200
+    finally:
+        # Постоянное соединение писателя закрываем в его же потоке, чтобы оно не пережило тест
+        async_to_sync(db.run_write)(connections.close_all)
+
+    assert len(threads) == 2 and all(name.startswith("db-writer") for name in threads)
+    client = Client.objects.get(telegram_id="42")
+    assert Message.objects.filter(client=client).count() == 4
+    assert Interaction.objects.filter(client=client).count() == 2
+    assert client.stage.stage == "P"
@@ -0,0 +1,147 @@
+# tests/test_streaming.py
+
+import asyncio
+import json
+import time
+from unittest.mock import patch
+
+import pytest
+from asgiref.sync import async_to_sync
+from openai import AsyncOpenAI
+from rest_framework.test import APIClient
+
+from benchmarks.fakes import FakeHTTPServer, make_openai_handler
+from bot import gpt_utils
+from bot.models import Client, Interaction
+from bot.telegram_stream import StreamingReply
+
+
+FULL_REPLY = (
+    "Ответ клиенту:\nДобрый день! Курс стартует в понедельник.\n\n"
+    "Подсказка ассистенту:\nСпроси, какой формат удобнее.\n\n"
+    "#Этап: P"
+)
+
+
+def _collect(events, section):
+    return "".join(e["text"] for e in events if e["type"] == "delta" and e["section"] == section)
+
+
+def test_section_parser_handles_headers_split_across_tokens():
+    parser = gpt_utils.SectionStreamParser()
+    events = []
+    for char in FULL_REPLY:
+        events += parser.feed(char)
+    events += parser.close()
+
+    assert _collect(events, "reply").strip() == "Добрый день! Курс стартует в понедельник."
+    assert _collect(events, "assistant_hint").strip() == "Спроси, какой формат удобнее."
+    assert [e["section"] for e in events if e["type"] == "section"] == ["reply", "assistant_hint", "stage"]
+    assert parser.result() == gpt_utils.parse_gpt_reply(FULL_REPLY)
+
+
+def test_first_reply_text_arrives_before_completion_ends(monkeypatch):
+    handler = make_openai_handler(content=FULL_REPLY, chunk_size=4, chunk_delay=0.02)
+
+    async def run():
+        monkeypatch.setattr(
+            gpt_utils, "async_client",
+            AsyncOpenAI(api_key="sk-test", base_url=server.url + "/v1", max_retries=0),
+        )
+        parser = gpt_utils.SectionStreamParser()
+        first_reply_at = None
+        start = time.perf_counter()
+        async for delta in gpt_utils.astream_gpt("prompt"):
+            for event in parser.feed(delta):
+                if event["type"] == "delta" and event["section"] == "reply" and first_reply_at is None:
+                    first_reply_at = time.perf_counter() - start
+        return first_reply_at, time.perf_counter() - start
+
+    with FakeHTTPServer(handler) as server:
+        first_reply_at, total = asyncio.run(run())
+
+    assert first_reply_at is not None
+    assert first_reply_at < total / 3
+
+
+class FakeTelegramMessage:
+    def __init__(self, text=""):
+        self.text = text
+        self.edits = []
+        self.replies = []
+
+    async def reply_text(self, text):
+        reply = FakeTelegramMessage(text)
+        self.replies.append(reply)
+        return reply
+
+    async def edit_text(self, text):
+        self.edits.append(text)
+        self.text = text
+
+
+def test_streaming_reply_edits_are_rate_limited():
+    message = FakeTelegramMessage()
+
+    async def run():
+        answer = await StreamingReply(message, prefix="📌 ", interval=60).start()
+        for word in ["Клиент ", "готов ", "купить ", "курс."]:
+            await answer.append(word)
+        await answer.finish()
+
+    asyncio.run(run())
+
+    sent = message.replies[0]
+    # Заглушка, первая видимая правка сразу, затем только финальная
+    assert sent.edits == ["📌 Клиент", "📌 Клиент готов купить курс."]
+
+
+@pytest.mark.django_db
+def test_interaction_stream_mode_returns_ndjson_events():
+    async def fake_stream(prompt, system_prompt=None, usage=None):
+        for i in range(0, len(FULL_REPLY), 5):
+            yield FULL_REPLY[i:i + 5]
+        usage.update(prompt_tokens=1500, cached_tokens=1024, completion_tokens=40)
+
+    async def read_body(response):
+        return b"".join([part async for part in response.streaming_content])
+
+    with patch("bot.gpt_utils.astream_gpt", fake_stream):
+        response = APIClient().post(
+            "/api/interaction/",
+            {"telegram_id": "777", "name": "Клиент", "text": "Когда старт?", "stream": True},
+            format="json",
+        )
+        body = async_to_sync(read_body)(response)
+
+    events = [json.loads(line) for line in body.decode().splitlines()]
+    assert events[-1]["type"] == "done"
+    assert events[-1]["result"]["reply"] == "Добрый день! Курс стартует в понедельник."
+    assert _collect(events, "reply").strip() == "Добрый день! Курс стартует в понедельник."
+
+    interaction = Interaction.objects.get(client=Client.objects.get(telegram_id="777"))
+    assert interaction.stage_detected == "P"
+    assert (interaction.prompt_tokens, interaction.cached_tokens) == (1500, 1024)
+
+
+@pytest.mark.django_db
+def test_interaction_is_saved_when_stream_is_closed_after_done():
+    from bot.interactions import stream_interaction
+
+    async def fake_stream(prompt, system_prompt=None, usage=None):
+        yield FULL_REPLY
+
+    client = Client.objects.create(telegram_id="778", name="Клиент")
+
+    async def run():
+        events = stream_interaction(client, "Когда старт?")
+        async for event in events:
+            if event["type"] == "done":
+                break
+        await events.aclose()  # клиент отключился, не дочитав генератор
+
+    with patch("bot.gpt_utils.astream_gpt", fake_stream):
+        async_to_sync(run)()
+        async_to_sync(run)()  # второй раз — ответ из кэша
+
+    assert Interaction.objects.filter(client=client).count() == 2
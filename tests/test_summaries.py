@@ -0,0 +1,94 @@
+# tests/test_summaries.py
+
+from unittest.mock import patch
+
+import pytest
+from rest_framework.test import APIClient
+
+from bot import gpt_utils, summaries
+from bot.gpt_utils import generate_prompt
+from bot.models import Client, ClientSummary, Message
+
+
+@pytest.fixture
+def small_windows(monkeypatch):
+    monkeypatch.setattr(summaries, "SUMMARY_THRESHOLD", 8)
+    monkeypatch.setattr(gpt_utils, "HISTORY_LIMIT", 4)
+    monkeypatch.setattr(gpt_utils, "SUMMARY_STEP", 2)
+
+
+def _add_messages(client, start, count):
+    for i in range(start, start + count):
+        Message.objects.create(client=client, author="client", text=f"сообщение {i}")
+
+
+@pytest.mark.django_db
+def test_summary_is_updated_incrementally(small_windows):
+    client = Client.objects.create(telegram_id="1", name="Анна")
+    _add_messages(client, 0, 8)
+
+    with patch("bot.gpt_utils.summarize_conversation") as summarize:
+        assert summaries.update_summary(client.id) is False  # порог не пройден
+        summarize.assert_not_called()
+
+        _add_messages(client, 8, 2)
+        summarize.return_value = "Резюме 1"
+        assert summaries.update_summary(client.id) is True
+        previous, lines = summarize.call_args.args
+        assert previous == ""
+        assert lines == [f"Клиент: сообщение {i}" for i in range(0, 6)]
+
+        _add_messages(client, 10, 3)
+        summarize.return_value = "Резюме 2"
+        assert summaries.update_summary(client.id) is True
+        previous, lines = summarize.call_args.args
+        assert previous == "Резюме 1"
+        assert lines == [f"Клиент: сообщение {i}" for i in range(6, 9)]
+
+    summary = ClientSummary.objects.get(client=client)
+    assert summary.text == "Резюме 2"
+    assert summary.last_message_id == Message.objects.get(text="сообщение 8").id
+
+
+@pytest.mark.django_db
+def test_prompt_uses_summary_and_only_unsummarized_messages(small_windows):
+    client = Client.objects.create(telegram_id="1", name="Анна")
+    _add_messages(client, 0, 12)
+    ClientSummary.objects.create(
+        client=client, text="Клиентка хочет сменить профессию.",
+        last_message_id=Message.objects.get(text="сообщение 7").id,
+    )
+
+    prompt = generate_prompt(client, "Сколько стоит?").user
+
+    assert "Клиентка хочет сменить профессию." in prompt
+    assert "сообщение 7\n" not in prompt
+    assert all(f"сообщение {i}" in prompt for i in range(8, 12))
+
+
+@pytest.mark.django_db
+def test_prompt_keeps_every_message_while_summary_lags(small_windows):
+    client = Client.objects.create(telegram_id="1", name="Анна")
+    _add_messages(client, 0, 30)
+    # Резюме отстало: после него 25 сообщений, больше HISTORY_LIMIT + SUMMARY_STEP
+    ClientSummary.objects.create(
+        client=client, text="Клиентка хочет сменить профессию.",
+        last_message_id=Message.objects.get(text="сообщение 4").id,
+    )
+
+    prompt = generate_prompt(client, "Сколько стоит?").user
+
+    assert all(f"сообщение {i}\n" in prompt for i in range(5, 30))
+    assert "сообщение 4\n" not in prompt
+
+
+@pytest.mark.django_db
+def test_interaction_schedules_summary_after_commit(django_capture_on_commit_callbacks):
+    gpt_result = {"reply": "Ответ", "assistant_hint": "Подсказка", "stage": "S"}
+
+    with patch("bot.gpt_utils.acall_gpt", return_value=gpt_result), \
+            patch("bot.interactions.schedule_summary_update") as schedule:
+        with django_capture_on_commit_callbacks(execute=True):
+            APIClient().post("/api/interaction/", {"telegram_id": "5", "text": "Привет"}, format="json")
+
+    schedule.assert_called_once_with(Client.objects.get(telegram_id="5").id)